@@ -0,0 +1,434 @@
+"""
+性能基准测试
+
+测量环境 reset / step 速度（无画面、rgb_array、human、录像、轨迹数据集）、录像无画面回放速度、轨迹数据集随机抽样速度、碰撞检测耗时、PPO.predict 和纯 NumPy 策略的延迟、
+不同并行数量下的端到端采样速度、多个客户端通过推理服务请求动作的吞吐量、入口模块的冷启动时间以及进程峰值内存，结果可保存为 JSON 基线，
+并与之前的基线比较，超过阈值的性能下降会被标记出来（退出码为 1）。
+
+使用 SDL dummy 驱动，无显示设备也能运行：
+    python benchmark.py --output benchmarks/baseline.json
+    python benchmark.py --compare benchmarks/baseline.json --threshold 0.1
+"""
+import os
+
+# 必须在导入 pygame 之前设置
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pygame
+
+from flappy_core import FlappyCore, SCREEN_WIDHT, SCREEN_HEIGHT
+from flappy_dataset import TrajectoryDataset, TrajectoryWrapper
+from flappy_env import FlappyEnv, CLOCK_UNTHROTTLED
+from flappy_replay import read_episodes, replay
+from flappy_sprites import Bird, Ground, make_pipes, place_pipes
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+GROUPS = ('env', 'collision', 'predict', 'rollout', 'subproc', 'serve', 'startup')
+
+
+def policy_action(i):
+    """固定的动作序列，保证每次测试走过相同的游戏状态"""
+    return 1 if i % 7 == 0 else 0
+
+
+def peak_rss_mb():
+    """当前进程的峰值内存（MB），不支持的平台返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_for(duration, body):
+    """
+    反复调用 body()，直到超过 duration 秒
+
+    body 返回本次完成的工作量（步数、样本数等），返回 每秒工作量
+    """
+    count = 0
+    start = time.perf_counter()
+    while True:
+        count += body()
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            return count / elapsed
+
+
+def bench_env_reset(duration):
+    """无画面 reset 速度"""
+    env = FlappyEnv(save_stats=False)
+    env.reset(seed=0)
+
+    def body():
+        env.reset()
+        return 1
+    result = run_for(duration, body)
+    env.close()
+    return result
+
+
+def bench_env_step(render_mode, duration, record=None, dataset=None):
+    """step 速度，rgb_array 模式每步额外调用一次 render()，给出 record 时录制回合，给出 dataset 时写入轨迹数据集"""
+    env = FlappyEnv(render_mode=render_mode, clock_mode=CLOCK_UNTHROTTLED, record=record, save_stats=False)
+    if dataset is not None:
+        env = TrajectoryWrapper(env, dataset)
+    env.reset(seed=0)
+    state = {'i': 0}
+
+    def body():
+        for _ in range(100):
+            _, _, done, _, _ = env.step(policy_action(state['i']))
+            if render_mode == 'rgb_array':
+                env.render()
+            if done:
+                env.reset()
+            state['i'] += 1
+        return 100
+    result = run_for(duration, body)
+    env.close()
+    return result
+
+
+def bench_replay(path, duration):
+    """无画面回放录像中所有回合的速度（帧/秒）"""
+    episodes = list(read_episodes(path))
+    env = FlappyEnv(clock_mode=CLOCK_UNTHROTTLED, save_stats=False)
+    state = {'i': 0}
+
+    def body():
+        episode = episodes[state['i'] % len(episodes)]
+        state['i'] += 1
+        for _ in replay(env, episode, frame=episode.frames):
+            pass
+        return episode.frames
+    result = run_for(duration, body)
+    env.close()
+    return result
+
+
+def bench_dataset_sample(path, duration, batch_size=256):
+    """从磁盘上的轨迹数据集随机抽取转移的速度（转移/秒）"""
+    dataset = TrajectoryDataset(path)
+    rng = np.random.default_rng(0)
+
+    def body():
+        dataset.sample(batch_size, rng)
+        return batch_size
+    return run_for(duration, body)
+
+
+def record_states(count):
+    """运行物理核心并记录 count 个 (小鸟高度, 管道) 状态，用于碰撞测试"""
+    core = FlappyCore()
+    core.seed(0)
+    core.reset()
+    states = []
+    i = 0
+    while len(states) < count:
+        core.step(policy_action(i))
+        states.append((core.bird_y, [list(pipe) for pipe in core.pipes], list(core.ground_x)))
+        if core.done:
+            core.reset()
+        i += 1
+    return states
+
+
+def bench_collision_core(states, duration):
+    """物理核心（逐行区间）碰撞检测，返回每次检测的微秒数"""
+    core = FlappyCore()
+
+    def body():
+        for bird_y, pipes, ground_x in states:
+            core.bird_y = bird_y
+            core.pipes = pipes
+            core.ground_x = ground_x
+            core.hits_ground() or core.hits_pipe()
+        return len(states)
+    return 1e6 / run_for(duration, body)
+
+
+def bench_collision_mask(states, duration):
+    """pygame 精灵遮罩碰撞检测（groupcollide + collide_mask），返回每次检测的微秒数"""
+    bird = Bird()
+    bird_group = pygame.sprite.Group(bird)
+    pipe_pairs = [make_pipes(0, 100) for _ in range(2)]
+    pipe_group = pygame.sprite.Group(*[pipe for pipes in pipe_pairs for pipe in pipes])
+    grounds = [Ground(0) for _ in range(2)]
+    ground_group = pygame.sprite.Group(*grounds)
+
+    def body():
+        for bird_y, pipes, ground_x in states:
+            bird.rect[1] = bird_y
+            for pair, (x, size, _) in zip(pipe_pairs, pipes):
+                place_pipes(pair, x, size)
+            for ground, x in zip(grounds, ground_x):
+                ground.rect[0] = x
+            (pygame.sprite.groupcollide(bird_group, ground_group, False, False, pygame.sprite.collide_mask) or
+             pygame.sprite.groupcollide(bird_group, pipe_group, False, False, pygame.sprite.collide_mask))
+        return len(states)
+    return 1e6 / run_for(duration, body)
+
+
+def make_model():
+    """创建未训练的 PPO 模型（只测推理速度，不需要训练）"""
+    from stable_baselines3 import PPO
+    return PPO('MlpPolicy', FlappyEnv(save_stats=False), device='cpu', seed=0, verbose=0)
+
+
+def bench_predict(model, count):
+    """逐个观察值调用 PPO.predict，返回 (p50, p99) 延迟（微秒）"""
+    obs = np.zeros(3, dtype=np.float32)
+    for _ in range(50):  # 预热
+        model.predict(obs, deterministic=True)
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        model.predict(obs, deterministic=True)
+        latencies.append(time.perf_counter() - start)
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1e6
+    return p50, p99
+
+
+def make_numpy_policy(model):
+    """把模型导出为纯 NumPy 策略"""
+    from flappy_policy import NumpyPolicy, export_policy
+    with tempfile.TemporaryDirectory() as directory:
+        model_path = os.path.join(directory, 'model.zip')
+        model.save(model_path)
+        return NumpyPolicy(export_policy(model_path))
+
+
+def bench_rollout(model, env, duration):
+    """端到端采样速度：PPO.predict + env.step，返回每秒样本数"""
+    state = {'obs': env.reset()}
+
+    def body():
+        for _ in range(20):
+            actions, _ = model.predict(state['obs'])
+            state['obs'], _, _, _ = env.step(actions)
+        return 20 * env.num_envs
+    result = run_for(duration, body)
+    env.close()
+    return result
+
+
+def serve_client(socket_path, duration, queue):
+    """推理服务测试的客户端进程：逐个观察值请求动作，把每秒请求数放进 queue"""
+    from flappy_serve import PolicyClient
+    client = PolicyClient(socket_path)
+    obs = np.zeros(3, dtype=np.float32)
+
+    def body():
+        for _ in range(20):
+            client.predict(obs, deterministic=True)
+        return 20
+    queue.put(run_for(duration, body))
+    client.close()
+
+
+def bench_serve(model, clients, duration):
+    """clients 个客户端进程同时通过推理服务请求动作，返回 (每秒总请求数, 平均每批观察值个数)"""
+    import multiprocessing
+    import tempfile
+    import threading
+    from flappy_serve import PolicyServer
+
+    directory = tempfile.mkdtemp()
+    socket_path = os.path.join(directory, 'policy.sock')
+    server = PolicyServer(model, socket_path)
+    server.start()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    queue = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=serve_client, args=(socket_path, duration, queue))
+                 for _ in range(clients)]
+    for process in processes:
+        process.start()
+    rate = sum(queue.get() for _ in processes)
+    for process in processes:
+        process.join()
+    server.shutdown()
+    thread.join()
+    os.rmdir(directory)
+    return rate, server.stats()['mean_batch']
+
+
+def env_counts(max_envs):
+    """1, 2, 4, ... 直到 max_envs"""
+    counts = []
+    n = 1
+    while n < max_envs:
+        counts.append(n)
+        n *= 2
+    counts.append(max_envs)
+    return counts
+
+
+def metric(value, unit, higher_is_better=True):
+    return {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+
+
+def run_benchmarks(groups, duration=1.0, max_envs=8, max_workers=None):
+    """运行选中的测试组，返回 {指标名: {'value', 'unit', 'higher_is_better'}}"""
+    metrics = {}
+
+    if 'env' in groups:
+        print("测试环境 reset / step 速度...")
+        metrics['env_reset_per_sec'] = metric(bench_env_reset(duration), 'resets/s')
+        metrics['env_step_per_sec'] = metric(bench_env_step(None, duration), 'steps/s')
+        metrics['env_step_rgb_array_per_sec'] = metric(bench_env_step('rgb_array', duration), 'steps/s')
+        metrics['env_step_human_per_sec'] = metric(bench_env_step('human', duration), 'steps/s')
+        with tempfile.TemporaryDirectory() as directory:
+            record = os.path.join(directory, 'episodes.rec')
+            metrics['env_step_record_per_sec'] = metric(bench_env_step(None, duration, record), 'steps/s')
+            metrics['replay_frames_per_sec'] = metric(bench_replay(record, duration), 'frames/s')
+            dataset = os.path.join(directory, 'dataset')
+            metrics['env_step_dataset_per_sec'] = metric(bench_env_step(None, duration, dataset=dataset), 'steps/s')
+            metrics['dataset_sample_per_sec'] = metric(bench_dataset_sample(dataset, duration), 'transitions/s')
+
+    if 'collision' in groups:
+        print("测试碰撞检测耗时...")
+        pygame.display.set_mode((SCREEN_WIDHT, SCREEN_HEIGHT))  # 加载图片需要窗口
+        states = record_states(1000)
+        metrics['collision_core_us'] = metric(bench_collision_core(states, duration), 'us', False)
+        metrics['collision_mask_us'] = metric(bench_collision_mask(states, duration), 'us', False)
+
+    model = None
+    if 'predict' in groups:
+        print("测试 PPO.predict 延迟...")
+        model = make_model()
+        p50, p99 = bench_predict(model, 2000)
+        metrics['predict_latency_p50_us'] = metric(p50, 'us', False)
+        metrics['predict_latency_p99_us'] = metric(p99, 'us', False)
+        p50, p99 = bench_predict(make_numpy_policy(model), 2000)
+        metrics['predict_numpy_latency_p50_us'] = metric(p50, 'us', False)
+        metrics['predict_numpy_latency_p99_us'] = metric(p99, 'us', False)
+
+    if 'rollout' in groups:
+        from flappy_vec_env import FlappyVecEnv
+        model = model or make_model()
+        for n in env_counts(max_envs):
+            print(f"测试 {n} 个世界的采样速度...")
+            metrics[f'rollout_vec_{n}_samples_per_sec'] = metric(
+                bench_rollout(model, FlappyVecEnv(n, seed=0, save_stats=False), duration), 'samples/s')
+
+    if 'subproc' in groups:
+        from flappy_train import make_subproc_env
+        model = model or make_model()
+        for n in env_counts(max_workers or min(max_envs, os.cpu_count() or 1)):
+            print(f"测试 {n} 个子进程的采样速度...")
+            metrics[f'rollout_subproc_{n}_samples_per_sec'] = metric(
+                bench_rollout(model, make_subproc_env(n, seed=0, headless=True, save_stats=False), duration), 'samples/s')
+
+    if 'serve' in groups:
+        model = model or make_model()
+        for n in env_counts(max_envs):
+            print(f"测试 {n} 个客户端通过推理服务请求动作...")
+            rate, mean_batch = bench_serve(model, n, duration)
+            metrics[f'serve_{n}_requests_per_sec'] = metric(rate, 'requests/s')
+            metrics[f'serve_{n}_mean_batch'] = metric(mean_batch, 'obs/batch')
+
+    if 'startup' in groups:
+        from flappy_startup import ENTRY_POINTS, cold_start
+        for module in ENTRY_POINTS:
+            print(f"测试 {module} 的冷启动时间...")
+            metrics[f'startup_{module}_ms'] = metric(cold_start(module), 'ms', False)
+
+    rss = peak_rss_mb()
+    if rss is not None:
+        metrics['peak_rss_mb'] = metric(rss, 'MB', False)
+    return metrics
+
+
+def system_info():
+    """记录运行环境，比较基线时用来判断是否在同一台机器上"""
+    import torch
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'pygame': pygame.version.ver,
+        'torch': torch.__version__,
+        'time': time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+def compare(baseline, metrics, threshold):
+    """
+    与基线比较
+
+    返回:
+        list: 性能下降超过 threshold（比例）的指标名
+    """
+    regressions = []
+    print(f"\n{'指标':<40}{'基线':>14}{'本次':>14}{'变化':>10}")
+    for name, current in metrics.items():
+        old = baseline['metrics'].get(name)
+        if old is None or not old['value']:
+            print(f"{name:<42}{'-':>14}{current['value']:>14.1f}")
+            continue
+        change = (current['value'] - old['value']) / old['value']
+        worse = -change if current['higher_is_better'] else change
+        flag = ''
+        if worse > threshold:
+            flag = '  <-- 性能下降'
+            regressions.append(name)
+        print(f"{name:<42}{old['value']:>14.1f}{current['value']:>14.1f}{change:>+10.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flappy Bird 性能基准测试')
+    parser.add_argument('--output', help='把结果保存为 JSON 基线文件')
+    parser.add_argument('--compare', help='与指定的 JSON 基线比较')
+    parser.add_argument('--threshold', type=float, default=0.1, help='判定为性能下降的比例，默认 0.1（10%%）')
+    parser.add_argument('--duration', type=float, default=1.0, help='每项测试运行的秒数')
+    parser.add_argument('--max-envs', type=int, default=8, help='采样速度测试的最大并行世界数量')
+    parser.add_argument('--max-workers', type=int, default=None, help='子进程采样测试的最大进程数，默认不超过 CPU 数')
+    parser.add_argument('--only', nargs='+', choices=GROUPS, default=list(GROUPS), help='只运行指定的测试组')
+    args = parser.parse_args()
+
+    metrics = run_benchmarks(args.only, duration=args.duration, max_envs=args.max_envs,
+                             max_workers=args.max_workers)
+    result = {'system': system_info(), 'metrics': metrics}
+
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"\n结果已保存到: {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, metrics, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} 项指标性能下降超过 {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n没有发现性能下降")
+    else:
+        print(f"\n{'指标':<40}{'数值':>14}  单位")
+        for name, m in metrics.items():
+            print(f"{name:<42}{m['value']:>14.1f}  {m['unit']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,7 @@
 import sys
-import pkg_resources
-import subprocess
+from importlib import metadata
 import platform
 import logging
-import torch
-import tensorflow as tf
-from stable_baselines3.common.env_checker import check_env
 from flappy_env import FlappyEnv
 
 # 设置日志级别
@@ -28,15 +24,14 @@ def check_dependencies():
         'pygame',
         'numpy',
         'torch',
-        'tensorboard',
-        'tensorflow'
+        'tensorboard'
     ]
     
     for package in required_packages:
         try:
-            version = pkg_resources.get_distribution(package).version
+            version = metadata.version(package)
             print(f"{package}: {version}")
-        except pkg_resources.DistributionNotFound:
+        except metadata.PackageNotFoundError:
             print(f"{package}: 未安装")
     print("\n")
 
@@ -44,19 +39,19 @@ def check_gpu_support():
     """检查GPU支持情况"""
     print("=== GPU支持检查 ===")
     
-    # PyTorch GPU检查
+    # PyTorch GPU检查（torch 导入较慢，只在这里导入）
     print("PyTorch GPU信息:")
+    try:
+        import torch
+    except ImportError:
+        print("PyTorch未安装")
+        print("\n")
+        return
     print(f"CUDA是否可用: {torch.cuda.is_available()}")
     if torch.cuda.is_available():
         print(f"CUDA版本: {torch.version.cuda}")
         print(f"当前设备: {torch.cuda.get_device_name(0)}")
     print("\n")
-    
-    # TensorFlow GPU检查
-    print("TensorFlow GPU信息:")
-    print(f"TensorFlow版本: {tf.__version__}")
-    print(f"可用GPU数量: {len(tf.config.list_physical_devices('GPU'))}")
-    print("\n")
 
 def check_gymnasium_env():
     """检查Gymnasium环境"""
@@ -73,6 +68,7 @@ def check_flappy_env():
     """检查Flappy Bird环境"""
     print("=== Flappy Bird环境检查 ===")
     try:
+        from stable_baselines3.common.env_checker import check_env
         env = FlappyEnv()
         print("环境创建成功")
         
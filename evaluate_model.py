@@ -1,96 +1,231 @@
-from stable_baselines3 import PPO
-from flappy_env import FlappyEnv
-import numpy as np
+from flappy_env import FlappyEnv, CLOCK_UNTHROTTLED, OBS_VECTOR
+from flappy_serve import load_policy  # 本地加载模型或连接推理服务
+from flappy_checkpoints import CheckpointCatalog  # 模型存档目录
+from flappy_policy import exported_policy  # 导出纯 NumPy 策略
+from flappy_dataset import TrajectoryWrapper  # 轨迹数据集
+import argparse
+import bisect
+import math
+import multiprocessing
 import os
 import json
 from datetime import datetime
+from statistics import NormalDist
 
 
-def evaluate_model(model_path, num_episodes=10):
+class RunningStats:
+    """
+    在线统计：每加入一个数据更新一次均值、标准差、最值和分位数
+
+    均值和方差用 Welford 算法增量计算（与 np.mean、np.std 的总体标准差一致），
+    分位数在有序数组上线性插值（与 np.percentile 的默认方法一致）。
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # 与均值之差的平方和
+        self.max = None
+        self.sorted = []  # 按大小插入的数据，用于分位数
+
+    def add(self, value):
+        """加入一个数据"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.max = value if self.max is None else max(self.max, value)
+        bisect.insort(self.sorted, value)
+
+    def std(self):
+        """总体标准差"""
+        return math.sqrt(self.m2 / self.count) if self.count else 0.0
+
+    def percentile(self, q):
+        """第 q 百分位数（0~100），还没有数据时为 nan"""
+        if not self.sorted:
+            return math.nan
+        position = (len(self.sorted) - 1) * q / 100
+        lower = math.floor(position)
+        upper = min(lower + 1, len(self.sorted) - 1)
+        return self.sorted[lower] + (self.sorted[upper] - self.sorted[lower]) * (position - lower)
+
+    def half_width(self, confidence):
+        """均值置信区间的半宽（正态近似，使用样本标准差）"""
+        if self.count < 2:
+            return math.inf
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        return z * math.sqrt(self.m2 / (self.count - 1) / self.count)
+
+
+# 工作进程中的环境和模型（每个进程只加载一次）
+_worker = {}
+
+
+def init_worker(model_path, server=None, record_dir=None, dataset_dir=None):
+    """
+    工作进程初始化：创建无画面环境并加载一次模型
+
+    参数:
+        model_path (str): 模型文件的路径
+        server (str): 推理服务的 socket 路径，给出时连接服务而不在本进程加载模型
+        record_dir (str): 给出时每个进程把回合录像写入其中的 worker_<pid>.rec
+        dataset_dir (str): 给出时每个进程把每一步写入其中的轨迹数据集 worker_<pid>/
+    """
+    if server is None and not model_path.endswith('.npz'):
+        import torch
+        torch.set_num_threads(1)  # 多个进程同时推理，每个进程只用一个线程，避免互相抢占 CPU
+    # 不渲染、不限帧率、死亡也不暂停；评估的死亡不计入训练的 game_stats.json（提前停止时工作进程会被直接终止）
+    record = os.path.join(record_dir, f"worker_{os.getpid()}.rec") if record_dir else None
+    env = FlappyEnv(clock_mode=CLOCK_UNTHROTTLED, record=record, save_stats=False)
+    if dataset_dir is not None:
+        # 每个回合结束都提交（提前停止时工作进程会被直接终止）
+        env = TrajectoryWrapper(env, os.path.join(dataset_dir, f"worker_{os.getpid()}"), flush_every=1)
+    _worker['env'] = env
+    _worker['model'] = load_policy(model_path, env=env, server=server)
+
+
+def run_episode(seed):
+    """
+    用工作进程中的模型跑完一个回合
+
+    参数:
+        seed (int): 回合的随机种子，决定管道序列
+    返回:
+        dict: 回合结果（种子、得分、存活时间、总奖励、通过管道数）
+    """
+    env, model = _worker['env'], _worker['model']
+    obs, _ = env.reset(seed=seed)
+    done = False
+    total_reward = 0
+    while not done:
+        # deterministic=True 表示使用确定性策略，而不是随机采样
+        action, _ = model.predict(obs, deterministic=True)
+        obs, reward, done, _, info = env.step(action)
+        total_reward += reward
+    return {
+        'seed': seed,
+        'score': info['score'],
+        'time': info['time'],
+        'reward': float(total_reward),
+        'pipes_passed': info['pipes_passed']
+    }
+
+
+def evaluate_model(model_path, num_episodes=10, server=None, workers=None, seed=0,
+                   precision=None, confidence=0.95, min_episodes=10, record=False, dataset=False):
     """
     评估强化学习模型的性能
     
     参数:
         model_path (str): 模型文件的路径
-        num_episodes (int): 评估的回合数，默认为10回合
+        num_episodes (int): 评估的回合数（提前停止时为最多回合数），默认为10回合
+        server (str): 推理服务的 socket 路径，给出时由服务做推理，不在本进程加载模型
+        workers (int): 并行评估的进程数，默认为 CPU 数
+        seed (int): 第 i 个回合使用种子 seed + i，结果与进程数无关
+        precision (float): 平均得分置信区间的半宽不超过它时提前停止，None 表示跑完所有回合
+        confidence (float): 置信区间的置信度
+        min_episodes (int): 提前停止前至少评估的回合数（标准差需要足够的样本才可靠）
+        record (bool): 保存每个回合的录像，之后可以按种子回放（见 flappy_replay.py）
+        dataset (bool): 把每一步写入轨迹数据集（见 flappy_dataset.py）
     
     功能:
-        1. 加载训练好的模型
-        2. 运行多个回合进行测试
-        3. 收集性能数据
-        4. 计算统计指标
+        1. 每个工作进程加载一次模型，创建无画面环境
+        2. 各进程从任务队列中领取回合（显式的随机种子）并行测试
+        3. 每完成一个回合，更新在线统计并追加一行到 JSONL 结果流
+        4. 平均得分已经足够精确时提前停止
         5. 保存评估结果
+
+    返回:
+        dict: 统计指标
     """
-    # 创建游戏环境实例
-    env = FlappyEnv()
-    
-    # 加载训练好的PPO模型
-    # PPO (Proximal Policy Optimization) 是一种强化学习算法
-    model = PPO.load(model_path, env=env)
-    
-    # 初始化数据收集列表
-    scores = []      # 记录每个回合的得分
-    times = []       # 记录每个回合的存活时间
-    rewards = []     # 记录每个回合的总奖励
-    pipes_passed = [] # 记录每个回合通过的管道数量
-    
-    print(f"开始评估模型: {model_path}")
-    print(f"计划评估 {num_episodes} 个回合")
-    
-    # 开始评估循环
-    for episode in range(num_episodes):
-        # 重置环境，获取初始观察值
-        obs, _ = env.reset()
-        done = False
-        total_reward = 0
-        
-        # 单个回合的游戏循环
-        while not done:
-            # 使用模型预测下一步动作
-            # deterministic=True 表示使用确定性策略，而不是随机采样
-            action, _ = model.predict(obs, deterministic=True)
-            
-            # 执行动作，获取环境反馈
-            # obs: 新的观察值
-            # reward: 获得的奖励
-            # done: 回合是否结束
-            # info: 额外的信息（如得分、存活时间等）
-            obs, reward, done, _, info = env.step(action)
-            total_reward += reward
-            
-            # 实时显示评估进度
-            print(f"\r回合 {episode + 1}/{num_episodes} | 得分: {info['score']} | 存活时间: {info['time']}", end="")
-        
-        # 记录回合数据
-        scores.append(info['score'])
-        times.append(info['time'])
-        rewards.append(total_reward)
-        pipes_passed.append(info['pipes_passed'])
-        
-        print(f"\n回合 {episode + 1} 完成")
-    
-    # 计算统计指标
-    stats = {
-        '平均得分': np.mean(scores),           # 所有回合的平均得分
-        '最高得分': np.max(scores),            # 所有回合中的最高得分
-        '平均存活时间': np.mean(times),        # 所有回合的平均存活时间
-        '最长存活时间': np.max(times),         # 所有回合中的最长存活时间
-        '平均奖励': np.mean(rewards),          # 所有回合的平均奖励
-        '平均通过管道数': np.mean(pipes_passed), # 所有回合的平均通过管道数
-        '最高通过管道数': np.max(pipes_passed),  # 所有回合中的最高通过管道数
-        '标准差': {
-            '得分': np.std(scores),            # 得分的标准差，反映稳定性
-            '存活时间': np.std(times),         # 存活时间的标准差
-            '奖励': np.std(rewards),           # 奖励的标准差
-            '通过管道数': np.std(pipes_passed)  # 通过管道数的标准差
-        }
-    }
-    
+    workers = max(1, min(workers or os.cpu_count() or 1, num_episodes))
+    seeds = [seed + i for i in range(num_episodes)]
+
     # 创建评估结果目录
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     results_dir = "evaluation_results"
     if not os.path.exists(results_dir):
         os.makedirs(results_dir)
+    stream_file = os.path.join(results_dir, f"evaluation_{timestamp}.jsonl")
+    record_dir = os.path.join(results_dir, f"evaluation_{timestamp}") if record else None
+    dataset_dir = os.path.join(results_dir, f"evaluation_{timestamp}_dataset") if dataset else None
+
+    print(f"开始评估模型: {model_path}")
+    print(f"计划评估 {num_episodes} 个回合，{workers} 个进程")
+    if precision is not None:
+        print(f"平均得分的 {confidence:.0%} 置信区间半宽不超过 {precision} 时提前停止")
+
+    scores = RunningStats()  # 每个回合的得分
+    times = RunningStats()  # 每个回合的存活时间
+    rewards = RunningStats()  # 每个回合的总奖励
+    pipes_passed = RunningStats()  # 每个回合通过的管道数量
+
+    # 开始评估：单进程时直接在本进程运行，省去启动进程和重复加载模型的开销。
+    # 结果按种子顺序处理（imap 会等前面的回合完成），停止的位置与进程数无关
+    if workers == 1:
+        init_worker(model_path, server, record_dir, dataset_dir)
+        episodes = map(run_episode, seeds)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers, initializer=init_worker, initargs=(model_path, server, record_dir, dataset_dir))
+        episodes = pool.imap(run_episode, seeds)
+    stopped = False
+    try:
+        with open(stream_file, 'w') as stream:
+            for result in episodes:
+                scores.add(result['score'])
+                times.add(result['time'])
+                rewards.add(result['reward'])
+                pipes_passed.add(result['pipes_passed'])
+                half_width = scores.half_width(confidence)
+
+                # 每个回合的结果和当前的统计量立即写入结果流
+                record = dict(result, episode=scores.count, mean_score=scores.mean, std_score=scores.std(),
+                              p50_score=scores.percentile(50),
+                              ci_half_width=half_width if math.isfinite(half_width) else None)
+                stream.write(json.dumps(record) + '\n')
+                stream.flush()
+
+                # 实时显示评估进度
+                print(f"\r已完成 {scores.count}/{num_episodes} 个回合 | 得分: {result['score']} | "
+                      f"平均得分: {scores.mean:.2f} ± {half_width:.2f}", end="")
+
+                if precision is not None and scores.count >= min_episodes and half_width <= precision:
+                    stopped = True
+                    break
+    finally:
+        if pool is not None:
+            if stopped:
+                pool.terminate()  # 不再需要还在运行的回合
+            else:
+                pool.close()
+            pool.join()
+    if stopped:
+        print(f"\n平均得分已足够精确，评估 {scores.count} 个回合后提前停止")
+
+    # 统计指标
+    stats = {
+        '回合数': scores.count,                      # 实际评估的回合数
+        '平均得分': scores.mean,                     # 所有回合的平均得分
+        '最高得分': scores.max,                      # 所有回合中的最高得分
+        '平均存活时间': times.mean,                  # 所有回合的平均存活时间
+        '最长存活时间': times.max,                   # 所有回合中的最长存活时间
+        '平均奖励': rewards.mean,                    # 所有回合的平均奖励
+        '平均通过管道数': pipes_passed.mean,         # 所有回合的平均通过管道数
+        '最高通过管道数': pipes_passed.max,          # 所有回合中的最高通过管道数
+        '标准差': {
+            '得分': scores.std(),                    # 得分的标准差，反映稳定性
+            '存活时间': times.std(),                 # 存活时间的标准差
+            '奖励': rewards.std(),                   # 奖励的标准差
+            '通过管道数': pipes_passed.std()         # 通过管道数的标准差
+        },
+        '得分分位数': {
+            'p10': scores.percentile(10),
+            'p50': scores.percentile(50),
+            'p90': scores.percentile(90)
+        },
+        '平均得分置信区间半宽': scores.half_width(confidence) if scores.count > 1 else None
+    }
     
     # 保存评估结果到JSON文件
     results_file = os.path.join(results_dir, f"evaluation_{timestamp}.json")
@@ -100,45 +235,77 @@ def evaluate_model(model_path, num_episodes=10):
     # 打印评估结果
     print("\n评估完成!")
     print(f"结果已保存到: {results_file}")
+    print(f"每个回合的结果: {stream_file}")
+    if record_dir is not None:
+        print(f"回合录像: {record_dir}（python flappy_replay.py {record_dir} --seed <种子>）")
+    if dataset_dir is not None:
+        print(f"轨迹数据集: {dataset_dir}（python flappy_dataset.py {dataset_dir}）")
     print("\n评估统计:")
     for key, value in stats.items():
         if isinstance(value, dict):
             print(f"\n{key}:")
             for subkey, subvalue in value.items():
                 print(f"  {subkey}: {subvalue:.2f}")
+        elif isinstance(value, int) or value is None:
+            print(f"{key}: {value}")
         else:
             print(f"{key}: {value:.2f}")
+    return stats
 
 def main():
     """
     主函数：查找最新的模型文件并开始评估
     
     功能:
-        1. 在models目录下查找最新的模型文件
+        1. 在模型存档目录中查找模型（默认最新的）
         2. 调用evaluate_model函数进行评估
         3. 处理可能的错误情况
+        4. 把平均得分记录到存档目录
     """
+    parser = argparse.ArgumentParser(description='评估 Flappy Bird 模型')
+    parser.add_argument('--episodes', type=int, default=10, help='评估的回合数（提前停止时为最多回合数）')
+    parser.add_argument('--workers', type=int, default=None, help='并行评估的进程数，默认为 CPU 数')
+    parser.add_argument('--seed', type=int, default=0, help='第 i 个回合使用种子 seed + i')
+    parser.add_argument('--server', default=None, help='推理服务的 socket 路径（见 flappy_serve.py）')
+    parser.add_argument('--precision', type=float, default=None,
+                        help='平均得分置信区间的半宽不超过该值时提前停止')
+    parser.add_argument('--confidence', type=float, default=0.95, help='置信区间的置信度')
+    parser.add_argument('--min-episodes', type=int, default=10, help='提前停止前至少评估的回合数')
+    parser.add_argument('--run', default=None, help='只在指定的训练编号中查找模型')
+    parser.add_argument('--steps', type=int, default=None, help='使用指定步数的模型')
+    parser.add_argument('--best', action='store_true', help='使用评估得分最高的模型')
+    parser.add_argument('--numpy', action='store_true', help='导出并使用纯 NumPy 策略（不加载 torch）')
+    parser.add_argument('--record', action='store_true', help='保存每个回合的录像（可以按种子回放）')
+    parser.add_argument('--dataset', action='store_true', help='把每一步写入轨迹数据集（见 flappy_dataset.py）')
+    args = parser.parse_args()
+
     # 检查模型目录是否存在
     models_dir = "models"
     if not os.path.exists(models_dir):
         print("错误：未找到模型目录")
         return
-    
-    # 获取所有模型文件（.zip格式）
-    model_files = [f for f in os.listdir(models_dir) if f.startswith('model_') and f.endswith('.zip')]
-    if not model_files:
+
+    # 从模型存档目录中查找模型
+    catalog = CheckpointCatalog(models_dir)
+    entry = catalog.find(run=args.run, steps=args.steps, best=args.best, obs_type=OBS_VECTOR)  # 只能评估向量观察值的模型
+    if entry is None:
         print("错误：未找到模型文件")
         return
-    
-    # 根据文件名中的步数选择最新的模型
-    latest_model = max(model_files, key=lambda x: int(x.split('_')[1].split('.')[0]))
-    model_path = os.path.join(models_dir, latest_model)
-    
-    print(f"找到最新模型: {latest_model}")
+    model_path = catalog.file_path(entry)
+
+    print(f"找到模型: 训练 {entry['run']}，{entry['steps']} 步")
     print(f"模型路径: {model_path}")
     
-    # 开始评估
-    evaluate_model(model_path)
+    # 开始评估（--numpy 时各进程只加载导出的 NumPy 权重）
+    policy_path = exported_policy(model_path) if args.numpy else model_path
+    stats = evaluate_model(policy_path, num_episodes=args.episodes, server=args.server,
+                           workers=args.workers, seed=args.seed, precision=args.precision,
+                           confidence=args.confidence, min_episodes=args.min_episodes, record=args.record,
+                           dataset=args.dataset)
+
+    # 把平均得分记录到存档目录中，之后可以用 --best 选择得分最高的模型（没有完成任何回合时不记录）
+    if stats['回合数'] > 0:
+        catalog.set_score(model_path, stats['平均得分'])
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,34 +1,44 @@
-from stable_baselines3 import PPO
-import gymnasium as gym
-import os
-from flappy_env import FlappyEnv
-import time
+from flappy_env import FlappyEnv, OBS_VECTOR
+from flappy_serve import PolicyClient  # 推理服务客户端
+from flappy_checkpoints import CheckpointCatalog  # 模型存档目录
 
 # 加载预训练模型
 model_code = 1716117777  # 模型编号
 step = 290000  # 训练步数
 
-# 设置模型路径
-models_dir = f"models/{model_code}"
-model_path = f"{models_dir}/{step}.zip"
-
-# 创建和初始化环境
-env = FlappyEnv()
-env.reset()
-
-# 加载预训练模型
-model = PPO.load(model_path, env=env, tensorboard_log=models_dir)
+# 推理服务的 socket 路径（见 flappy_serve.py），为 None 时在本进程加载模型
+server_path = None
 
 # 设置测试回合数
 episodes = 50
 
-# 开始测试循环
-for episode in range(episodes):
-    done = False
-    obs, _ = env.reset()  # 获取观察值和信息
-    while not done:
-        env.render("human")  # 渲染游戏画面
-        action, _ = model.predict(obs)  # 使用模型预测动作
-        obs, reward, done, truncated, info = env.step(action)  # 执行动作
+def main():
+    # 设置模型路径：从模型存档目录中查找，目录中没有时使用旧的文件名
+    models_dir = f"models/{model_code}"
+    catalog = CheckpointCatalog("models")
+    entry = catalog.by_step(step, run=model_code, obs_type=OBS_VECTOR)
+    model_path = catalog.file_path(entry) if entry is not None else f"{models_dir}/{step}.zip"
+
+    # 创建和初始化环境（实时显示画面）
+    env = FlappyEnv(render_mode='human')
+    env.reset()
+
+    # 加载预训练模型（或连接推理服务）
+    if server_path is not None:
+        model = PolicyClient(server_path)
+    else:
+        from stable_baselines3 import PPO  # 只有在本进程加载模型时才导入 torch
+        model = PPO.load(model_path, env=env, tensorboard_log=models_dir)
+
+    # 开始测试循环
+    for episode in range(episodes):
+        done = False
+        obs, _ = env.reset()  # 获取观察值和信息
+        while not done:
+            action, _ = model.predict(obs)  # 使用模型预测动作
+            obs, reward, done, truncated, info = env.step(action)  # 执行动作
+
+    env.close()  # 关闭环境
 
-env.close()  # 关闭环境
+if __name__ == "__main__":
+    main()
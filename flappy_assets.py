@@ -0,0 +1,55 @@
+"""
+精灵资源图集
+
+每个进程中，每张图片（以及它的缩放、翻转版本和碰撞遮罩）只加载、转换一次，
+之后所有精灵共享同一个 Surface 和 Mask，生成新精灵时不再读磁盘、不再分配图片内存。
+转换图片需要已经调用过 pygame.display.set_mode。
+"""
+import pygame
+
+SPRITES_DIR = 'assets/sprites'  # 精灵图片目录
+
+_images = {}  # (名称, 尺寸, 是否翻转, 是否带透明通道) -> Surface
+_masks = {}  # (名称, 尺寸, 是否翻转) -> Mask
+
+
+def load_image(name, size=None, flip=False, alpha=True):
+    """
+    获取精灵图片
+
+    参数:
+        name: 图片名（不含目录和扩展名），如 'pipe-green'
+        size: 缩放后的 (宽, 高)，None 表示原始尺寸
+        flip: 是否上下翻转
+        alpha: 是否保留透明通道（背景图用 False 加快绘制）
+    返回:
+        共享的 Surface，调用方不要修改它
+    """
+    key = (name, size, flip, alpha)
+    image = _images.get(key)
+    if image is None:
+        if flip:
+            image = pygame.transform.flip(load_image(name, size, False, alpha), False, True)
+        elif size is not None:
+            image = pygame.transform.scale(load_image(name, None, False, alpha), size)
+        else:
+            image = pygame.image.load(f'{SPRITES_DIR}/{name}.png')
+            image = image.convert_alpha() if alpha else image.convert()
+        _images[key] = image
+    return image
+
+
+def load_mask(name, size=None, flip=False):
+    """获取与 load_image 对应图片的碰撞遮罩"""
+    key = (name, size, flip)
+    mask = _masks.get(key)
+    if mask is None:
+        mask = pygame.mask.from_surface(load_image(name, size, flip))
+        _masks[key] = mask
+    return mask
+
+
+def clear():
+    """清空缓存（重新创建显示窗口后可调用）"""
+    _images.clear()
+    _masks.clear()
@@ -0,0 +1,415 @@
+"""
+模型存档目录
+
+训练时每保存一个模型就在 models/catalog.json 中记录一条（训练编号、步数、保存时间、文件大小、评估得分），
+use_model.py、evaluate_model.py 和继续训练时直接从目录中查询最新、最好或指定步数的模型，
+不需要遍历每个训练目录、解析 model_<步数>.zip 文件名。
+
+目录文件先写入临时文件再原子替换，训练中途被打断也不会留下写了一半的目录。
+读取、修改、写入目录文件的整个过程持有锁文件（与 game_stats.py 相同），
+训练进程的后台保存和评估进程的 set_score 同时进行时不会丢掉对方的记录。
+还没有目录文件时（旧版本训练出的模型）扫描一次现有文件生成目录。
+
+CheckpointWriter 在后台线程保存模型：训练线程只在内存中复制一份策略和优化器状态，
+压缩、序列化、写盘和 fsync 都在后台完成，不再打断采样。
+"""
+import copy
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+CATALOG_FILE = 'catalog.json'  # 目录文件名，位于模型根目录下
+MODEL_FILE = re.compile(r'^model_(\d+)\.zip$')  # 训练保存的模型文件名
+# 没有记录观察值类型的模型（旧版本的记录、扫描生成的记录）视为向量观察值（flappy_env.OBS_VECTOR）
+DEFAULT_OBS_TYPE = 'vector'
+
+
+def tmp_file(path):
+    """path 的临时文件名（每个进程、每个线程不同，同时写入同一个文件时不会互相覆盖临时文件）"""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def write_json_atomic(path, data):
+    """写入 JSON 文件：先写临时文件并刷到磁盘，再原子替换，读者只会看到完整的旧文件或新文件"""
+    tmp_path = tmp_file(path)
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def acquire_file_lock(lock_path, timeout=10.0, stale=30.0):
+    """获取锁文件，超时抛出 TimeoutError；超过 stale 秒的锁视为残留并删除"""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.close(fd)
+            return
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > stale:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                pass
+            if time.time() > deadline:
+                raise TimeoutError(f"无法获取锁文件 {lock_path}")
+            time.sleep(0.01)
+
+
+class CheckpointCatalog:
+    """
+    模型存档目录
+
+    每条记录:
+        run: 训练编号（models 下的子目录名，旧版本直接放在 models 下的模型为空字符串）
+        steps: 训练步数
+        path: 相对模型根目录的文件路径
+        wall_time: 保存时间（时间戳）
+        size: 文件大小（字节）
+        eval_score: 评估得到的平均得分，没有评估过为 None
+        obs_type: 训练时的观察值类型（flappy_env.OBS_VECTOR / OBS_PIXELS），没有记录为 None
+
+    参数:
+        root: 模型根目录
+    """
+    def __init__(self, root='models'):
+        self.root = root
+        self.path = os.path.join(root, CATALOG_FILE)
+        self.lock_path = f"{self.path}.lock"
+        self.thread_lock = threading.RLock()  # 同一个目录对象可能被多个线程使用
+        self.lock_depth = 0  # 嵌套持有锁文件的层数
+        self.entries = []  # 按保存时间排列，最后一条是最新的
+        self.index = {}  # (run, steps) -> 记录
+        self.load()
+
+    def load(self):
+        """读取目录文件（没有目录文件时扫描现有模型生成）"""
+        self.entries = []
+        self.index = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                for entry in json.load(f)['checkpoints']:
+                    self.insert(entry)
+        elif os.path.isdir(self.root):
+            self.rebuild()
+
+    @contextmanager
+    def locked(self):
+        """持有目录的锁文件（可以嵌套），读取-修改-写入目录文件时使用"""
+        with self.thread_lock:
+            if self.lock_depth == 0:
+                os.makedirs(self.root, exist_ok=True)
+                acquire_file_lock(self.lock_path)
+            self.lock_depth += 1
+            try:
+                yield
+            finally:
+                self.lock_depth -= 1
+                if self.lock_depth == 0:
+                    os.remove(self.lock_path)
+
+    def save(self):
+        """原子地写入目录文件"""
+        with self.locked():
+            write_json_atomic(self.path, {'version': 1, 'checkpoints': self.entries})
+
+    def insert(self, entry):
+        """加入一条记录，同一训练同一步数的旧记录被替换"""
+        key = (entry['run'], entry['steps'])
+        old = self.index.get(key)
+        if old is not None:
+            self.entries.remove(old)
+        self.entries.append(entry)
+        self.index[key] = entry
+
+    def rebuild(self):
+        """扫描模型根目录和各训练目录中的 model_<步数>.zip，重新生成目录"""
+        found = []
+        for run in [''] + sorted(os.listdir(self.root)):
+            directory = os.path.join(self.root, run)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                match = MODEL_FILE.match(name)
+                if match:
+                    file_path = os.path.join(directory, name)
+                    found.append({
+                        'run': run,
+                        'steps': int(match.group(1)),
+                        'path': os.path.relpath(file_path, self.root),
+                        'wall_time': os.path.getmtime(file_path),
+                        'size': os.path.getsize(file_path),
+                        'eval_score': None
+                    })
+        self.entries = []
+        self.index = {}
+        for entry in sorted(found, key=lambda entry: entry['wall_time']):
+            self.insert(entry)
+        if found:
+            with self.locked():
+                if not os.path.exists(self.path):  # 其他进程可能已经生成了目录
+                    self.save()
+
+    def add(self, file_path, run, steps, eval_score=None, obs_type=None):
+        """
+        记录刚保存的模型
+
+        参数:
+            file_path: 模型文件路径（已经写完）
+            run: 训练编号
+            steps: 训练步数
+            eval_score: 评估得分
+            obs_type: 观察值类型
+        返回:
+            dict: 新的记录
+        """
+        entry = {
+            'run': str(run),
+            'steps': int(steps),
+            'path': os.path.relpath(file_path, self.root),
+            'wall_time': time.time(),
+            'size': os.path.getsize(file_path),
+            'eval_score': eval_score,
+            'obs_type': obs_type
+        }
+        with self.locked():
+            self.load()  # 合并其他进程写入的记录
+            self.insert(entry)
+            self.save()
+        return entry
+
+    def set_score(self, file_path, score):
+        """记录模型的评估得分，模型不在目录中时返回 None"""
+        relative = os.path.relpath(file_path, self.root)
+        with self.locked():
+            self.load()  # 合并其他进程写入的记录
+            for entry in self.entries:
+                if entry['path'] == relative:
+                    entry['eval_score'] = float(score)
+                    self.save()
+                    return entry
+        return None
+
+    def file_path(self, entry):
+        """记录对应的模型文件路径"""
+        return os.path.join(self.root, entry['path'])
+
+    def exists(self, entry):
+        return os.path.exists(self.file_path(entry))
+
+    @staticmethod
+    def matches(entry, run=None, obs_type=None):
+        """模型是否属于指定的训练编号和观察值类型（None 表示不限定）"""
+        if run is not None and entry['run'] != str(run):
+            return False
+        return obs_type is None or (entry.get('obs_type') or DEFAULT_OBS_TYPE) == obs_type
+
+    def latest(self, run=None, obs_type=None):
+        """最新保存的模型（可以限定训练编号和观察值类型），没有时返回 None"""
+        for entry in reversed(self.entries):
+            if self.matches(entry, run, obs_type) and self.exists(entry):
+                return entry
+        return None
+
+    def best(self, run=None, obs_type=None):
+        """评估得分最高的模型（得分相同时取步数多的），没有评估过的模型时返回 None"""
+        scored = [entry for entry in self.entries
+                  if entry['eval_score'] is not None and self.matches(entry, run, obs_type)]
+        for entry in sorted(scored, key=lambda entry: (entry['eval_score'], entry['steps']), reverse=True):
+            if self.exists(entry):
+                return entry
+        return None
+
+    def by_step(self, steps, run=None, obs_type=None):
+        """指定步数的模型（不限定训练编号时取最新的训练），没有时返回 None"""
+        if run is not None:
+            entry = self.index.get((str(run), int(steps)))
+            return entry if entry is not None and self.matches(entry, obs_type=obs_type) and self.exists(entry) else None
+        for entry in reversed(self.entries):
+            if entry['steps'] == int(steps) and self.matches(entry, obs_type=obs_type) and self.exists(entry):
+                return entry
+        return None
+
+    def find(self, run=None, steps=None, best=False, obs_type=None):
+        """按命令行参数查询：best 优先，其次指定步数，否则取最新的模型（可以限定观察值类型）"""
+        if best:
+            return self.best(run, obs_type)
+        if steps is not None:
+            return self.by_step(steps, run, obs_type)
+        return self.latest(run, obs_type)
+
+
+def snapshot_model(model):
+    """
+    在内存中复制保存模型所需的全部内容（与 BaseAlgorithm.save 写入的内容相同）
+
+    返回:
+        tuple: (data, params, pytorch_variables)，之后训练继续修改模型也不会影响它们
+    """
+    data = model.__dict__.copy()
+    exclude = set(model._excluded_save_params())
+    state_dicts_names, torch_variable_names = model._get_torch_save_params()
+    for name in state_dicts_names + torch_variable_names:
+        exclude.add(name.split('.')[0])  # 这些用 torch.save 单独保存
+    for name in exclude:
+        data.pop(name, None)
+    data = copy.deepcopy(data)
+
+    pytorch_variables = None
+    if torch_variable_names is not None:
+        from stable_baselines3.common.save_util import recursive_getattr
+        pytorch_variables = {name: copy.deepcopy(recursive_getattr(model, name)) for name in torch_variable_names}
+    # state_dict 中的张量与模型共享内存，复制后才是独立的快照
+    params = clone_state(model.get_parameters())
+    return data, params, pytorch_variables
+
+
+def clone_state(state):
+    """复制 state_dict（嵌套的字典、列表中的张量用 clone 复制，比 deepcopy 快得多）"""
+    if hasattr(state, 'detach'):
+        return state.detach().clone()
+    if isinstance(state, dict):
+        cloned = type(state)((key, clone_state(value)) for key, value in state.items())
+        if hasattr(state, '_metadata'):
+            cloned._metadata = copy.deepcopy(state._metadata)  # state_dict 的模块版本信息
+        return cloned
+    if isinstance(state, (list, tuple)):
+        return type(state)(clone_state(value) for value in state)
+    return copy.deepcopy(state)
+
+
+class CheckpointWriter:
+    """
+    后台保存模型
+
+    save() 在调用线程中只做内存快照，写文件在后台线程完成。后台线程还没来得及写的快照
+    被新的快照替换（只写最新的），写完后原子地替换目标文件、记录到存档目录，
+    并原子地写入训练状态文件。后台线程出错时，下一次 save() / flush() 会抛出这个错误。
+
+    参数:
+        catalog: CheckpointCatalog，写完的模型记录到这里（None 表示不记录）
+    """
+    def __init__(self, catalog=None):
+        self.catalog = catalog
+        self.condition = threading.Condition()
+        self.pending = None  # 等待写入的快照
+        self.writing = False
+        self.error = None
+        self.thread = None
+        self.closed = False
+
+        self.saved = 0  # 写入的模型数量
+        self.coalesced = 0  # 被更新的快照替换、没有写入的快照数量
+        self.snapshot_seconds = 0.0  # 训练线程花在快照上的总时间
+        self.write_seconds = 0.0  # 后台线程写文件的总时间
+
+    def save(self, model, path, run=None, state=None, state_path=None, obs_type=None):
+        """
+        保存模型
+
+        参数:
+            model: SB3 模型
+            path: 模型文件路径（.zip）
+            run: 训练编号，记录到存档目录
+            state: 训练状态，与模型一起写入 state_path（JSON）
+            obs_type: 观察值类型，记录到存档目录
+        """
+        self.raise_error()
+        start = time.perf_counter()
+        job = {
+            'snapshot': snapshot_model(model),
+            'path': path,
+            'run': run,
+            'steps': model.num_timesteps,
+            'state': state,
+            'state_path': state_path,
+            'obs_type': obs_type
+        }
+        self.snapshot_seconds += time.perf_counter() - start
+
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='checkpoint-writer', daemon=True)
+                self.thread.start()
+            if self.pending is not None:
+                self.coalesced += 1
+            self.pending = job
+            self.condition.notify_all()
+
+    def flush(self):
+        """等待所有快照写完"""
+        with self.condition:
+            while self.pending is not None or self.writing:
+                self.condition.wait()
+        self.raise_error()
+
+    def close(self):
+        """写完剩余的快照并结束后台线程"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.raise_error()
+
+    def raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def run(self):
+        """后台线程：逐个写入快照"""
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.pending is None:
+                    return
+                job, self.pending = self.pending, None
+                self.writing = True
+            try:
+                start = time.perf_counter()
+                self.write(job)
+                self.write_seconds += time.perf_counter() - start
+                self.saved += 1
+            except Exception as error:
+                self.error = error
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+
+    def write(self, job):
+        """把快照写成 SB3 的 zip 文件，刷到磁盘后原子替换"""
+        from stable_baselines3.common.save_util import save_to_zip_file
+
+        data, params, pytorch_variables = job['snapshot']
+        path = job['path']
+        tmp_path = tmp_file(path)
+        try:
+            with open(tmp_path, 'wb') as f:
+                save_to_zip_file(f, data=data, params=params, pytorch_variables=pytorch_variables)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if self.catalog is not None:
+            self.catalog.add(path, job['run'], job['steps'], obs_type=job['obs_type'])
+        if job['state_path'] is not None:
+            write_json_atomic(job['state_path'], job['state'])
@@ -0,0 +1,327 @@
+"""
+Flappy Bird 无界面物理核心
+
+只用纯 Python 标量和 NumPy 推进小鸟、管道、地面、计分和死亡判定，
+不依赖 pygame，也不需要显示设备。FlappyEnv 用它做仿真，pygame 只负责可选的画面显示。
+"""
+import random
+from collections import deque
+
+import numpy as np
+
+# 游戏基本参数设置
+SCREEN_WIDHT = 400  # 游戏窗口宽度
+SCREEN_HEIGHT = 600  # 游戏窗口高度
+SPEED = 20  # 小鸟初始速度
+GRAVITY = 2.5  # 重力加速度
+GAME_SPEED = 15  # 游戏整体速度
+
+# 地面和管道参数
+GROUND_WIDHT = 2 * SCREEN_WIDHT  # 地面宽度
+GROUND_HEIGHT = 100  # 地面高度
+PIPE_WIDHT = 80  # 管道宽度
+PIPE_HEIGHT = 500  # 管道高度
+PIPE_GAP = 150  # 管道间隙
+
+# 小鸟参数（与 bluebird 精灵图尺寸一致）
+BIRD_WIDTH = 34  # 小鸟宽度
+BIRD_HEIGHT = 24  # 小鸟高度
+BIRD_X = int(SCREEN_WIDHT / 6)  # 小鸟水平位置（Rect 会截断为整数）
+
+# 管道遮罩形状：pipe-green.png 缩放到 80x500 后，管口 38 行占满整个宽度，
+# 管身只有第 4~76 列不透明
+PIPE_LIP_HEIGHT = 38  # 管口高度
+PIPE_BODY_LEFT = 4  # 管身最左侧不透明列
+PIPE_BODY_RIGHT = 76  # 管身最右侧不透明列
+
+# 小鸟三个动画帧（upflap、midflap、downflap）碰撞遮罩每一行不透明像素的左右边界（含端点），
+# 每行的不透明像素都是连续的
+BIRD_FRAME_ROWS = (
+    ((12, 23), (12, 23), (8, 25), (8, 25), (6, 27), (6, 27), (2, 29), (2, 29),
+     (0, 29), (0, 29), (0, 29), (0, 29), (0, 31), (0, 31), (2, 33), (2, 33),
+     (4, 31), (4, 31), (4, 31), (4, 31), (6, 29), (6, 29), (10, 19), (10, 19)),
+    ((12, 23), (12, 23), (8, 25), (8, 25), (6, 27), (6, 27), (4, 29), (4, 29),
+     (2, 29), (2, 29), (2, 29), (2, 29), (0, 31), (0, 31), (0, 33), (0, 33),
+     (2, 31), (2, 31), (4, 31), (4, 31), (6, 29), (6, 29), (10, 19), (10, 19)),
+    ((12, 23), (12, 23), (8, 25), (8, 25), (6, 27), (6, 27), (4, 29), (4, 29),
+     (2, 29), (2, 29), (2, 29), (2, 29), (2, 31), (2, 31), (0, 33), (0, 33),
+     (0, 31), (0, 31), (0, 31), (0, 31), (2, 29), (2, 29), (10, 19), (10, 19)),
+)
+# Bird 的 mask 只在创建时由 upflap 帧生成、之后不再更新，所以碰撞始终按这一帧计算
+BIRD_MASK_FRAME = 0
+BIRD_MASK_ROWS = BIRD_FRAME_ROWS[BIRD_MASK_FRAME]
+
+
+def build_spans(rows):
+    """
+    预先计算小鸟任意连续行 [r0, r1) 中不透明像素的最左、最右列
+
+    返回:
+        spans[r0][r1] 为 (最左列, 最右列)，r0 >= r1 时为 None
+    """
+    spans = []
+    for r0 in range(len(rows) + 1):
+        spans.append([None] * (len(rows) + 1))
+        left, right = BIRD_WIDTH, -1
+        for r1 in range(r0 + 1, len(rows) + 1):
+            left = min(left, rows[r1 - 1][0])
+            right = max(right, rows[r1 - 1][1])
+            spans[r0][r1] = (left, right)
+    return spans
+
+
+# 每个动画帧的碰撞剖面
+BIRD_FRAME_SPANS = tuple(build_spans(rows) for rows in BIRD_FRAME_ROWS)
+BIRD_MASK_SPANS = BIRD_FRAME_SPANS[BIRD_MASK_FRAME]
+
+
+def hits_rect(bird_x, bird_y, top, bottom, left, right, spans=BIRD_MASK_SPANS):
+    """
+    小鸟遮罩是否与完全不透明的矩形（行 [top, bottom)，列 [left, right]）重叠
+
+    管道和地面都比小鸟宽，矩形与这些行的左右边界相交时一定覆盖了最左或最右的不透明像素，
+    所以结果与逐像素的遮罩检测一致
+    """
+    r0 = max(top - bird_y, 0)
+    r1 = min(bottom - bird_y, BIRD_HEIGHT)
+    if r0 >= r1:
+        return False
+    span_left, span_right = spans[r0][r1]
+    return bird_x + span_left <= right and bird_x + span_right >= left
+
+
+def hits_pipe_sprite(bird_x, bird_y, pipe_x, pipe_y, inverted, spans=BIRD_MASK_SPANS):
+    """
+    小鸟是否碰到一根管道（pipe_x, pipe_y 为管道 Rect 的左上角）
+
+    管道遮罩由两个矩形组成：管口 38 行占满 80 列，管身只有第 4~76 列，倒置的管道管口在下方
+    """
+    if pipe_x > bird_x + BIRD_WIDTH - 1 or pipe_x + PIPE_WIDHT <= bird_x:
+        return False
+    lip_top = pipe_y + PIPE_HEIGHT - PIPE_LIP_HEIGHT if inverted else pipe_y
+    body_top = pipe_y if inverted else pipe_y + PIPE_LIP_HEIGHT
+    return (hits_rect(bird_x, bird_y, lip_top, lip_top + PIPE_LIP_HEIGHT,
+                      pipe_x, pipe_x + PIPE_WIDHT - 1, spans) or
+            hits_rect(bird_x, bird_y, body_top, body_top + PIPE_HEIGHT - PIPE_LIP_HEIGHT,
+                      pipe_x + PIPE_BODY_LEFT, pipe_x + PIPE_BODY_RIGHT, spans))
+
+
+def hits_ground_sprite(bird_x, bird_y, ground_x, spans=BIRD_MASK_SPANS):
+    """小鸟是否碰到一块地面（地面图片完全不透明）"""
+    return hits_rect(bird_x, bird_y, SCREEN_HEIGHT - GROUND_HEIGHT, SCREEN_HEIGHT,
+                     ground_x, ground_x + GROUND_WIDHT - 1, spans)
+
+
+def hits_sprites(bird_rect, grounds, pipes, spans=BIRD_MASK_SPANS):
+    """
+    精灵版本的碰撞检测，结果与 groupcollide(..., collide_mask) 一致
+
+    参数:
+        bird_rect: 小鸟的 Rect
+        grounds: 地面精灵
+        pipes: 管道精灵（需要 inverted 属性）
+    """
+    bird_x, bird_y = bird_rect[0], bird_rect[1]
+    for ground in grounds:
+        if hits_ground_sprite(bird_x, bird_y, ground.rect[0], spans):
+            return True
+    for pipe in pipes:
+        if hits_pipe_sprite(bird_x, bird_y, pipe.rect[0], pipe.rect[1], pipe.inverted, spans):
+            return True
+    return False
+
+
+class PipePairs(deque):
+    """
+    按生成顺序排列的管道对队列（最旧的在最前面）
+
+    元素可以是任意对象：物理核心中为 [x, 下管道高度, 是否已计分]，游戏中为 (下管道, 上管道) 精灵对。
+    所有管道以同样的速度移动，小鸟总是按生成顺序越过它们，所以用 cursor 记录下一对还没有计分的
+    管道，计分时只检查这一对，不需要扫描整个精灵组。
+    继承 deque，遍历和按下标访问都在 C 里完成，每帧遍历管道不会比列表慢。
+
+    属性:
+        cursor: 下一对还没有计分的管道的下标
+    """
+    def __init__(self, pairs=()):
+        super().__init__(pairs)
+        self.cursor = 0
+
+    def popleft(self):
+        """移除并返回最旧的管道对"""
+        pair = super().popleft()
+        if self.cursor > 0:
+            self.cursor -= 1
+        return pair
+
+    def clear(self):
+        """清空所有管道对"""
+        super().clear()
+        self.cursor = 0
+
+    def next_unscored(self):
+        """下一对还没有计分的管道，全部计过分时返回 None"""
+        if self.cursor < len(self):
+            return self[self.cursor]
+        return None
+
+    def mark_scored(self):
+        """把 next_unscored 返回的管道对标记为已计分，游标移到下一对"""
+        self.cursor += 1
+
+
+class FlappyCore:
+    """
+    单个 Flappy Bird 世界的无界面仿真
+
+    属性:
+        bird_y: 小鸟 Rect 的 y 坐标（整数）
+        bird_speed: 小鸟竖直速度
+        bird_frame: 小鸟当前动画帧
+        ground_x: 两块地面的 x 坐标
+        pipes: 管道对队列（PipePairs），每项为 [x, 下管道高度, 是否已计分]，按生成顺序排列
+        spawned: 累计生成的管道对数量
+        frame: 当前回合帧数
+        moves: 当前回合跳跃次数
+        score: 当前回合得分
+        done: 小鸟是否已死亡
+    """
+    def __init__(self, rng=None):
+        # 默认使用全局 random，与原来 get_random_pipes 的随机序列保持一致
+        self.rng = rng if rng is not None else random
+        self.profiler = None  # 可选的 PhaseProfiler，记录 step 各阶段耗时
+        self.reset()
+
+    def seed(self, seed):
+        """使用独立的随机数生成器，保证管道序列可复现"""
+        self.rng = random.Random(seed)
+
+    def reset(self):
+        """重置世界状态"""
+        self.bird_y = int(SCREEN_HEIGHT / 2)
+        self.bird_speed = SPEED
+        self.bird_frame = 0
+        self.frame = 0
+        self.moves = 0
+        self.score = 0
+        self.done = False
+
+        self.ground_x = [GROUND_WIDHT * i for i in range(2)]
+        self.pipes = PipePairs()
+        self.spawned = 0
+        for i in range(2):
+            self.spawn_pipe(SCREEN_WIDHT * i + 800)
+
+        # 开始动画：小鸟切换一帧，地面先滚动一次
+        self.bird_frame = (self.bird_frame + 1) % 3
+        self.ground_x = [x - GAME_SPEED for x in self.ground_x]
+
+    def spawn_pipe(self, xpos):
+        """在 xpos 处生成一对随机高度的管道"""
+        size = self.rng.randint(100, 300)
+        self.pipes.append([xpos, size, False])
+        self.spawned += 1
+
+    def bird_center(self):
+        """获取小鸟中心点坐标"""
+        return BIRD_X + BIRD_WIDTH / 2, self.bird_y + BIRD_HEIGHT / 2
+
+    def observe(self):
+        """
+        计算观察值
+
+        返回:
+            tuple: (到上管道的距离, 到下管道的距离, 水平距离)，均归一化到 [-1, 1]
+        """
+        center_x, center_y = self.bird_center()
+        pipe_x, size, _ = self.pipes[0]
+        top_y = SCREEN_HEIGHT - size - PIPE_GAP
+        bottom_y = SCREEN_HEIGHT - size
+
+        bird_to_top = min(max((center_y - top_y) / SCREEN_HEIGHT, -1.0), 1.0)
+        bird_to_bot = min(max((center_y - bottom_y) / SCREEN_HEIGHT, -1.0), 1.0)
+        h_dist = min(max((pipe_x - center_x) / SCREEN_WIDHT, -1.0), 1.0)
+        return bird_to_top, bird_to_bot, h_dist
+
+    def observation(self):
+        """以 float32 数组形式返回观察值"""
+        return np.array(self.observe(), dtype=np.float32)
+
+    def step(self, action):
+        """
+        推进一帧
+
+        参数:
+            action: 0 不跳，1 跳跃
+        返回:
+            int: 死亡惩罚，存活为 0，撞到管道或地面为 -1，飞出屏幕顶部为 -2
+        """
+        prof = self.profiler
+        self.frame += 1
+
+        if action == 1:
+            self.bird_speed = -SPEED
+            self.moves += 1
+
+        # 地面循环
+        if self.ground_x[0] < -GROUND_WIDHT:
+            self.ground_x.pop(0)
+            self.ground_x.append(GROUND_WIDHT - 20)
+
+        # 管道循环
+        if self.pipes[0][0] < -PIPE_WIDHT:
+            self.pipes.popleft()
+            self.spawn_pipe(SCREEN_WIDHT * 2)
+        if prof:
+            prof.mark('core.respawn')
+
+        # 计分系统：小鸟越过管道右边缘时每对管道计一分，只需检查下一对没有计分的管道
+        pipes = self.pipes
+        while pipes.cursor < len(pipes) and BIRD_X > pipes[pipes.cursor][0] + PIPE_WIDHT:
+            self.score += 1
+            pipes[pipes.cursor][2] = True
+            pipes.cursor += 1
+        if prof:
+            prof.mark('core.scoring')
+
+        # 更新小鸟、地面和管道
+        self.bird_frame = (self.bird_frame + 1) % 3
+        self.bird_speed += GRAVITY
+        self.bird_y = int(self.bird_y + self.bird_speed)
+        for i in range(len(self.ground_x)):
+            self.ground_x[i] -= GAME_SPEED
+        for pipe in self.pipes:
+            pipe[0] -= GAME_SPEED
+        if prof:
+            prof.mark('core.update')
+
+        # 检查是否死亡
+        death_penalty = 0
+        out_of_top = self.bird_y + BIRD_HEIGHT / 2 < 0
+        if self.hits_ground() or self.hits_pipe() or out_of_top:
+            death_penalty = -2 if out_of_top else -1
+            self.done = True
+        if prof:
+            prof.mark('core.collision')
+        return death_penalty
+
+    def hits_ground(self):
+        """检查小鸟是否碰到地面"""
+        if self.bird_y + BIRD_HEIGHT <= SCREEN_HEIGHT - GROUND_HEIGHT:
+            return False  # 还没有到达地面所在的行
+        for x in self.ground_x:
+            if hits_ground_sprite(BIRD_X, self.bird_y, x):
+                return True
+        return False
+
+    def hits_pipe(self):
+        """检查小鸟是否碰到管道（按碰撞剖面比较，结果与 collide_mask 一致）"""
+        for pipe_x, size, _ in self.pipes:
+            if pipe_x > BIRD_X + BIRD_WIDTH - 1 or pipe_x + PIPE_WIDHT <= BIRD_X:
+                continue  # 管道与小鸟所在的列不重叠
+            bottom_top = SCREEN_HEIGHT - size  # 下管道上沿
+            top_bottom = bottom_top - PIPE_GAP  # 上管道下沿
+            if (hits_pipe_sprite(BIRD_X, self.bird_y, pipe_x, bottom_top, False) or
+                    hits_pipe_sprite(BIRD_X, self.bird_y, pipe_x, top_bottom - PIPE_HEIGHT, True)):
+                return True
+        return False
@@ -0,0 +1,394 @@
+"""
+轨迹数据集
+
+把每一步的 (观察值, 动作, 奖励, 是否结束, 得分, 帧数) 写入按块预分配的 NumPy memmap 文件，
+用于离线分析和离线强化学习。数据集目录的内容：
+    meta.json            字段、块大小、已提交的转移数和回合数（原子替换）
+    <字段>_<块号>.npy     每块 chunk_size 行，创建时整块预分配（close 时最后一块截断到实际行数），
+                         也可以直接 np.load(..., mmap_mode='r')
+    episodes.bin         回合索引：每个回合的起始行、长度、得分、是否死亡
+
+同一个回合的转移总是连续存放：每个世界的当前回合先写入内存中的暂存数组，回合结束时整段复制到 memmap。
+flush() 先把 memmap 刷到磁盘、追加回合索引，最后原子替换 meta.json，读取方只会看到已经提交的数据。
+
+写入：训练时 --dataset（SB3 回调，见 flappy_train.py 的 TrajectoryCallback）、评估时 --dataset，
+或者包装任意 FlappyEnv：
+    env = TrajectoryWrapper(FlappyEnv(), 'datasets/play')
+读取（不把数据读入内存，只映射用到的部分）：
+    dataset = TrajectoryDataset('datasets/1716117777')
+    columns = dataset.slice(0, 1_000_000, fields=['reward', 'done'])
+    episode = dataset.episode(42)
+    batch = dataset.sample(256)
+"""
+import json
+import os
+
+import gymnasium as gym
+import numpy as np
+
+from flappy_checkpoints import write_json_atomic  # 原子写入 JSON
+
+META_FILE = 'meta.json'
+INDEX_FILE = 'episodes.bin'
+VERSION = 1
+CHUNK_BYTES = 256 << 20  # 默认每块观察值文件的字节数（块的行数由观察值的大小决定，画面观察值的块不会过大）
+STAGE_ROWS = 256  # 暂存数组的初始行数（回合更长时自动扩容）
+# 除观察值以外的字段（观察值的形状和 dtype 取自观察空间）
+FIELDS = {'action': np.uint8, 'reward': np.float32, 'done': np.bool_, 'score': np.int32, 'frame': np.int32}
+# 回合索引的一行：起始行、长度、最终得分、是否死亡（没有结束就被重置或停止写入的回合为 False）
+EPISODE_DTYPE = np.dtype([('start', '<i8'), ('length', '<i4'), ('score', '<i4'), ('done', '?')])
+
+
+def chunk_file(directory, name, index):
+    return os.path.join(directory, f"{name}_{index:05d}.npy")
+
+
+class TrajectoryWriter:
+    """
+    把 num_envs 个世界的转移写入数据集目录
+
+    参数:
+        directory: 数据集目录（不能已经有数据集）
+        obs_shape: 观察值形状
+        obs_dtype: 观察值 dtype
+        num_envs: 世界数量，add() 的每个参数的第一维都是世界（只有一个世界时也可以传标量）
+        chunk_size: 每个 memmap 文件的行数，None 时按 CHUNK_BYTES 和观察值的大小计算
+    """
+    def __init__(self, directory, obs_shape, obs_dtype=np.float32, num_envs=1, chunk_size=None):
+        if os.path.exists(os.path.join(directory, META_FILE)):
+            raise FileExistsError(f"{directory} 中已经有数据集")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fields = {'obs': (tuple(obs_shape), np.dtype(obs_dtype))}
+        self.fields.update((name, ((), np.dtype(dtype))) for name, dtype in FIELDS.items())
+        if chunk_size is None:
+            chunk_size = max(1, CHUNK_BYTES // (int(np.prod(obs_shape)) * np.dtype(obs_dtype).itemsize))
+        self.chunk_size = chunk_size
+
+        self.length = 0  # 已经复制到 memmap 的转移数
+        self.episodes = 0  # 已经复制到 memmap 的回合数
+        self.pending_index = []  # 尚未写入索引文件的回合
+        self.chunk = None  # 当前块的 {字段: memmap}
+        self.chunk_index = -1
+
+        # 暂存数组：(行, 世界, ...)，每个世界记住当前回合从哪一行开始
+        self.stage = {name: np.zeros((STAGE_ROWS, num_envs) + shape, dtype)
+                      for name, (shape, dtype) in self.fields.items()}
+        self.stage_length = 0
+        self.start = np.zeros(num_envs, dtype=np.int64)
+        self.flush()  # 写入空数据集的 meta.json
+
+    def add(self, obs, actions, rewards, dones, scores, frames):
+        """
+        加入所有世界刚推进的一步，写入结束的回合
+
+        参数:
+            obs: 推进前的观察值（动作所依据的观察值）
+            actions, rewards, dones: 动作、奖励、是否结束
+            scores, frames: 推进后的得分和帧数
+        """
+        if self.stage_length == len(self.stage['obs']):
+            self.compact()
+        row = self.stage_length
+        stage = self.stage
+        stage['obs'][row] = obs
+        stage['action'][row] = actions
+        stage['reward'][row] = rewards
+        stage['done'][row] = dones
+        stage['score'][row] = scores
+        stage['frame'][row] = frames
+        self.stage_length = row + 1
+        done = stage['done'][row]
+        if np.count_nonzero(done):  # 比 any() 快得多，每步都要调用
+            for i in np.flatnonzero(done).tolist():
+                self.end_episode(i, True)
+
+    def end_episode(self, i, done):
+        """把第 i 个世界的当前回合复制到 memmap（done=False 表示回合没有结束就被截断），回合为空时什么也不做"""
+        start = int(self.start[i])
+        if start == self.stage_length:
+            return
+        self.write_episode({name: self.stage[name][start:self.stage_length, i] for name in self.fields}, done)
+        self.start[i] = self.stage_length
+
+    def write_episode(self, columns, done):
+        """把一个完整的回合（{字段: 数组}，按时间顺序）复制到 memmap"""
+        count = len(columns['obs'])
+        self.pending_index.append((self.length, count, int(columns['score'][-1]), done))
+        self.episodes += 1
+        written = 0
+        while written < count:
+            index, offset = divmod(self.length, self.chunk_size)
+            if index != self.chunk_index:
+                self.open_chunk(index)
+            n = min(count - written, self.chunk_size - offset)
+            for name, column in columns.items():
+                self.chunk[name][offset:offset + n] = column[written:written + n]
+            written += n
+            self.length += n
+
+    def open_chunk(self, index):
+        """把写满的块刷到磁盘，创建（预分配）下一块"""
+        if self.chunk is not None:
+            for array in self.chunk.values():
+                array.flush()
+        self.chunk = {name: np.lib.format.open_memmap(chunk_file(self.directory, name, index), mode='w+',
+                                                      dtype=dtype, shape=(self.chunk_size,) + shape)
+                      for name, (shape, dtype) in self.fields.items()}
+        self.chunk_index = index
+
+    def compact(self):
+        """暂存数组写满：丢掉所有世界都不再需要的行，剩余的行仍然超过一半时扩容"""
+        keep = int(self.start.min())
+        used = self.stage_length - keep
+        for name, array in self.stage.items():
+            target = array if used < len(array) // 2 else np.zeros((len(array) * 2,) + array.shape[1:], array.dtype)
+            target[:used] = array[keep:self.stage_length]
+            self.stage[name] = target
+        self.stage_length = used
+        self.start -= keep
+
+    def flush(self):
+        """提交已经复制到 memmap 的回合：刷新 memmap，追加回合索引，最后原子替换 meta.json"""
+        if self.chunk is not None:
+            for array in self.chunk.values():
+                array.flush()
+        if self.pending_index:
+            with open(os.path.join(self.directory, INDEX_FILE), 'ab') as f:
+                f.write(np.array(self.pending_index, dtype=EPISODE_DTYPE).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            self.pending_index = []
+        write_json_atomic(os.path.join(self.directory, META_FILE), {
+            'version': VERSION,
+            'fields': {name: [list(shape), dtype.str] for name, (shape, dtype) in self.fields.items()},
+            'chunk_size': self.chunk_size,
+            'chunks': self.chunk_index + 1,
+            'length': self.length,
+            'episodes': self.episodes
+        })
+
+    def truncate_chunk(self):
+        """把最后一块截断到实际行数（预分配的空行不再占用磁盘空间，复制数据集时也不会变大）"""
+        rows = self.length - self.chunk_index * self.chunk_size
+        if self.chunk is None or rows >= self.chunk_size:
+            return
+        for name, array in self.chunk.items():
+            path = chunk_file(self.directory, name, self.chunk_index)
+            tmp_path = f"{path}.tmp"
+            truncated = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=array.dtype, shape=(rows,) + array.shape[1:])
+            truncated[:] = array[:rows]
+            truncated.flush()
+            del truncated
+            os.replace(tmp_path, path)
+        self.chunk = None
+
+    def close(self):
+        """把所有世界没有结束的回合写入（标记为未结束）并提交，最后一块截断到实际行数"""
+        if self.stage is None:
+            return
+        for i in range(len(self.start)):
+            self.end_episode(i, False)
+        self.flush()
+        self.truncate_chunk()
+        self.chunk = None
+        self.stage = None
+
+
+class TrajectoryWrapper(gym.Wrapper):
+    """
+    把被包装环境的每一步写入轨迹数据集
+
+    当前回合先追加到 Python 列表（每步只有几次 append），回合结束时一次写入。
+
+    参数:
+        env: FlappyEnv（info 中需要有 score 和 time）
+        directory: 数据集目录
+        chunk_size: 每个 memmap 文件的行数，None 时按观察值的大小计算
+        flush_every: 回合结束时，距上次提交已经写入这么多转移就提交一次（close 时也会提交）
+    """
+    def __init__(self, env, directory, chunk_size=None, flush_every=100_000):
+        super().__init__(env)
+        space = env.observation_space
+        self.writer = TrajectoryWriter(directory, space.shape, space.dtype, chunk_size=chunk_size)
+        self.flush_every = flush_every
+        self.flushed_length = 0
+        self.rows = {name: [] for name in self.writer.fields}
+        self.last_obs = None
+
+    def reset(self, **kwargs):
+        self.end_episode(False)  # 没有结束就被重置的回合
+        obs, info = self.env.reset(**kwargs)
+        self.last_obs = np.array(obs)  # 画面观察值是环境缓冲区的视图，下一步会被覆盖，需要复制
+        return obs, info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        rows = self.rows
+        rows['obs'].append(self.last_obs)
+        rows['action'].append(action)
+        rows['reward'].append(reward)
+        rows['done'].append(terminated)
+        rows['score'].append(info['score'])
+        rows['frame'].append(info['time'])
+        self.last_obs = np.array(obs)
+        if terminated or truncated:
+            self.end_episode(terminated)
+        return obs, reward, terminated, truncated, info
+
+    def end_episode(self, done):
+        """写入当前回合，距上次提交已经足够多时提交"""
+        if not self.rows['obs']:
+            return
+        self.writer.write_episode({name: np.array(values, dtype=self.writer.fields[name][1])
+                                   for name, values in self.rows.items()}, done)
+        self.rows = {name: [] for name in self.rows}
+        if self.writer.length - self.flushed_length >= self.flush_every:
+            self.writer.flush()
+            self.flushed_length = self.writer.length
+
+    def close(self):
+        self.end_episode(False)
+        self.writer.close()
+        super().close()
+
+
+def dataset_dirs(path):
+    """数据集目录列表：path 本身是数据集时只有它，否则为其中所有的数据集子目录（按名称排列）"""
+    if os.path.exists(os.path.join(path, META_FILE)):
+        return [path]
+    return sorted(os.path.join(path, name) for name in os.listdir(path)
+                  if os.path.exists(os.path.join(path, name, META_FILE)))
+
+
+class TrajectoryDataset:
+    """
+    读取轨迹数据集，数据留在磁盘上，按需映射
+
+    多个数据集目录（例如评估时每个工作进程一个）按目录名顺序拼接成一个数据集。
+    slice / episode 在同一块内时返回 memmap 视图，跨块时才复制。
+
+    参数:
+        path: 数据集目录，或者包含多个数据集目录的目录
+    """
+    def __init__(self, path):
+        directories = dataset_dirs(path)
+        if not directories:
+            raise FileNotFoundError(f"{path} 中没有数据集")
+        self.fields = None
+        self.chunks = []  # 每块的 {字段: 有效行的 memmap 视图}
+        starts = []  # 每块第一行在整个数据集中的位置
+        episodes = []
+        self.length = 0
+        for directory in directories:
+            with open(os.path.join(directory, META_FILE), 'r') as f:
+                meta = json.load(f)
+            if meta['version'] != VERSION:
+                raise ValueError(f"{directory} 的数据集版本不一致")
+            fields = {name: (tuple(shape), np.dtype(dtype)) for name, (shape, dtype) in meta['fields'].items()}
+            if self.fields is not None and fields != self.fields:
+                raise ValueError(f"{directory} 的字段与其他数据集不一致")
+            self.fields = fields
+
+            for index in range(meta['chunks']):
+                rows = min(meta['chunk_size'], meta['length'] - index * meta['chunk_size'])
+                if rows <= 0:
+                    break
+                self.chunks.append({name: np.load(chunk_file(directory, name, index), mmap_mode='r')[:rows]
+                                    for name in fields})
+                starts.append(self.length + index * meta['chunk_size'])
+            if meta['episodes']:
+                index = np.fromfile(os.path.join(directory, INDEX_FILE), dtype=EPISODE_DTYPE, count=meta['episodes'])
+                index['start'] += self.length
+                episodes.append(index)
+            self.length += meta['length']
+        self.starts = np.array(starts, dtype=np.int64)
+        self.episodes = np.concatenate(episodes) if episodes else np.zeros(0, dtype=EPISODE_DTYPE)
+
+    def __len__(self):
+        return self.length
+
+    def columns(self, fields):
+        return list(self.fields) if fields is None else list(fields)
+
+    def slice(self, start, stop, fields=None):
+        """
+        第 start 行到第 stop 行（不含）的转移
+
+        返回:
+            dict: {字段: 数组}，范围在同一块内时为 memmap 视图（只读，不占内存）
+        """
+        fields = self.columns(fields)
+        start, stop, _ = slice(start, stop).indices(self.length)
+        pieces = {name: [] for name in fields}
+        position = start
+        chunk = int(np.searchsorted(self.starts, start, side='right')) - 1
+        while position < stop:
+            offset = position - self.starts[chunk]
+            end = min(stop, self.starts[chunk] + len(self.chunks[chunk]['obs']))
+            for name in fields:
+                pieces[name].append(self.chunks[chunk][name][offset:end - self.starts[chunk]])
+            position = end
+            chunk += 1
+        result = {}
+        for name in fields:
+            shape, dtype = self.fields[name]
+            if not pieces[name]:
+                result[name] = np.zeros((0,) + shape, dtype)
+            elif len(pieces[name]) == 1:
+                result[name] = pieces[name][0]
+            else:
+                result[name] = np.concatenate(pieces[name])
+        return result
+
+    def episode(self, index, fields=None):
+        """第 index 个回合的所有转移"""
+        start, length = int(self.episodes['start'][index]), int(self.episodes['length'][index])
+        return self.slice(start, start + length, fields)
+
+    def iter_chunks(self, fields=None):
+        """逐块遍历整个数据集，产出 (起始行, {字段: memmap 视图})，每次只映射一块"""
+        fields = self.columns(fields)
+        for start, chunk in zip(self.starts.tolist(), self.chunks):
+            yield start, {name: chunk[name] for name in fields}
+
+    def sample(self, batch_size, rng=None, fields=None):
+        """均匀随机抽取 batch_size 个转移（复制到内存）"""
+        fields = self.columns(fields)
+        rng = rng if rng is not None else np.random.default_rng()
+        rows = rng.integers(0, self.length, size=batch_size)
+        chunk_ids = np.searchsorted(self.starts, rows, side='right') - 1
+        batch = {name: np.empty((batch_size,) + self.fields[name][0], self.fields[name][1]) for name in fields}
+        for chunk in np.unique(chunk_ids).tolist():
+            mask = chunk_ids == chunk
+            local = rows[mask] - self.starts[chunk]
+            for name in fields:
+                batch[name][mask] = self.chunks[chunk][name][local]
+        return batch
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='轨迹数据集概况')
+    parser.add_argument('path', help='数据集目录，或者包含多个数据集目录的目录')
+    args = parser.parse_args()
+
+    dataset = TrajectoryDataset(args.path)
+    episodes = dataset.episodes
+    print(f"转移数: {len(dataset)}，回合数: {len(episodes)}（其中 {int((~episodes['done']).sum())} 个未结束）")
+    for name, (shape, dtype) in dataset.fields.items():
+        print(f"  {name:<8}{dtype.name:<10}{shape}")
+    if len(episodes):
+        print(f"回合长度: 平均 {episodes['length'].mean():.1f}，最长 {episodes['length'].max()}")
+        print(f"回合得分: 平均 {episodes['score'].mean():.2f}，最高 {episodes['score'].max()}")
+    # 逐块统计，不把整个数据集读入内存
+    reward_sum = 0.0
+    for _, chunk in dataset.iter_chunks(['reward']):
+        reward_sum += float(chunk['reward'].sum(dtype=np.float64))
+    if len(dataset):
+        print(f"平均每步奖励: {reward_sum / len(dataset):.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,306 +1,232 @@
 import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
-import pygame, random, time
-from pygame.locals import *
+import time
 from game_stats import GameStats  # 导入新的统计系统
-
-# 游戏基本参数设置
-SCREEN_WIDHT = 400  # 游戏窗口宽度
-SCREEN_HEIGHT = 600  # 游戏窗口高度
-SPEED = 20  # 小鸟初始速度
-GRAVITY = 2.5  # 重力加速度
-GAME_SPEED = 15  # 游戏整体速度
-
-# 地面和管道参数
-GROUND_WIDHT = 2 * SCREEN_WIDHT  # 地面宽度
-GROUND_HEIGHT= 100  # 地面高度
-PIPE_WIDHT = 80  # 管道宽度
-PIPE_HEIGHT = 500  # 管道高度
-PIPE_GAP = 150  # 管道间隙
+from flappy_pool import SpritePool  # 精灵对象池
+from flappy_profiler import PhaseProfiler  # 分阶段耗时统计
+from flappy_startup import lazy_import, init_pygame  # 延迟导入、pygame 初始化
+from flappy_live import LivePublisher  # 共享内存实时画面
+from flappy_replay import EpisodeRecorder  # 回合录像
+
+from flappy_core import (FlappyCore, PipePairs, SCREEN_WIDHT, SCREEN_HEIGHT, SPEED, GRAVITY, GAME_SPEED,
+                         GROUND_WIDHT, GROUND_HEIGHT, PIPE_WIDHT, PIPE_HEIGHT, PIPE_GAP)  # 游戏参数与物理核心
+
+# pygame 和依赖它的模块在第一次需要画面时才真正导入，无画面的训练、评估进程不会加载 pygame
+pygame = lazy_import('pygame')
+flappy_assets = lazy_import('flappy_assets')  # 共享的精灵资源图集
+flappy_render = lazy_import('flappy_render')  # 脏矩形渲染
+flappy_sprites = lazy_import('flappy_sprites')  # 显示用的精灵
+flappy_text = lazy_import('flappy_text')  # 字体和文字缓存
+
+# 时钟策略
+CLOCK_UNTHROTTLED = 'unthrottled'  # 不限速，用于训练
+CLOCK_REALTIME = 'realtime'  # 按固定帧率实时运行，用于观看模型
+CLOCK_LOCKSTEP = 'lockstep'  # 每按一次键前进一帧，用于调试
+FPS = 15  # 实时模式的默认帧率
+
+# 观察值类型
+OBS_VECTOR = 'vector'  # 3 个浮点数（到上下管道的距离、水平距离）
+OBS_PIXELS = 'pixels'  # 叠加的灰度画面，(帧数, 高, 宽) 的 uint8，可直接用于 CnnPolicy
+FRAME_STACK = 4  # 默认叠加的帧数
+PIXEL_SCALE = 5  # 默认缩小倍数，400x600 -> 80x120
+GRAY_WEIGHTS = (77, 150, 29)  # 灰度权重（和为 256），对应 0.299R + 0.587G + 0.114B
 
 # 音效文件路径
 wing = 'assets/audio/wing.wav'  # 翅膀扇动音效
 hit = 'assets/audio/hit.wav'  # 碰撞音效
 
-class Bird(pygame.sprite.Sprite):
-    """小鸟类，继承自pygame的Sprite类"""
-    def __init__(self):
-        pygame.sprite.Sprite.__init__(self)
-
-        # 加载小鸟的三个动画帧
-        self.images = [pygame.image.load('assets/sprites/bluebird-upflap.png').convert_alpha(),
-                       pygame.image.load('assets/sprites/bluebird-midflap.png').convert_alpha(),
-                       pygame.image.load('assets/sprites/bluebird-downflap.png').convert_alpha()]
-
-        self.speed = SPEED  # 初始速度
-        self.current_image = 0  # 当前动画帧
-        self.image = pygame.image.load('assets/sprites/bluebird-upflap.png').convert_alpha()
-        self.mask = pygame.mask.from_surface(self.image)  # 创建碰撞遮罩
-
-        # 设置小鸟初始位置
-        self.rect = self.image.get_rect()
-        self.rect[0] = SCREEN_WIDHT / 6
-        self.rect[1] = SCREEN_HEIGHT / 2
-
-    def get_center(self, axis):
-        """获取小鸟中心点坐标"""
-        center_x = self.rect[0] + (self.rect[2] / 2)
-        center_y = self.rect[1] + (self.rect[3] / 2)
-        if axis == 'x':
-            return center_x
-        if axis == 'y':
-            return center_y
-
-    def update(self):
-        """更新小鸟状态"""
-        self.current_image = (self.current_image + 1) % 3  # 更新动画帧
-        self.image = self.images[self.current_image]
-        self.speed += GRAVITY  # 应用重力
-        self.rect[1] += self.speed  # 更新位置
-
-    def bump(self):
-        """小鸟跳跃"""
-        self.speed = -SPEED
-
-    def begin(self):
-        """开始动画"""
-        self.current_image = (self.current_image + 1) % 3
-        self.image = self.images[self.current_image]
-
-class Pipe(pygame.sprite.Sprite):
-    """管道类，继承自pygame的Sprite类"""
-    def __init__(self, inverted, xpos, ysize):
-        pygame.sprite.Sprite.__init__(self)
-
-        # 加载管道图片并调整大小
-        self.image = pygame.image.load('assets/sprites/pipe-green.png').convert_alpha()
-        self.image = pygame.transform.scale(self.image, (PIPE_WIDHT, PIPE_HEIGHT))
-        self.scored = False  # 是否已计分
-        self.inverted = inverted  # 是否倒置
-
-        self.rect = self.image.get_rect()
-        self.rect[0] = xpos
-
-        # 根据是否倒置设置管道位置
-        if inverted:
-            self.image = pygame.transform.flip(self.image, False, True)
-            self.rect[1] = - (self.rect[3] - ysize)
-        else:
-            self.rect[1] = SCREEN_HEIGHT - ysize
-
-        self.mask = pygame.mask.from_surface(self.image)  # 创建碰撞遮罩
-
-    def update(self):
-        """更新管道位置"""
-        self.rect[0] -= GAME_SPEED
-
-class Ground(pygame.sprite.Sprite):
-    """地面类，继承自pygame的Sprite类"""
-    def __init__(self, xpos):
-        pygame.sprite.Sprite.__init__(self)
-        # 加载地面图片并调整大小
-        self.image = pygame.image.load('assets/sprites/base.png').convert_alpha()
-        self.image = pygame.transform.scale(self.image, (GROUND_WIDHT, GROUND_HEIGHT))
-
-        self.mask = pygame.mask.from_surface(self.image)  # 创建碰撞遮罩
-
-        self.rect = self.image.get_rect()
-        self.rect[0] = xpos
-        self.rect[1] = SCREEN_HEIGHT - GROUND_HEIGHT
-
-    def update(self):
-        """更新地面位置"""
-        self.rect[0] -= GAME_SPEED
-
-def is_off_screen(sprite):
-    """检查精灵是否离开屏幕"""
-    return sprite.rect[0] < -(sprite.rect[2])
-
-def get_random_pipes(xpos):
-    """生成随机高度的管道对"""
-    size = random.randint(100, 300)
-    pipe = Pipe(False, xpos, size)
-    pipe_inverted = Pipe(True, xpos, SCREEN_HEIGHT - size - PIPE_GAP)
-    return pipe, pipe_inverted
 
 class FlappyEnv(gym.Env):
-    """Flappy Bird游戏环境类，继承自gym.Env"""
-    def __init__(self):
+    """
+    Flappy Bird游戏环境类，继承自gym.Env
+
+    游戏逻辑由 FlappyCore 推进，pygame 只在需要画面时使用：
+        render_mode=None: 无界面，不创建窗口
+        render_mode='human': 每一步自动绘制到窗口
+        render_mode='rgb_array': 调用 render() 时绘制到隐藏窗口并返回 RGB 数组
+    clock_mode 控制时钟策略，默认 human 模式为实时，其余模式不限速：
+        'unthrottled': 不限帧率，死亡时不暂停
+        'realtime': 按 fps 限制帧率，human 模式下死亡时暂停 1 秒
+        'lockstep': 每按一次键前进一帧（仅 human 模式）
+    profile=True 时记录 step / reset 各阶段耗时：info['profile'] 为本步各阶段耗时（纳秒），
+    每隔 profiler.summary_every 步 info['profile_summary'] 为滚动统计，也可以随时调用 self.profiler.dump() 打印汇总
+    obs_type='pixels' 时观察值为最近 frame_stack 帧画面（与 render() 画面相同，缩小 pixel_scale 倍并转为灰度），
+    通过零拷贝的像素视图读取，写入预先分配的环形缓冲区，每步不分配新的数组。
+    返回的观察值是缓冲区的视图，下一次 step 时内容会改变，需要保存时请复制。
+    live 为共享内存名称时，把紧凑的游戏状态写入实时画面缓冲区，由单独的查看器进程绘制（见 flappy_live.py）。
+    record 为文件路径时，把每个回合（管道高度、每步动作、得分）追加到录像文件，可以回放（见 flappy_replay.py）。
+    save_stats=False 时统计数据只在内存中更新，不写入 game_stats.json。
+    没有显示设备时需要设置 SDL_VIDEODRIVER=dummy。
+    """
+    metadata = {"render_modes": ["human", "rgb_array"], "render_fps": FPS}
+
+    def __init__(self, render_mode=None, clock_mode=None, fps=FPS, profile=False,
+                 obs_type=OBS_VECTOR, frame_stack=FRAME_STACK, pixel_scale=PIXEL_SCALE, live=None,
+                 record=None, save_stats=True):
         super(FlappyEnv, self).__init__()
+        assert render_mode is None or render_mode in self.metadata["render_modes"]
+        if clock_mode is None:
+            clock_mode = CLOCK_REALTIME if render_mode == 'human' else CLOCK_UNTHROTTLED
+        assert clock_mode in (CLOCK_UNTHROTTLED, CLOCK_REALTIME, CLOCK_LOCKSTEP)
+        assert clock_mode != CLOCK_LOCKSTEP or render_mode == 'human', "lockstep 模式需要 human 渲染"
+        assert obs_type in (OBS_VECTOR, OBS_PIXELS)
+
         # 定义动作空间（0：不跳，1：跳跃）
         self.action_space = spaces.Discrete(2)
-        # 定义观察空间（3个浮点数：到上管道的距离、到下管道的距离、水平距离）
-        self.observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(3,), dtype=np.float32)
+        self.obs_type = obs_type  # 观察值类型
+        if obs_type == OBS_PIXELS:
+            self.init_pixels(frame_stack, pixel_scale)
+        else:
+            # 定义观察空间（3个浮点数：到上管道的距离、到下管道的距离、水平距离）
+            self.observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(3,), dtype=np.float32)
+        self.render_mode = render_mode  # 渲染模式
+        self.clock_mode = clock_mode  # 时钟策略
+        self.fps = fps  # 实时模式帧率
+        self.core = FlappyCore()  # 物理核心
+        self.profiler = PhaseProfiler() if profile else None  # 分阶段耗时统计（可选）
+        self.core.profiler = self.profiler
         self.done = False
-        self.clock = pygame.time.Clock()
+        self.clock = None  # 实时模式的帧率时钟，创建窗口时才创建
+        self.screen = None  # 首次需要画面时才创建窗口
+        self.rendered_frame = None  # 已经显示到窗口的帧
         self.moves = 0
         self.tap = False
+        self.episodes = 0  # 已经开始的回合数
+        self.live = LivePublisher(live) if live is not None else None  # 实时画面的写入方
+        self.shown_episode = None  # 查看器上一次绘制的回合
+        self.recorder = EpisodeRecorder(record, self.core) if record is not None else None  # 回合录像
 
         # 初始化游戏统计系统
-        self.stats = GameStats()
+        self.stats = GameStats(read_only=not save_stats)
         self.death_count = self.stats.get_death_count()
         self.high_score = self.stats.get_high_score()
         self.current_score = 0
         self.max_frame = self.stats.get_max_frame()
 
-        pygame.font.init()
-        self.font = pygame.font.SysFont('Arial', 24)
-
     def step(self, action):
         """执行一步动作"""
-        # 获取小鸟位置
-        self.bird_center = (self.bird.get_center("x"), self.bird.get_center("y"))
-        self.frame += 1
-
-        # 找到最近的管道对
-        first_top_pipe = None
-        first_bottom_pipe = None
+        prof = self.profiler
+        if prof:
+            prof.begin()
 
-        for pipe in self.pipe_group:
-            if not first_top_pipe and pipe.inverted:
-                first_top_pipe = pipe
-            elif not first_bottom_pipe and not pipe.inverted:
-                first_bottom_pipe = pipe
-
-            if first_top_pipe and first_bottom_pipe:
-                break
+        # 获取小鸟位置
+        self.bird_center = self.core.bird_center()
 
-        # 计算到管道的距离
-        self.top_edge = first_top_pipe.rect[0], first_top_pipe.rect[1] + first_top_pipe.rect[3]
-        self.bottom_edge = first_bottom_pipe.rect[0], first_bottom_pipe.rect[1]
+        # 计算到最近管道对的距离
+        pipe_x, size, _ = self.core.pipes[0]
+        self.top_edge = pipe_x, SCREEN_HEIGHT - size - PIPE_GAP
+        self.bottom_edge = pipe_x, SCREEN_HEIGHT - size
 
         # 计算观察值（归一化处理）
-        bird_y = self.bird.get_center("y")
-        top_y = self.top_edge[1]
-        bottom_y = self.bottom_edge[1]
-        pipe_x = self.top_edge[0]
-
-        # 归一化距离计算（使用更稳定的计算方式）
-        self.bird_to_top = np.clip((bird_y - top_y) / SCREEN_HEIGHT, -1.0, 1.0)
-        self.bird_to_bot = np.clip((bird_y - bottom_y) / SCREEN_HEIGHT, -1.0, 1.0)
-        self.h_dist = np.clip((pipe_x - self.bird_center[0]) / SCREEN_WIDHT, -1.0, 1.0)
-
-        # 处理游戏事件
-        self.clock.tick(15)
-        for event in pygame.event.get():
-            if event.type == QUIT:
-                pygame.quit()
+        self.bird_to_top, self.bird_to_bot, self.h_dist = self.core.observe()
+        if prof:
+            prof.mark('observe')
 
         # 执行动作
         if action == 1:
-            self.bird.bump()
-            pygame.mixer.music.load(wing)
+            if self.render_mode == 'human':
+                pygame.mixer.music.load(wing)
             self.tap = True
-            self.moves += 1
             self.action_history.append(action)
             self.action_history.pop(0)
         elif action == 0:
             self.tap = False
             self.action_history.append(action)
             self.action_history.pop(0)
-
-        # 更新游戏画面
-        self.screen.blit(self.BACKGROUND, (0, 0))
-
-        # 更新地面
-        if is_off_screen(self.ground_group.sprites()[0]):
-            self.ground_group.remove(self.ground_group.sprites()[0])
-            new_ground = Ground(GROUND_WIDHT - 20)
-            self.ground_group.add(new_ground)
-
-        # 更新管道
-        if is_off_screen(self.pipe_group.sprites()[0]):
-            self.pipe_group.remove(self.pipe_group.sprites()[0])
-            self.pipe_group.remove(self.pipe_group.sprites()[0])
-            pipes = get_random_pipes(SCREEN_WIDHT * 2)
-            self.pipe_group.add(pipes[0])
-            self.pipe_group.add(pipes[1])
-
-        # 计分系统
-        for pipe in self.pipe_group:
-            right_edge = pipe.rect[0] + pipe.rect[2]
-            if self.bird.rect[0] > right_edge and (pipe.scored == False):
-                self.current_score += 1
-                self.high_score = max(self.high_score, self.current_score)  # 更新最高分
-                pipe.scored = True
-                next_pipe_index = self.pipe_group.sprites().index(pipe) + 1
-                if next_pipe_index < len(self.pipe_group.sprites()):
-                    next_pipe = self.pipe_group.sprites()[next_pipe_index]
-                    next_pipe.scored = True
-
-        # 更新所有精灵
-        self.bird_group.update()
-        self.ground_group.update()
-        self.pipe_group.update()
-
-        # 绘制所有精灵
-        self.bird_group.draw(self.screen)
-        self.pipe_group.draw(self.screen)
-        self.ground_group.draw(self.screen)
-
-        # 在管道上添加标注
-        for pipe in self.pipe_group:
-            if not pipe.inverted:  # 只在下管道显示信息
-                # 计算管道信息
-                pipe_height = pipe.rect[3]  # 管道高度
-                pipe_y = pipe.rect[1]  # 管道Y坐标
-                gap_y = pipe_y - PIPE_GAP  # 间隙的Y坐标
-                
-                # 创建信息文本
-                info_text = f"H:{pipe_height} Y:{pipe_y:.0f} Gap:{gap_y:.0f}"
-                text_surface = self.font.render(info_text, True, (0, 0, 0))
-                
-                # 在管道上显示信息
-                text_x = pipe.rect[0] + 5  # 管道左侧5像素处
-                text_y = pipe.rect[1] + 5  # 管道顶部5像素处
-                self.screen.blit(text_surface, (text_x, text_y))
-
-        pygame.display.update()
+        if prof:
+            prof.mark('action')
+
+        # 推进物理核心（地面、管道循环，计分，精灵更新和死亡判定）
+        death_penalty = self.core.step(action)
+        if self.recorder is not None:
+            self.recorder.step(action)
+        self.frame = self.core.frame
+        self.moves = self.core.moves
+        if self.core.score > self.current_score:
+            self.current_score = self.core.score
+            self.high_score = max(self.high_score, self.current_score)  # 更新最高分
+        score = self.current_score
 
         # 更新最大帧数
         if self.frame > self.max_frame:
             self.max_frame = self.frame
             self.stats.update_max_frame(self.max_frame)
+        if prof:
+            prof.mark('stats')
+
+        # 更新游戏画面（human 模式在清零分数前绘制，显示死亡时的得分）
+        if self.render_mode == 'human':
+            self.render()
+            self.tick()
+            if prof:
+                prof.mark('tick')
 
         # 检查是否死亡
-        death_penalty = 0
-        if (pygame.sprite.groupcollide(self.bird_group, self.ground_group, False, False, pygame.sprite.collide_mask) or
-                pygame.sprite.groupcollide(self.bird_group, self.pipe_group, False, False, pygame.sprite.collide_mask) or
-                self.bird.get_center("y") < 0):
-            pygame.mixer.music.load(hit)
-            time.sleep(1)
-            death_penalty = -1
-            if self.bird.get_center("y") < 0:
-                death_penalty = -2
+        if death_penalty:
+            if self.render_mode == 'human':
+                pygame.mixer.music.load(hit)
+                if self.clock_mode == CLOCK_REALTIME:
+                    time.sleep(1)
             self.done = True
             self.death_count += 1  # 增加死亡计数
             self.stats.update_death_count(self.death_count)  # 保存死亡次数
-            
+
             # 更新最高分
             if self.current_score > self.high_score:
                 self.high_score = self.current_score
                 self.stats.update_high_score(self.high_score)
                 print(f"新的最高分: {self.high_score}")  # 添加提示信息
-            
+
             self.current_score = 0  # 重置当前分数
+            if self.recorder is not None:
+                self.recorder.end()
+            if prof:
+                prof.mark('death')
 
         # 计算奖励（简化奖励计算）
         move_penalty = self.moves * 0.001
         surival_reward = self.frame * 0.001  # 存活奖励，鼓励小鸟存活更长时间
 
         # 构建观察值
-        self.observation = np.array([self.bird_to_top, self.bird_to_bot, self.h_dist], dtype=np.float32)
-        
+        if self.obs_type == OBS_PIXELS:
+            if self.render_mode != 'human':
+                self.draw_frame()
+            self.observation = self.capture_pixels()
+            if prof:
+                prof.mark('pixels')
+        else:
+            self.observation = np.array([self.bird_to_top, self.bird_to_bot, self.h_dist], dtype=np.float32)
+
         # 计算总奖励
         total_reward = self.current_score - move_penalty + death_penalty + surival_reward
-        info = {}
+        info = {'score': score, 'time': self.frame, 'pipes_passed': score}
         truncated = False
-
+        if prof:
+            prof.mark('reward')
+            info['profile'] = dict(prof.last_step)
+            if prof.summary_due():
+                info['profile_summary'] = prof.summary()
+
+        if self.live is not None and self.live.due():
+            self.publish(score, total_reward)
         return self.observation, total_reward, self.done, truncated, info
 
-    def reset(self, seed=None):
+    def reset(self, seed=None, options=None):
         """重置环境"""
+        prof = self.profiler
+        if prof:
+            prof.begin()
+        super().reset(seed=seed)
+        if seed is not None:
+            self.core.seed(seed)
+        if self.recorder is not None:
+            self.recorder.end()  # 没有结束就被重置的回合
+        self.core.reset()
+        if self.recorder is not None:
+            self.recorder.begin(seed)
+        self.episodes += 1
+
         self.done = False
         self.obs = [0] * 9
         self.action_history = [-1] * 10
@@ -314,87 +240,355 @@ class FlappyEnv(gym.Env):
 
         self.top_edge = (0, 0)
         self.bottom_edge = (0, 0)
+        self.bird_center = self.core.bird_center()
+        self.current_score = 0  # 重置当前分数
+
+        if prof:
+            prof.mark('reset.core')
+
+        if self.render_mode is not None or self.obs_type == OBS_PIXELS:
+            self.init_view()
+            if prof:
+                prof.mark('reset.view')
+        if self.render_mode == 'human':
+            self.render()
+            self.tick()
+            if prof:
+                prof.mark('tick')
+
+        if self.obs_type == OBS_PIXELS:
+            # 换用另一个帧缓冲区，上一回合最后的观察值（terminal_observation）不会被覆盖
+            self.stack_index ^= 1
+            if self.render_mode != 'human':
+                self.draw_frame()
+            self.observation = self.capture_pixels(fill=True)
+            if prof:
+                prof.mark('pixels')
+        else:
+            # 初始化观察值为0
+            self.observation = np.array([0.0, 0.0, 0.0], dtype=np.float32)
 
-        # 初始化pygame
-        pygame.mixer.init()
-        pygame.init()
-        self.screen = pygame.display.set_mode((SCREEN_WIDHT, SCREEN_HEIGHT))
+        info = {}
+        if prof:
+            info['profile'] = dict(prof.last_step)
+        if self.live is not None:
+            self.publish(0, 0.0)
+        return self.observation, info  # 返回观察值和信息字典
+
+    def publish(self, score, reward):
+        """把当前状态写入实时画面缓冲区"""
+        core = self.core
+        self.live.publish(self.episodes, self.frame, score, self.high_score, self.death_count, self.max_frame,
+                          core.spawned, core.bird_y, core.bird_speed, core.bird_frame, self.tap, self.done,
+                          core.ground_x, core.pipes, (self.bird_to_top, self.bird_to_bot, self.h_dist), reward,
+                          (self.bird_center[1], self.bottom_edge[0], self.bottom_edge[1]))
+
+    def show(self, state):
+        """
+        把实时画面的状态记录（flappy_live.LiveState）绘制到窗口，供查看器进程使用
+
+        只恢复绘制需要的状态，不推进游戏，也不更新统计数据。
+        """
+        core = self.core
+        core.bird_y = state.bird_y
+        core.bird_speed = state.bird_speed
+        core.bird_frame = state.bird_frame
+        core.ground_x = list(state.ground_x)
+        core.pipes = PipePairs([list(pipe) for pipe in state.pipes])
+        core.spawned = state.spawned
+        self.frame = state.frame
+        self.current_score = state.score
+        self.high_score = state.high_score
+        self.death_count = state.death_count
+        self.max_frame = state.max_frame
+        self.bird_to_top, self.bird_to_bot, self.h_dist = state.obs
+        self.tap = state.action == 1
+        # 辅助线与观察值一样是推进前的位置
+        center_y, edge_x, edge_y = state.guide
+        self.bird_center = core.bird_center()[0], center_y
+        self.top_edge = edge_x, edge_y - PIPE_GAP
+        self.bottom_edge = edge_x, edge_y
+
+        # 换了回合，或者丢掉的记录中生成的管道比屏幕上的还多（无法逐对复用精灵）时重新创建精灵
+        new_pipes = state.spawned - self.view_spawned if self.screen is not None else -1
+        if state.episode != self.shown_episode or not 0 <= new_pipes <= len(core.pipes):
+            self.init_view()
+            self.shown_episode = state.episode
+        self.render()
+
+    def init_pixels(self, frame_stack, pixel_scale):
+        """设置画面观察空间并预先分配缓冲区"""
+        self.frame_stack = frame_stack
+        self.pixel_scale = pixel_scale
+        height = len(range(0, SCREEN_HEIGHT, pixel_scale))
+        width = len(range(0, SCREEN_WIDHT, pixel_scale))
+        self.observation_space = spaces.Box(low=0, high=255, shape=(frame_stack, height, width), dtype=np.uint8)
+
+        self.gray = np.zeros((height, width), dtype=np.uint16)  # 灰度累加
+        self.gray_channel = np.zeros((height, width), dtype=np.uint16)
+        # 环形帧缓冲区长度为 2 倍帧数，每帧同时写入 i 和 i + frame_stack，
+        # 按时间顺序排列的最近 frame_stack 帧总是连续的一段，可以直接返回视图
+        # 两个缓冲区在每次 reset 时交替使用
+        self.stacks = [np.zeros((2 * frame_stack, height, width), dtype=np.uint8) for _ in range(2)]
+        self.stack_index = 0
+        self.stack_head = 0
+
+    def capture_pixels(self, fill=False):
+        """
+        把当前画面缩小、转为灰度后压入帧缓冲区
+
+        参数:
+            fill: 用当前画面填满所有帧（reset 时使用）
+        返回:
+            (frame_stack, 高, 宽) 的 uint8 视图，从旧到新排列
+        """
+        # 零拷贝：pixels3d 直接引用 Surface 的像素内存，切片和转置也都是视图
+        view = pygame.surfarray.pixels3d(self.screen)
+        small = view[::self.pixel_scale, ::self.pixel_scale].transpose(1, 0, 2)
+        # 先 copyto 到 uint16 缓冲区再原地计算（带类型转换的 ufunc 会分配临时数组）
+        gray, channel = self.gray, self.gray_channel
+        np.copyto(gray, small[..., 0])
+        np.multiply(gray, GRAY_WEIGHTS[0], out=gray)
+        for c in (1, 2):
+            np.copyto(channel, small[..., c])
+            np.multiply(channel, GRAY_WEIGHTS[c], out=channel)
+            np.add(gray, channel, out=gray)
+        del view, small  # 释放 Surface 的锁，之后才能继续绘制
+        np.right_shift(gray, 8, out=gray)
+
+        stack = self.stacks[self.stack_index]
+        k = self.frame_stack
+        if fill:
+            self.stack_head = 0
+        head = self.stack_head
+        np.copyto(stack[head], gray, casting='unsafe')
+        if fill:
+            stack[:] = stack[head]
+        else:
+            stack[head + k] = stack[head]
+        self.stack_head = (head + 1) % k
+        return stack[head + 1:head + 1 + k]
+
+    def tick(self):
+        """按时钟策略等待：实时模式限制帧率，lockstep 模式等待按键"""
+        if self.clock_mode == CLOCK_REALTIME:
+            self.clock.tick(self.fps)
+        elif self.clock_mode == CLOCK_LOCKSTEP:
+            while True:
+                event = pygame.event.wait()
+                if event.type == pygame.QUIT:
+                    pygame.quit()
+                    return
+                if event.type == pygame.KEYDOWN:
+                    return
+
+    def init_display(self):
+        """初始化pygame窗口和图片资源（每个环境只做一次）"""
+        init_pygame(audio=self.render_mode == 'human')  # 每个进程只初始化一次，只有 human 模式需要音效
+        self.clock = pygame.time.Clock()
+        if self.render_mode == 'human':
+            self.screen = pygame.display.set_mode((SCREEN_WIDHT, SCREEN_HEIGHT))
+        else:
+            # rgb_array 模式只需要隐藏窗口来支持 convert_alpha
+            pygame.display.set_mode((SCREEN_WIDHT, SCREEN_HEIGHT), pygame.HIDDEN)
+            self.screen = pygame.Surface((SCREEN_WIDHT, SCREEN_HEIGHT))
         pygame.display.set_caption('Flappy Bird')
 
-        # 加载图片资源
-        self.BACKGROUND = pygame.image.load('assets/sprites/background-day.png')
-        self.BACKGROUND = pygame.transform.scale(self.BACKGROUND, (SCREEN_WIDHT, SCREEN_HEIGHT))
-        self.BEGIN_IMAGE = pygame.image.load('assets/sprites/message.png').convert_alpha()
+        # 获取图片资源
+        self.BACKGROUND = flappy_assets.load_image('background-day', (SCREEN_WIDHT, SCREEN_HEIGHT), alpha=False)
+        self.BEGIN_IMAGE = flappy_assets.load_image('message')
+        self.renderer = flappy_render.DirtyRenderer(self.screen, self.BACKGROUND)
+
+        # 精灵对象池：屏幕上最多两对管道、两块地面，各多留一个备用
+        self.pipe_pool = SpritePool(lambda: flappy_sprites.make_pipes(0, 0), flappy_sprites.place_pipes, 3)
+        self.ground_pool = SpritePool(lambda: flappy_sprites.Ground(0), flappy_sprites.Ground.place, 3)
+        self.pipe_pairs = PipePairs()
 
         # 创建精灵组
         self.bird_group = pygame.sprite.Group()
-        self.bird = Bird()
-        self.bird_center = (self.bird.get_center("x"), self.bird.get_center("y"))
-        self.bird_group.add(self.bird)
-
         self.ground_group = pygame.sprite.Group()
-        for i in range(2):
-            self.ground = Ground(GROUND_WIDHT * i)
-            self.ground_group.add(self.ground)
-
         self.pipe_group = pygame.sprite.Group()
-        for i in range(2):
-            self.pipes = get_random_pipes(SCREEN_WIDHT * i + 800)
-            self.pipe_group.add(self.pipes[0])
-            self.pipe_group.add(self.pipes[1])
-
-        self.clock.tick(15)
-
-        self.bird.begin()
-        self.ground_group.update()
 
-        self.bird_group.draw(self.screen)
-        self.ground_group.draw(self.screen)
+    def init_view(self):
+        """创建用于显示的精灵"""
+        if self.screen is None:
+            self.init_display()
+        self.rendered_frame = None
+        self.renderer.invalidate()
 
-        pygame.display.update()
+        # 小鸟不需要复用，每回合重新创建
+        self.bird_group.empty()
+        self.bird = flappy_sprites.Bird()
+        self.bird_group.add(self.bird)
 
-        self.current_score = 0  # 重置当前分数
-        # 初始化观察值为0
-        self.observation = np.array([0.0, 0.0, 0.0], dtype=np.float32)
+        # 上一回合的地面和管道放回对象池
+        for ground in self.ground_group:
+            self.ground_pool.release(ground)
+        for pipes in self.pipe_pairs:
+            self.pipe_pool.release(pipes)
+        self.ground_group.empty()
+        self.pipe_group.empty()
+
+        for x in self.core.ground_x:
+            self.ground_group.add(self.ground_pool.acquire(x))
+
+        self.pipe_pairs.clear()  # 与 core.pipes 一一对应的管道精灵对
+        for x, size, _ in self.core.pipes:
+            pipes = self.pipe_pool.acquire(x, size)
+            self.pipe_pairs.append(pipes)
+            self.pipe_group.add(pipes)
+        self.view_spawned = self.core.spawned
+
+    def sync_sprites(self):
+        """把物理核心的状态同步到显示用的精灵上"""
+        self.bird.current_image = self.core.bird_frame
+        self.bird.image = self.bird.images[self.bird.current_image]
+        self.bird.speed = self.core.bird_speed
+        self.bird.rect[1] = self.core.bird_y
+
+        for ground, x in zip(self.ground_group.sprites(), self.core.ground_x):
+            ground.rect[0] = x
+
+        # 核心生成了新管道时，把最旧的管道对放回对象池，再取出一对放到新位置
+        new_pipes = self.core.spawned - self.view_spawned
+        for _ in range(new_pipes):
+            pipes = self.pipe_pairs.popleft()
+            self.pipe_group.remove(pipes)
+            self.pipe_pool.release(pipes)
+        for i in range(len(self.core.pipes) - new_pipes, len(self.core.pipes)):
+            x, size, _ = self.core.pipes[i]
+            pipes = self.pipe_pool.acquire(x, size)
+            self.pipe_pairs.append(pipes)
+            self.pipe_group.add(pipes)
+        self.view_spawned = self.core.spawned
+
+        for pipes, (x, _, scored) in zip(self.pipe_pairs, self.core.pipes):
+            for pipe in pipes:
+                pipe.rect[0] = x
+                pipe.scored = scored
+
+    def draw_world(self):
+        """绘制背景、精灵和管道标注"""
+        prof = self.profiler
+        self.sync_sprites()
+        if prof:
+            prof.mark('render.sync')
+        self.renderer.begin()  # 只把上一帧画过的区域恢复成背景
 
-        info = {}
-        return self.observation, info  # 返回观察值和信息字典
+        # 绘制所有精灵
+        self.renderer.draw(self.bird_group)
+        self.renderer.draw(self.pipe_group)
+        self.renderer.draw(self.ground_group)
+        if prof:
+            prof.mark('render.sprites')
+
+        # 在管道上添加标注（只在下管道显示信息）
+        for pipe, _ in self.pipe_pairs:
+            # 计算管道信息
+            pipe_height = pipe.rect[3]  # 管道高度
+            pipe_y = pipe.rect[1]  # 管道Y坐标
+            gap_y = pipe_y - PIPE_GAP  # 间隙的Y坐标
+
+            # 创建信息文本
+            info_text = f"H:{pipe_height} Y:{pipe_y:.0f} Gap:{gap_y:.0f}"
+            text_surface = flappy_text.render_text(info_text, 16)  # 数值不变时复用缓存
+
+            # 在管道上显示信息
+            text_x = pipe.rect[0] + 5  # 管道左侧5像素处
+            text_y = pipe.rect[1] + 5  # 管道顶部5像素处
+            self.renderer.blit(text_surface, (text_x, text_y))
+        if prof:
+            prof.mark('render.labels')
+
+    def draw_hud(self):
+        """绘制统计信息、观察值、动作指示器和距离线"""
+        # 渲染游戏统计信息
+        self.render_text(f'Score: {self.current_score}', (200, 500), 24)
+        self.render_text(f'High Score: {self.high_score}', (200, 520), 24)
+        self.render_text(f'Deaths: {self.death_count}', (200, 540), 24)
+        self.render_text(f'Frame: {self.frame}', (200, 560), 24)
+        self.render_text(f'Max Frame: {self.max_frame}', (200, 580), 24)
+
+        # 渲染观察值
+        self.render_text(f'Top: {self.bird_to_top:.2f}', (40, self.bird.get_center('y') - 50), 16)
+        self.render_text(f'Bot: {self.bird_to_bot:.2f}', (40, self.bird.get_center('y') + 30), 16)
+        self.render_text(f'Dist: {self.h_dist:.2f}', (10, self.bird.get_center('y')), 16)
+
+        # 渲染动作指示器
+        self.renderer.add(pygame.draw.circle(self.screen, (0, 0, 0), (130, 560), 30))
+        pygame.draw.circle(self.screen, (255, 0, 0), (130, 560), 25)
+        if self.tap:
+            pygame.draw.circle(self.screen, (0, 255, 0), (130, 560), 25)
+
+        # 渲染距离线
+        self.renderer.add(pygame.draw.line(self.screen, (255, 0, 0), self.bird_center, self.top_edge, 3))
+        self.renderer.add(pygame.draw.line(self.screen, (255, 0, 0), self.bird_center, self.bottom_edge, 3))
+        self.renderer.add(pygame.draw.line(self.screen, (0, 0, 255), self.bird_center, (self.bird_center[0] + self.h_dist, self.bird_center[1]), 3))
 
     def render_text(self, text, position, size):
-        """渲染文本"""
-        self.font = pygame.font.SysFont('Arial', size)
-        text_surface = self.font.render(text, True, (0, 0, 0))
-        self.screen.blit(text_surface, position)
-
-    def render(self, mode='human'):
-        """渲染游戏画面"""
-        if mode == 'human':
-            # 渲染游戏统计信息
-            self.render_text(f'Score: {self.current_score}', (200, 500), 24)
-            self.render_text(f'High Score: {self.high_score}', (200, 520), 24)
-            self.render_text(f'Deaths: {self.death_count}', (200, 540), 24)
-            self.render_text(f'Frame: {self.frame}', (200, 560), 24)
-            self.render_text(f'Max Frame: {self.max_frame}', (200, 580), 24)
-
-            # 渲染观察值
-            self.render_text(f'Top: {self.bird_to_top:.2f}', (40, self.bird.get_center('y') - 50), 16)
-            self.render_text(f'Bot: {self.bird_to_bot:.2f}', (40, self.bird.get_center('y') + 30), 16)
-            self.render_text(f'Dist: {self.h_dist:.2f}', (10, self.bird.get_center('y')), 16)
-
-            # 渲染动作指示器
-            pygame.draw.circle(self.screen, (0, 0, 0), (130, 560), 30)
-            pygame.draw.circle(self.screen, (255, 0, 0), (130, 560), 25)
-            if self.tap:
-                pygame.draw.circle(self.screen, (0, 255, 0), (130, 560), 25)
-                self.tap = False
-
-            # 渲染距离线
-            pygame.draw.line(self.screen, (255, 0, 0), self.bird_center, self.top_edge, 3)
-            pygame.draw.line(self.screen, (255, 0, 0), self.bird_center, self.bottom_edge, 3)
-            pygame.draw.line(self.screen, (0, 0, 255), self.bird_center, (self.bird_center[0] + self.h_dist, self.bird_center[1]), 3)
-
-            pygame.display.update()
+        """渲染文本（字体和内容相同的文字只渲染一次）"""
+        self.renderer.blit(flappy_text.render_text(text, size), position)
+
+    def draw_frame(self):
+        """把当前帧绘制到 self.screen（不显示），同一帧只绘制一次"""
+        if self.rendered_frame == self.frame:
+            return
+        self.draw_world()
+        self.draw_hud()
+        self.renderer.end()
+        self.rendered_frame = self.frame
+        if self.profiler:
+            self.profiler.mark('render.hud')
+
+    def render(self):
+        """
+        渲染游戏画面
+
+        human 模式下 step 已经自动绘制，重复调用同一帧不会再次绘制；
+        rgb_array 模式返回形状为 (高, 宽, 3) 的数组。
+        """
+        if self.render_mode is None:
+            gym.logger.warn("调用了 render()，但创建环境时没有指定 render_mode")
+            return None
+
+        prof = self.profiler
+        if prof:
+            prof.skip()  # rgb_array 模式在 step 之外调用，之前的时间不属于任何阶段
+        if self.render_mode == 'human':
+            if self.rendered_frame == self.frame:
+                return None
+            # 处理窗口事件（lockstep 模式保留按键事件给 tick 使用）
+            for event in pygame.event.get(pygame.QUIT if self.clock_mode == CLOCK_LOCKSTEP else None):
+                if event.type == pygame.QUIT:
+                    pygame.quit()
+            if prof:
+                prof.mark('render.events')
+
+            self.draw_world()
+            self.draw_hud()
+            if prof:
+                prof.mark('render.hud')
+            self.renderer.present()  # 只刷新变化的区域
+            self.rendered_frame = self.frame
+            if prof:
+                prof.mark('render.present')
+            return None
+
+        self.draw_frame()
+        frame = np.transpose(pygame.surfarray.array3d(self.screen), axes=(1, 0, 2))
+        if prof:
+            prof.mark('render.readback')
+        return frame
 
     def close(self):
         """关闭环境"""
-        pass
\ No newline at end of file
+        self.stats.close()  # 写入尚未保存的统计数据
+        if self.live is not None:
+            self.live.close()
+            self.live = None
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        if self.screen is not None:
+            pygame.display.quit()
+            self.screen = None
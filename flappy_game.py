@@ -1,5 +1,10 @@
 import pygame, random, time
 from pygame.locals import *
+from flappy_assets import load_image, load_mask  # 共享的精灵资源图集
+from flappy_pool import SpritePool  # 精灵对象池
+from flappy_render import DirtyRenderer  # 脏矩形渲染
+from flappy_core import hits_sprites, PipePairs  # 碰撞剖面、有序管道对队列
+from flappy_startup import init_pygame  # 只初始化一次用到的 pygame 子系统
 
 # 游戏基本配置参数
 SCREEN_WIDHT = 400      # 游戏窗口宽度
@@ -20,9 +25,6 @@ PIPE_GAP = 150         # 上下管道之间的间隙
 wing = 'assets/audio/wing.wav'   # 小鸟翅膀扇动音效
 hit = 'assets/audio/hit.wav'     # 碰撞音效
 
-# 初始化Pygame音频系统
-pygame.mixer.init()
-
 class Bird(pygame.sprite.Sprite):
     """
     小鸟类：实现小鸟的动画和物理效果
@@ -38,17 +40,17 @@ class Bird(pygame.sprite.Sprite):
     def __init__(self):
         pygame.sprite.Sprite.__init__(self)
 
-        # 加载小鸟的三帧动画图像
+        # 获取小鸟的三帧动画图像
         self.images = [
-            pygame.image.load('assets/sprites/bluebird-upflap.png').convert_alpha(),
-            pygame.image.load('assets/sprites/bluebird-midflap.png').convert_alpha(),
-            pygame.image.load('assets/sprites/bluebird-downflap.png').convert_alpha()
+            load_image('bluebird-upflap'),
+            load_image('bluebird-midflap'),
+            load_image('bluebird-downflap')
         ]
 
         self.speed = SPEED
         self.current_image = 0
-        self.image = pygame.image.load('assets/sprites/bluebird-upflap.png').convert_alpha()
-        self.mask = pygame.mask.from_surface(self.image)  # 创建碰撞检测遮罩
+        self.image = self.images[0]
+        self.mask = load_mask('bluebird-upflap')  # 碰撞检测遮罩
 
         # 设置小鸟初始位置
         self.rect = self.image.get_rect()
@@ -106,26 +108,30 @@ class Pipe(pygame.sprite.Sprite):
     def __init__(self, inverted, xpos, ysize):
         pygame.sprite.Sprite.__init__(self)
 
-        # 加载并缩放管道图像
-        self.image = pygame.image.load('assets/sprites/pipe-green.png').convert_alpha()
-        self.image = pygame.transform.scale(self.image, (PIPE_WIDHT, PIPE_HEIGHT))
-        self.scored = False
+        # 获取缩放（倒置时翻转）后的管道图像和碰撞检测遮罩
+        self.image = load_image('pipe-green', (PIPE_WIDHT, PIPE_HEIGHT), inverted)
+        self.mask = load_mask('pipe-green', (PIPE_WIDHT, PIPE_HEIGHT), inverted)
         self.inverted = inverted
-
-        # 设置管道位置
         self.rect = self.image.get_rect()
+        self.place(xpos, ysize)
+
+    def place(self, xpos, ysize):
+        """
+        移动管道到新位置并重置计分状态（对象池复用时调用）
+
+        参数:
+            xpos: 管道的水平位置
+            ysize: 管道露出的高度
+        """
+        self.scored = False
         self.rect[0] = xpos
 
         # 根据是否是倒置管道设置位置
-        if inverted:
-            self.image = pygame.transform.flip(self.image, False, True)
+        if self.inverted:
             self.rect[1] = - (self.rect[3] - ysize)
         else:
             self.rect[1] = SCREEN_HEIGHT - ysize
 
-        # 创建碰撞检测遮罩
-        self.mask = pygame.mask.from_surface(self.image)
-
     def get_edge(self):
         """获取管道的边缘位置"""
         if self.inverted:
@@ -148,15 +154,16 @@ class Ground(pygame.sprite.Sprite):
     """
     def __init__(self, xpos):
         pygame.sprite.Sprite.__init__(self)
-        # 加载并缩放地面图像
-        self.image = pygame.image.load('assets/sprites/base.png').convert_alpha()
-        self.image = pygame.transform.scale(self.image, (GROUND_WIDHT, GROUND_HEIGHT))
-
-        # 创建碰撞检测遮罩
-        self.mask = pygame.mask.from_surface(self.image)
+        # 获取缩放后的地面图像和碰撞检测遮罩
+        self.image = load_image('base', (GROUND_WIDHT, GROUND_HEIGHT))
+        self.mask = load_mask('base', (GROUND_WIDHT, GROUND_HEIGHT))
 
         # 设置地面位置
         self.rect = self.image.get_rect()
+        self.place(xpos)
+
+    def place(self, xpos):
+        """移动地面到新位置（对象池复用时调用）"""
         self.rect[0] = xpos
         self.rect[1] = SCREEN_HEIGHT - GROUND_HEIGHT
 
@@ -175,29 +182,45 @@ def is_off_screen(sprite):
     """
     return sprite.rect[0] < -(sprite.rect[2])
 
+def place_pipes(pipes, xpos, size):
+    """
+    把管道对移动到新位置
+
+    参数:
+        pipes: (下管道, 上管道)
+        xpos: 管道的水平位置
+        size: 下管道露出的高度
+    """
+    pipes[0].place(xpos, size)
+    pipes[1].place(xpos, SCREEN_HEIGHT - size - PIPE_GAP)
+
 def get_random_pipes(xpos):
     """
-    生成随机高度的管道对
+    从对象池取出一对管道并随机设置高度
     
     参数:
         xpos: 管道的水平位置
     返回:
-        tuple: (上管道, 下管道)
+        tuple: (下管道, 上管道)
     """
     size = random.randint(100, 300)
-    pipe = Pipe(False, xpos, size)
-    pipe_inverted = Pipe(True, xpos, SCREEN_HEIGHT - size - PIPE_GAP)
-    return pipe, pipe_inverted
+    return pipe_pool.acquire(xpos, size)
 
-# 初始化Pygame
-pygame.init()
+# 初始化Pygame（显示、字体和音频）
+init_pygame(audio=True)
 screen = pygame.display.set_mode((SCREEN_WIDHT, SCREEN_HEIGHT))
 pygame.display.set_caption('Flappy Bird')
 
 # 加载游戏背景和开始界面图像
-BACKGROUND = pygame.image.load('assets/sprites/background-day.png')
-BACKGROUND = pygame.transform.scale(BACKGROUND, (SCREEN_WIDHT, SCREEN_HEIGHT))
-BEGIN_IMAGE = pygame.image.load('assets/sprites/message.png').convert_alpha()
+BACKGROUND = load_image('background-day', (SCREEN_WIDHT, SCREEN_HEIGHT), alpha=False)
+BEGIN_IMAGE = load_image('message')
+
+# 脏矩形渲染器：每帧只重画、刷新变化的区域
+renderer = DirtyRenderer(screen, BACKGROUND)
+
+# 创建精灵对象池：屏幕上最多两对管道、两块地面，各多留一个备用
+pipe_pool = SpritePool(lambda: (Pipe(False, 0, 0), Pipe(True, 0, 0)), place_pipes, 3)
+ground_pool = SpritePool(lambda: Ground(0), Ground.place, 3)
 
 # 创建精灵组
 bird_group = pygame.sprite.Group()
@@ -207,14 +230,16 @@ bird_group.add(bird)
 ground_group = pygame.sprite.Group()
 # 创建两个地面精灵实现无缝滚动
 for i in range(2):
-    ground = Ground(GROUND_WIDHT * i)
+    ground = ground_pool.acquire(GROUND_WIDHT * i)
     ground_group.add(ground)
 
 # 创建管道组
 pipe_group = pygame.sprite.Group()
+pipe_pairs = PipePairs()  # 按生成顺序排列的 (下管道, 上管道)
 # 创建初始管道
 for i in range(2):
     pipes = get_random_pipes(SCREEN_WIDHT * i + 800)
+    pipe_pairs.append(pipes)
     pipe_group.add(pipes[0])
     pipe_group.add(pipes[1])
 
@@ -238,13 +263,15 @@ while begin:
                 begin = False
 
     # 绘制游戏画面
-    screen.blit(BACKGROUND, (0, 0))
-    screen.blit(BEGIN_IMAGE, (120, 150))
+    renderer.begin()
+    renderer.blit(BEGIN_IMAGE, (120, 150))
 
     # 更新地面位置
     if is_off_screen(ground_group.sprites()[0]):
-        ground_group.remove(ground_group.sprites()[0])
-        new_ground = Ground(GROUND_WIDHT - 20)
+        old_ground = ground_group.sprites()[0]
+        ground_group.remove(old_ground)
+        ground_pool.release(old_ground)
+        new_ground = ground_pool.acquire(GROUND_WIDHT - 20)
         ground_group.add(new_ground)
 
     # 更新小鸟动画和地面位置
@@ -252,10 +279,10 @@ while begin:
     ground_group.update()
 
     # 绘制精灵
-    bird_group.draw(screen)
-    ground_group.draw(screen)
+    renderer.draw(bird_group)
+    renderer.draw(ground_group)
 
-    pygame.display.update()
+    renderer.present()
 
 # 游戏主循环
 score = 0
@@ -272,36 +299,35 @@ while True:
                 pygame.mixer.music.load(wing)
                 pygame.mixer.music.play()
 
-    # 绘制背景
-    screen.blit(BACKGROUND, (0, 0))
+    # 绘制背景（只恢复上一帧画过的区域）
+    renderer.begin()
 
     # 更新地面位置
     if is_off_screen(ground_group.sprites()[0]):
-        ground_group.remove(ground_group.sprites()[0])
-        new_ground = Ground(GROUND_WIDHT - 20)
+        old_ground = ground_group.sprites()[0]
+        ground_group.remove(old_ground)
+        ground_pool.release(old_ground)
+        new_ground = ground_pool.acquire(GROUND_WIDHT - 20)
         ground_group.add(new_ground)
 
     # 更新管道位置
-    if is_off_screen(pipe_group.sprites()[0]):
-        pipe_group.remove(pipe_group.sprites()[0])
-        pipe_group.remove(pipe_group.sprites()[0])
+    if is_off_screen(pipe_pairs[0][0]):
+        old_pipes = pipe_pairs.popleft()
+        pipe_group.remove(old_pipes)
+        pipe_pool.release(old_pipes)
         pipes = get_random_pipes(SCREEN_WIDHT * 2)
+        pipe_pairs.append(pipes)
         pipe_group.add(pipes[0])
         pipe_group.add(pipes[1])
 
-    # 计分系统
-    for pipe in pipe_group:
-        right_edge = pipe.rect[0] + pipe.rect[2]
-        if bird.rect[0] > right_edge and (pipe.scored == False):
-            score += 1
-            pipe.scored = True
-            print(f'Score: {score}')
-
-            # 同时标记下一个管道为已计分
-            next_pipe_index = pipe_group.sprites().index(pipe) + 1
-            if next_pipe_index < len(pipe_group.sprites()):
-                next_pipe = pipe_group.sprites()[next_pipe_index]
-                next_pipe.scored = True
+    # 计分系统：每对管道计一分，只需检查下一对没有计分的管道
+    pipes = pipe_pairs.next_unscored()
+    while pipes is not None and bird.rect[0] > pipes[0].rect[0] + pipes[0].rect[2]:
+        score += 1
+        pipes[0].scored = pipes[1].scored = True
+        print(f'Score: {score}')
+        pipe_pairs.mark_scored()
+        pipes = pipe_pairs.next_unscored()
 
     # 更新所有精灵
     bird_group.update()
@@ -309,46 +335,33 @@ while True:
     pipe_group.update()
 
     # 绘制所有精灵
-    bird_group.draw(screen)
-    pipe_group.draw(screen)
-    ground_group.draw(screen)
+    renderer.draw(bird_group)
+    renderer.draw(pipe_group)
+    renderer.draw(ground_group)
 
     # 绘制调试线条（用于AI训练）
     bird_center = (bird.get_center("x"), bird.get_center("y"))
-    first_top_pipe = None
-    first_bottom_pipe = None
-
-    # 找到最近的管道对
-    for pipe in pipe_group:
-        if not first_top_pipe and pipe.inverted:
-            first_top_pipe = pipe
-        elif not first_bottom_pipe and not pipe.inverted:
-            first_bottom_pipe = pipe
-
-        if first_top_pipe and first_bottom_pipe:
-            break
+    # 最近的管道对就是队列中最旧的一对
+    first_bottom_pipe, first_top_pipe = pipe_pairs[0]
 
     # 绘制到管道的距离线
-    if first_top_pipe:
-        top_pipe_edge = (first_top_pipe.rect[0], first_top_pipe.rect[1] + first_top_pipe.rect[3])
-        pygame.draw.line(screen, (255, 0, 0), bird_center, top_pipe_edge, 3)
-    if first_bottom_pipe:
-        bottom_pipe_edge = (first_bottom_pipe.rect[0], first_bottom_pipe.rect[1])
-        pygame.draw.line(screen, (255, 0, 0), bird_center, bottom_pipe_edge, 3)
+    top_pipe_edge = (first_top_pipe.rect[0], first_top_pipe.rect[1] + first_top_pipe.rect[3])
+    renderer.add(pygame.draw.line(screen, (255, 0, 0), bird_center, top_pipe_edge, 3))
+    bottom_pipe_edge = (first_bottom_pipe.rect[0], first_bottom_pipe.rect[1])
+    renderer.add(pygame.draw.line(screen, (255, 0, 0), bird_center, bottom_pipe_edge, 3))
 
     # 计算并显示距离信息（用于AI训练）
     h_dist = top_pipe_edge[0] - bird.get_center("x") - 12
-    pygame.draw.line(screen, (0, 0, 255), bird_center, (bird_center[0] + h_dist, bird_center[1]), 3)
+    renderer.add(pygame.draw.line(screen, (0, 0, 255), bird_center, (bird_center[0] + h_dist, bird_center[1]), 3))
     bird_to_top = -((bird.get_center("y") - top_pipe_edge[1]) / 500)
     bird_to_bot = -((bird.get_center("y") - bottom_pipe_edge[1]) / 500)
     print(f"bird to top: {bird_to_top}\nbird to bot: {bird_to_bot}\n")
     print(f"HORIZONTAL TO BIRD: {h_dist}\n")
 
-    pygame.display.update()
+    renderer.present()
 
-    # 碰撞检测
-    if (pygame.sprite.groupcollide(bird_group, ground_group, False, False, pygame.sprite.collide_mask) or
-            pygame.sprite.groupcollide(bird_group, pipe_group, False, False, pygame.sprite.collide_mask) or
+    # 碰撞检测（按预先计算的碰撞剖面比较，结果与 collide_mask 一致）
+    if (hits_sprites(bird.rect, ground_group, pipe_group) or
             bird.get_center("y") < 0):
         # 播放碰撞音效
         pygame.mixer.music.load(hit)
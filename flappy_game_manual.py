@@ -1,5 +1,11 @@
 import pygame, random, time
 from pygame.locals import *
+from flappy_assets import load_image, load_mask  # 共享的精灵资源图集
+from flappy_pool import SpritePool  # 精灵对象池
+from flappy_text import render_text  # 字体和文字缓存
+from flappy_render import DirtyRenderer  # 脏矩形渲染
+from flappy_core import hits_sprites, PipePairs  # 碰撞剖面、有序管道对队列
+from flappy_startup import init_pygame  # 只初始化一次用到的 pygame 子系统
 
 
 # 游戏基本配置参数
@@ -21,32 +27,34 @@ PIPE_GAP = 150
 wing = 'assets/audio/wing.wav'
 hit = 'assets/audio/hit.wav'
 
-# 初始化Pygame
-pygame.init()
-pygame.mixer.init()
+# 初始化Pygame（显示、字体和音频）
+init_pygame(audio=True)
 screen = pygame.display.set_mode((SCREEN_WIDHT, SCREEN_HEIGHT))
 pygame.display.set_caption('Flappy Bird')
 
 # 加载游戏资源
-BACKGROUND = pygame.image.load('assets/sprites/background-day.png')
-BACKGROUND = pygame.transform.scale(BACKGROUND, (SCREEN_WIDHT, SCREEN_HEIGHT))
-BEGIN_IMAGE = pygame.image.load('assets/sprites/message.png').convert_alpha()
+BACKGROUND = load_image('background-day', (SCREEN_WIDHT, SCREEN_HEIGHT), alpha=False)
+BEGIN_IMAGE = load_image('message')
 
-# 创建字体对象用于显示分数
-font = pygame.font.Font(None, 36)
+# 脏矩形渲染器：每帧只重画、刷新变化的区域
+renderer = DirtyRenderer(screen, BACKGROUND)
+
+# 显示分数的字号（使用 pygame 自带字体）
+FONT_SIZE = 36
+WHITE = (255, 255, 255)
 
 class Bird(pygame.sprite.Sprite):
     def __init__(self):
         pygame.sprite.Sprite.__init__(self)
         self.images = [
-            pygame.image.load('assets/sprites/bluebird-upflap.png').convert_alpha(),
-            pygame.image.load('assets/sprites/bluebird-midflap.png').convert_alpha(),
-            pygame.image.load('assets/sprites/bluebird-downflap.png').convert_alpha()
+            load_image('bluebird-upflap'),
+            load_image('bluebird-midflap'),
+            load_image('bluebird-downflap')
         ]
         self.speed = SPEED
         self.current_image = 0
         self.image = self.images[0]
-        self.mask = pygame.mask.from_surface(self.image)
+        self.mask = load_mask('bluebird-upflap')
         self.rect = self.image.get_rect()
         self.rect[0] = SCREEN_WIDHT / 6
         self.rect[1] = SCREEN_HEIGHT / 2
@@ -67,32 +75,33 @@ class Bird(pygame.sprite.Sprite):
 class Pipe(pygame.sprite.Sprite):
     def __init__(self, inverted, xpos, ysize):
         pygame.sprite.Sprite.__init__(self)
-        self.image = pygame.image.load('assets/sprites/pipe-green.png').convert_alpha()
-        self.image = pygame.transform.scale(self.image, (PIPE_WIDHT, PIPE_HEIGHT))
-        self.scored = False
+        self.image = load_image('pipe-green', (PIPE_WIDHT, PIPE_HEIGHT), inverted)
+        self.mask = load_mask('pipe-green', (PIPE_WIDHT, PIPE_HEIGHT), inverted)
         self.inverted = inverted
-
         self.rect = self.image.get_rect()
+        self.place(xpos, ysize)
+
+    def place(self, xpos, ysize):
+        self.scored = False
         self.rect[0] = xpos
 
-        if inverted:
-            self.image = pygame.transform.flip(self.image, False, True)
+        if self.inverted:
             self.rect[1] = - (self.rect[3] - ysize)
         else:
             self.rect[1] = SCREEN_HEIGHT - ysize
 
-        self.mask = pygame.mask.from_surface(self.image)
-
     def update(self):
         self.rect[0] -= GAME_SPEED
 
 class Ground(pygame.sprite.Sprite):
     def __init__(self, xpos):
         pygame.sprite.Sprite.__init__(self)
-        self.image = pygame.image.load('assets/sprites/base.png').convert_alpha()
-        self.image = pygame.transform.scale(self.image, (GROUND_WIDHT, GROUND_HEIGHT))
-        self.mask = pygame.mask.from_surface(self.image)
+        self.image = load_image('base', (GROUND_WIDHT, GROUND_HEIGHT))
+        self.mask = load_mask('base', (GROUND_WIDHT, GROUND_HEIGHT))
         self.rect = self.image.get_rect()
+        self.place(xpos)
+
+    def place(self, xpos):
         self.rect[0] = xpos
         self.rect[1] = SCREEN_HEIGHT - GROUND_HEIGHT
 
@@ -102,16 +111,22 @@ class Ground(pygame.sprite.Sprite):
 def is_off_screen(sprite):
     return sprite.rect[0] < -(sprite.rect[2])
 
+def place_pipes(pipes, xpos, size):
+    pipes[0].place(xpos, size)
+    pipes[1].place(xpos, SCREEN_HEIGHT - size - PIPE_GAP)
+
 def get_random_pipes(xpos):
     size = random.randint(100, 300)
-    pipe = Pipe(False, xpos, size)
-    pipe_inverted = Pipe(True, xpos, SCREEN_HEIGHT - size - PIPE_GAP)
-    return pipe, pipe_inverted
+    return pipe_pool.acquire(xpos, size)
+
+# 创建精灵对象池：屏幕上最多两对管道、两块地面，各多留一个备用
+pipe_pool = SpritePool(lambda: (Pipe(False, 0, 0), Pipe(True, 0, 0)), place_pipes, 3)
+ground_pool = SpritePool(lambda: Ground(0), Ground.place, 3)
 
 def show_game_over(screen, score):
     """显示游戏结束画面"""
-    game_over_text = font.render(f'游戏结束! 得分: {score}', True, (255, 255, 255))
-    restart_text = font.render('按空格键重新开始', True, (255, 255, 255))
+    game_over_text = render_text(f'游戏结束! 得分: {score}', FONT_SIZE, WHITE, None)
+    restart_text = render_text('按空格键重新开始', FONT_SIZE, WHITE, None)
     
     screen.blit(game_over_text, (SCREEN_WIDHT/2 - game_over_text.get_width()/2, SCREEN_HEIGHT/2 - 50))
     screen.blit(restart_text, (SCREEN_WIDHT/2 - restart_text.get_width()/2, SCREEN_HEIGHT/2 + 50))
@@ -126,18 +141,21 @@ def main():
 
         ground_group = pygame.sprite.Group()
         for i in range(2):
-            ground = Ground(GROUND_WIDHT * i)
+            ground = ground_pool.acquire(GROUND_WIDHT * i)
             ground_group.add(ground)
 
         pipe_group = pygame.sprite.Group()
+        pipe_pairs = PipePairs()  # 按生成顺序排列的 (下管道, 上管道)
         for i in range(2):
             pipes = get_random_pipes(SCREEN_WIDHT * i + 800)
+            pipe_pairs.append(pipes)
             pipe_group.add(pipes[0])
             pipe_group.add(pipes[1])
 
         clock = pygame.time.Clock()
         score = 0
         game_over = False
+        renderer.invalidate()  # 上一局的结束画面没有记录，整屏重画
 
         # 开始界面
         begin = True
@@ -154,17 +172,18 @@ def main():
                         pygame.mixer.music.play()
                         begin = False
 
-            screen.blit(BACKGROUND, (0, 0))
-            screen.blit(BEGIN_IMAGE, (120, 150))
+            renderer.begin()
+            renderer.blit(BEGIN_IMAGE, (120, 150))
             if is_off_screen(ground_group.sprites()[0]):
-                ground_group.remove(ground_group.sprites()[0])
-                new_ground = Ground(GROUND_WIDHT - 20)
-                ground_group.add(new_ground)
+                old_ground = ground_group.sprites()[0]
+                ground_group.remove(old_ground)
+                ground_pool.release(old_ground)
+                ground_group.add(ground_pool.acquire(GROUND_WIDHT - 20))
             bird.begin()
             ground_group.update()
-            bird_group.draw(screen)
-            ground_group.draw(screen)
-            pygame.display.update()
+            renderer.draw(bird_group)
+            renderer.draw(ground_group)
+            renderer.present()
 
         # 游戏主循环
         while not game_over:
@@ -179,31 +198,32 @@ def main():
                         pygame.mixer.music.load(wing)
                         pygame.mixer.music.play()
 
-            screen.blit(BACKGROUND, (0, 0))
+            renderer.begin()  # 只恢复上一帧画过的区域
 
             # 更新地面
             if is_off_screen(ground_group.sprites()[0]):
-                ground_group.remove(ground_group.sprites()[0])
-                new_ground = Ground(GROUND_WIDHT - 20)
-                ground_group.add(new_ground)
+                old_ground = ground_group.sprites()[0]
+                ground_group.remove(old_ground)
+                ground_pool.release(old_ground)
+                ground_group.add(ground_pool.acquire(GROUND_WIDHT - 20))
 
             # 更新管道
-            if is_off_screen(pipe_group.sprites()[0]):
-                pipe_group.remove(pipe_group.sprites()[0])
-                pipe_group.remove(pipe_group.sprites()[0])
+            if is_off_screen(pipe_pairs[0][0]):
+                old_pipes = pipe_pairs.popleft()
+                pipe_group.remove(old_pipes)
+                pipe_pool.release(old_pipes)
                 pipes = get_random_pipes(SCREEN_WIDHT * 2)
+                pipe_pairs.append(pipes)
                 pipe_group.add(pipes[0])
                 pipe_group.add(pipes[1])
 
-            # 计分
-            for pipe in pipe_group:
-                right_edge = pipe.rect[0] + pipe.rect[2]
-                if bird.rect[0] > right_edge and not pipe.scored:
-                    score += 1
-                    pipe.scored = True
-                    next_pipe_index = pipe_group.sprites().index(pipe) + 1
-                    if next_pipe_index < len(pipe_group.sprites()):
-                        pipe_group.sprites()[next_pipe_index].scored = True
+            # 计分：每对管道计一分，只需检查下一对没有计分的管道
+            pipes = pipe_pairs.next_unscored()
+            while pipes is not None and bird.rect[0] > pipes[0].rect[0] + pipes[0].rect[2]:
+                score += 1
+                pipes[0].scored = pipes[1].scored = True
+                pipe_pairs.mark_scored()
+                pipes = pipe_pairs.next_unscored()
 
             # 更新所有精灵
             bird_group.update()
@@ -211,19 +231,18 @@ def main():
             pipe_group.update()
 
             # 绘制所有精灵
-            bird_group.draw(screen)
-            pipe_group.draw(screen)
-            ground_group.draw(screen)
+            renderer.draw(bird_group)
+            renderer.draw(pipe_group)
+            renderer.draw(ground_group)
 
             # 显示分数
-            score_text = font.render(f'得分: {score}', True, (255, 255, 255))
-            screen.blit(score_text, (10, 10))
+            score_text = render_text(f'得分: {score}', FONT_SIZE, WHITE, None)  # 分数不变时复用缓存
+            renderer.blit(score_text, (10, 10))
 
-            pygame.display.update()
+            renderer.present()
 
-            # 碰撞检测
-            if (pygame.sprite.groupcollide(bird_group, ground_group, False, False, pygame.sprite.collide_mask) or
-                    pygame.sprite.groupcollide(bird_group, pipe_group, False, False, pygame.sprite.collide_mask) or
+            # 碰撞检测（按预先计算的碰撞剖面比较，结果与 collide_mask 一致）
+            if (hits_sprites(bird.rect, ground_group, pipe_group) or
                     bird.rect[1] < 0):
                 pygame.mixer.music.load(hit)
                 pygame.mixer.music.play()
@@ -243,5 +262,13 @@ def main():
                     if event.key == K_SPACE:
                         waiting = False
 
+        # 本局的地面和管道放回对象池
+        for ground in ground_group:
+            ground_pool.release(ground)
+        for pipes in pipe_pairs:
+            pipe_pool.release(pipes)
+        ground_group.empty()
+        pipe_group.empty()
+
 if __name__ == "__main__":
     main() 
\ No newline at end of file
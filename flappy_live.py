@@ -0,0 +1,310 @@
+"""
+共享内存实时画面
+
+训练进程不再自己绘制画面：环境每一步只把紧凑的游戏状态（小鸟、管道、地面、分数、观察值、动作）
+写入共享内存中的环形缓冲区，另一个查看器进程按自己的帧率读取最新的状态并绘制，跟不上时直接丢帧。
+写入方不知道有没有查看器，查看器随时连接、断开都不会影响训练速度。
+写入频率限制在每秒 MAX_RATE 条，大部分训练步只需要比较一次时间。
+
+每个槽位用序号校验：写入方先把槽位序号清零，写完数据后再写入新序号，最后更新头部的最新序号；
+读取方在读数据前后各读一次槽位序号，两次相同且等于期望的序号才说明没有读到写了一半的数据。
+
+启动训练时会自动打开查看器，也可以单独打开（训练开始前打开会等待训练）：
+    python flappy_live.py --fps 30
+"""
+import argparse
+import os
+import random
+import struct
+import time
+from collections import namedtuple
+from multiprocessing import resource_tracker, shared_memory
+
+LIVE_NAME = 'flappy_live'  # 默认的共享内存名称
+CAPACITY = 64  # 环形缓冲区的槽位数
+MAX_RATE = 240  # 每秒最多写入的记录数（查看器的帧率远低于它，训练每秒的步数远高于它）
+MAX_PIPES = 4  # 每条记录最多的管道对数量
+VIEWER_FPS = 30  # 查看器默认帧率
+
+MAGIC = 0x464C4956  # 'FLIV'
+# 头部：魔数、槽位数、记录大小、是否已关闭、写入进程 pid、保留、随机标识（每次创建不同）、最新序号
+HEADER = struct.Struct('<IIIIIIQQ')
+LATEST = struct.Struct('<Q')
+LATEST_OFFSET = HEADER.size - LATEST.size
+CLOSED = struct.Struct('<I')
+CLOSED_OFFSET = 12
+# 槽位：序号 + 记录
+SEQ = struct.Struct('<Q')
+# 记录：回合、帧数、得分、最高分、死亡次数、最大帧数、累计生成的管道对数量，
+# 小鸟 y、速度、动画帧，动作、是否结束、管道对数量，两块地面 x，管道对 (x, 下管道高度, 是否已计分)，观察值，奖励，
+# 辅助线（计算观察值时的小鸟中心 y、最近管道对的 x 和下管道顶端 y）
+# 观察值用双精度保存，查看器画出的辅助线与训练进程完全一致
+RECORD = struct.Struct('<7IifBBBB2i' + 'iiB' * MAX_PIPES + '3dfdii')
+SLOT_SIZE = SEQ.size + RECORD.size
+PIPE_PADDING = (0, 0, 0) * MAX_PIPES
+
+LiveState = namedtuple('LiveState', [
+    'seq', 'episode', 'frame', 'score', 'high_score', 'death_count', 'max_frame', 'spawned',
+    'bird_y', 'bird_speed', 'bird_frame', 'action', 'done', 'ground_x', 'pipes', 'obs', 'reward', 'guide'])
+
+
+def attach(name):
+    """
+    打开已有的共享内存（不登记到 resource_tracker）
+
+    Python 3.13 之前打开方也会被登记，查看器退出时 resource_tracker 会把训练进程的共享内存删掉。
+    """
+    try:
+        shm = shared_memory.SharedMemory(name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def process_alive(pid):
+    """进程是否还在运行（Windows 上 os.kill 会结束进程，无法检查，一律视为还在运行）"""
+    if pid <= 0 or os.name == 'nt':
+        return pid > 0
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # 其他用户的进程
+    return True
+
+
+def unlink_stale(name):
+    """
+    删除上次训练残留的共享内存
+
+    只有写入方已经关闭或者写入进程已经退出时才删除；不是实时画面缓冲区，
+    或者还有训练进程在写入时抛出 FileExistsError，不影响正在进行的训练。
+    """
+    shm = attach(name)
+    try:
+        if shm.size < HEADER.size:
+            raise FileExistsError(f"共享内存 {name} 已存在且不是实时画面缓冲区")
+        magic, _, _, closed, pid, _, _, _ = HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC:
+            raise FileExistsError(f"共享内存 {name} 已存在且不是实时画面缓冲区")
+        if not closed and process_alive(pid):
+            raise FileExistsError(f"共享内存 {name} 正在被训练进程 {pid} 使用，请换一个名称或关闭实时画面")
+    finally:
+        shm.close()
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class LivePublisher:
+    """
+    写入方：把每一步的游戏状态写入共享内存环形缓冲区
+
+    参数:
+        name: 共享内存名称（已经存在时，上次训练的残留会被删除后重新创建，仍在使用时抛出 FileExistsError）
+        capacity: 槽位数
+        max_rate: 每秒最多写入的记录数，None 表示每次都写入
+    """
+    def __init__(self, name=LIVE_NAME, capacity=CAPACITY, max_rate=MAX_RATE):
+        self.name = name
+        self.capacity = capacity
+        self.interval = 1 / max_rate if max_rate else 0.0
+        self.next_time = 0.0
+        size = HEADER.size + capacity * SLOT_SIZE
+        try:
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            unlink_stale(name)
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        self.buf = self.shm.buf
+        HEADER.pack_into(self.buf, 0, MAGIC, capacity, RECORD.size, 0, os.getpid(), 0, random.getrandbits(64), 0)
+        self.seq = 0
+
+    def due(self):
+        """是否到了写入下一条记录的时间"""
+        now = time.perf_counter()
+        if now < self.next_time:
+            return False
+        self.next_time = now + self.interval
+        return True
+
+    def publish(self, episode, frame, score, high_score, death_count, max_frame, spawned,
+                bird_y, bird_speed, bird_frame, action, done, ground_x, pipes, obs, reward, guide):
+        """
+        写入一条状态记录
+
+        参数:
+            ground_x: 两块地面的 x 坐标
+            pipes: 管道对 (x, 下管道高度, 是否已计分) 的序列，最多 MAX_PIPES 对
+            obs: 3 个浮点数的观察值（到上管道的距离、到下管道的距离、水平距离）
+            guide: 计算观察值时的 (小鸟中心 y, 最近管道对的 x, 下管道顶端 y)，画辅助线用
+        """
+        buf = self.buf
+        seq = self.seq + 1
+        offset = HEADER.size + (seq % self.capacity) * SLOT_SIZE
+        pipe_values = []
+        for x, size, scored in pipes:
+            pipe_values += (x, size, scored)
+        count = len(pipe_values) // 3
+        pipe_values += PIPE_PADDING[:3 * MAX_PIPES - len(pipe_values)]
+
+        SEQ.pack_into(buf, offset, 0)  # 写入期间槽位无效
+        RECORD.pack_into(buf, offset + SEQ.size, episode, frame, score, high_score, death_count, max_frame, spawned,
+                         bird_y, bird_speed, bird_frame, action, done, count, ground_x[0], ground_x[1],
+                         *pipe_values, obs[0], obs[1], obs[2], reward, guide[0], guide[1], guide[2])
+        SEQ.pack_into(buf, offset, seq)
+        LATEST.pack_into(buf, LATEST_OFFSET, seq)
+        self.seq = seq
+
+    def close(self):
+        """标记为已关闭（查看器随之退出）并删除共享内存"""
+        if self.shm is None:
+            return
+        CLOSED.pack_into(self.buf, CLOSED_OFFSET, 1)
+        self.buf = None
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        self.shm = None
+
+
+class LiveReader:
+    """
+    读取方：读取最新的完整状态记录
+
+    参数:
+        name: 共享内存名称
+    """
+    def __init__(self, name=LIVE_NAME):
+        self.name = name
+        self.shm = attach(name)
+        self.buf = self.shm.buf
+        magic, self.capacity, record_size, _, _, _, self.token, _ = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or record_size != RECORD.size:
+            self.close()
+            raise ValueError(f"共享内存 {name} 不是实时画面缓冲区或版本不一致")
+        self.last_seq = 0
+
+    def closed(self):
+        """写入方是否已经关闭"""
+        return CLOSED.unpack_from(self.buf, CLOSED_OFFSET)[0] == 1
+
+    def abandoned(self):
+        """写入方是否已经不在：共享内存已被删除（写入进程异常退出），或者被新的训练重新创建"""
+        try:
+            shm = attach(self.name)
+        except FileNotFoundError:
+            return True
+        try:
+            return HEADER.unpack_from(shm.buf, 0)[6] != self.token
+        finally:
+            shm.close()
+
+    def latest(self):
+        """
+        最新的状态记录
+
+        返回:
+            LiveState，没有新记录或读到正在被覆盖的槽位时返回 None
+        """
+        buf = self.buf
+        seq = LATEST.unpack_from(buf, LATEST_OFFSET)[0]
+        if seq == self.last_seq:
+            return None
+        offset = HEADER.size + (seq % self.capacity) * SLOT_SIZE
+        if SEQ.unpack_from(buf, offset)[0] != seq:
+            return None
+        values = RECORD.unpack_from(buf, offset + SEQ.size)
+        if SEQ.unpack_from(buf, offset)[0] != seq:
+            return None  # 读取期间写入方绕了一圈回来覆盖了这个槽位
+        self.last_seq = seq
+
+        count = values[12]
+        pipe_values = values[15:15 + 3 * count]
+        pipes = [(pipe_values[i], pipe_values[i + 1], bool(pipe_values[i + 2])) for i in range(0, len(pipe_values), 3)]
+        return LiveState(seq, *values[:7], values[7], values[8], values[9], values[10], bool(values[11]),
+                         values[13:15], pipes, values[-7:-4], values[-4], values[-3:])
+
+    def close(self):
+        if self.shm is not None:
+            self.buf = None
+            self.shm.close()
+            self.shm = None
+
+
+def wait_for_reader(name, poll=0.5, stop=None):
+    """等待写入方创建共享内存，stop() 返回 True 时放弃等待并返回 None"""
+    while True:
+        try:
+            return LiveReader(name)
+        except FileNotFoundError:
+            if stop is not None and stop():
+                return None
+            time.sleep(poll)
+
+
+def run_viewer(name=LIVE_NAME, fps=VIEWER_FPS, follow=False):
+    """
+    查看器：按 fps 读取最新的状态并绘制，写入方关闭后退出
+
+    参数:
+        name: 共享内存名称
+        fps: 最高帧率
+        follow: 训练结束后继续等待下一次训练
+    """
+    from flappy_env import FlappyEnv, CLOCK_UNTHROTTLED
+    import pygame
+
+    print(f"等待训练进程写入实时画面: {name}")
+    reader = wait_for_reader(name)
+    env = FlappyEnv(render_mode='human', clock_mode=CLOCK_UNTHROTTLED)
+    clock = pygame.time.Clock()
+    last_state = time.perf_counter()
+    try:
+        while True:
+            # 先取走关闭窗口的事件（render 中处理时会直接退出 pygame）
+            if env.screen is not None and pygame.event.get(pygame.QUIT):
+                return
+            state = reader.latest()
+            now = time.perf_counter()
+            if state is not None:
+                env.show(state)  # 只画最新的一条，中间的记录直接丢弃
+                last_state = now
+            elif reader.closed() or (now - last_state > 2.0 and reader.abandoned()):
+                # 训练结束（PPO 更新参数时也会暂停写入，所以只在长时间没有新记录时检查写入方是否还在）
+                reader.close()
+                if not follow:
+                    return
+                print("训练已结束，等待下一次训练...")
+                # 等待期间继续处理窗口事件（SDL 把 SIGTERM 也转换成关闭窗口的事件）
+                reader = wait_for_reader(name, stop=lambda: bool(pygame.event.get(pygame.QUIT)))
+                if reader is None:
+                    return
+                env.shown_episode = None  # 新的训练从头绘制
+                last_state = time.perf_counter()
+            clock.tick(fps)
+    finally:
+        if reader is not None:
+            reader.close()
+        env.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='查看训练的实时画面（从共享内存读取游戏状态）')
+    parser.add_argument('--name', default=LIVE_NAME, help='共享内存名称')
+    parser.add_argument('--fps', type=float, default=VIEWER_FPS, help='最高帧率')
+    parser.add_argument('--follow', action='store_true', help='训练结束后继续等待下一次训练')
+    args = parser.parse_args()
+    try:
+        run_viewer(args.name, args.fps, args.follow)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
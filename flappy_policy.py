@@ -0,0 +1,166 @@
+"""
+纯 NumPy 策略推理
+
+把训练好的 PPO MlpPolicy 的策略网络（mlp_extractor.policy_net + action_net）导出为一个很小的 .npz 权重文件，
+之后只用 NumPy 计算动作，不需要导入 torch 和 stable_baselines3：
+玩游戏的进程启动只需几毫秒，每次推理只需几微秒。
+
+导出（需要安装 stable_baselines3）：
+    python flappy_policy.py models/1716117777/model_290000.zip
+使用：
+    policy = NumpyPolicy('models/1716117777/model_290000.npz')
+    action, _ = policy.predict(obs, deterministic=True)  # 与 model.predict 的结果一致
+    actions = policy.act(batch_obs)  # 一批观察值
+"""
+import argparse
+import os
+
+import numpy as np
+
+# 支持的激活函数（torch 模块类名 -> 原地计算的 NumPy 函数）
+ACTIVATIONS = {
+    'Tanh': lambda x: np.tanh(x, out=x),
+    'ReLU': lambda x: np.maximum(x, 0, out=x),
+    'Identity': lambda x: x,
+}
+
+
+def policy_file(model_path):
+    """模型 .zip 对应的 NumPy 权重文件路径"""
+    return os.path.splitext(model_path)[0] + '.npz'
+
+
+def export_policy(model_path, output_path=None):
+    """
+    把 PPO MlpPolicy 模型导出为 NumPy 权重文件
+
+    参数:
+        model_path: 模型 .zip 路径
+        output_path: 输出路径，默认与模型同名的 .npz
+    返回:
+        str: 输出路径
+    """
+    from stable_baselines3 import PPO
+    import torch
+
+    model = PPO.load(model_path, device='cpu')
+    policy = model.policy
+    if type(policy.features_extractor).__name__ != 'FlattenExtractor':
+        raise ValueError(f"只支持 MlpPolicy，不支持 {type(policy.features_extractor).__name__}")
+    if type(model.action_space).__name__ != 'Discrete':
+        raise ValueError(f"只支持离散动作，不支持 {model.action_space}")
+
+    arrays = {}
+    activations = []
+    for module in policy.mlp_extractor.policy_net:
+        if isinstance(module, torch.nn.Linear):
+            index = len(activations)
+            arrays[f'weight_{index}'] = module.weight.detach().numpy().T.astype(np.float32)  # (输入, 输出)
+            arrays[f'bias_{index}'] = module.bias.detach().numpy().astype(np.float32)
+            activations.append('Identity')
+        else:
+            name = type(module).__name__
+            if name not in ACTIVATIONS or not activations:
+                raise ValueError(f"不支持的网络层: {module}")
+            activations[-1] = name  # 激活函数作用在前一个线性层的输出上
+    arrays['action_weight'] = policy.action_net.weight.detach().numpy().T.astype(np.float32)
+    arrays['action_bias'] = policy.action_net.bias.detach().numpy().astype(np.float32)
+    arrays['activations'] = np.array(activations)
+    arrays['obs_shape'] = np.array(model.observation_space.shape)
+
+    output_path = output_path or policy_file(model_path)
+    np.savez(output_path, **arrays)
+    return output_path
+
+
+def exported_policy(model_path):
+    """
+    模型对应的 NumPy 权重文件，没有导出过或模型更新过时先导出
+
+    返回:
+        str: .npz 路径
+    """
+    output_path = policy_file(model_path)
+    if not os.path.exists(output_path) or os.path.getmtime(output_path) < os.path.getmtime(model_path):
+        export_policy(model_path, output_path)
+    return output_path
+
+
+class NumpyPolicy:
+    """
+    用 NumPy 计算导出策略的动作
+
+    参数:
+        path: export_policy 导出的 .npz 文件
+        seed: 随机策略（deterministic=False）的随机种子
+    """
+    def __init__(self, path, seed=None):
+        with np.load(path) as data:
+            activations = [str(name) for name in data['activations']]
+            self.layers = [(data[f'weight_{i}'], data[f'bias_{i}'], ACTIVATIONS[name])
+                           for i, name in enumerate(activations)]
+            self.action_weight = data['action_weight']
+            self.action_bias = data['action_bias']
+            self.obs_shape = tuple(int(n) for n in data['obs_shape'])
+        self.obs_size = int(np.prod(self.obs_shape))
+        self.rng = np.random.default_rng(seed)
+
+    def forward(self, obs):
+        """
+        计算一批观察值的动作 logits
+
+        参数:
+            obs: (n, *观察值形状) 的数组
+        返回:
+            (n, 动作数) 的 float32 数组
+        """
+        x = np.asarray(obs, dtype=np.float32).reshape(-1, self.obs_size)
+        for weight, bias, activation in self.layers:
+            x = x @ weight
+            x += bias
+            activation(x)
+        logits = x @ self.action_weight
+        logits += self.action_bias
+        return logits
+
+    def act(self, obs, deterministic=True):
+        """一批观察值的动作（确定性时取 logits 最大的动作，否则按 softmax 概率采样）"""
+        logits = self.forward(obs)
+        if deterministic:
+            return logits.argmax(axis=1)
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        # 逆变换采样：每行一个均匀随机数，落在累计概率的哪一段
+        u = self.rng.random((len(probs), 1))
+        return np.minimum((probs.cumsum(axis=1) < u).sum(axis=1), probs.shape[1] - 1)
+
+    def predict(self, observation, state=None, episode_start=None, deterministic=False):
+        """
+        获取动作，参数和返回值与 PPO.predict 相同
+
+        参数:
+            observation: 单个观察值，或 (n, *观察值形状) 的一批观察值
+        返回:
+            tuple: (动作, None)
+        """
+        obs = np.asarray(observation)
+        single = obs.shape == self.obs_shape
+        actions = self.act(obs, deterministic)
+        if single:
+            actions = actions.squeeze(axis=0)
+        return actions, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='把 PPO MlpPolicy 模型导出为纯 NumPy 权重文件')
+    parser.add_argument('model_path', help='模型 .zip 路径')
+    parser.add_argument('--output', default=None, help='输出路径，默认与模型同名的 .npz')
+    args = parser.parse_args()
+
+    output_path = export_policy(args.model_path, args.output)
+    print(f"已导出: {output_path}（{os.path.getsize(output_path)} 字节）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+精灵对象池
+
+预先创建固定数量的管道对和地面，离开屏幕后放回池中，需要时原地移动到新位置并重新随机高度，
+稳定运行时每一步都不再创建新的精灵对象。
+"""
+
+
+class SpritePool:
+    """
+    固定大小的精灵对象池
+
+    参数:
+        create: 无参数函数，创建一个新对象（精灵或管道对）
+        place: place(对象, *参数)，把复用的对象移动到新位置
+        size: 预先创建的对象数量
+
+    计数器:
+        created: 累计创建的对象数量（包括预先创建的）
+        misses: 池为空时临时创建的对象数量，稳定运行时应保持为 0
+        reused: 从池中复用对象的次数
+    """
+    def __init__(self, create, place, size):
+        self.create = create
+        self.place = place
+        self.free = [create() for _ in range(size)]
+        self.created = size
+        self.misses = 0
+        self.reused = 0
+
+    def acquire(self, *args):
+        """取出一个对象并放到新位置，池为空时才创建新对象"""
+        if self.free:
+            item = self.free.pop()
+            self.reused += 1
+        else:
+            item = self.create()
+            self.created += 1
+            self.misses += 1
+        self.place(item, *args)
+        return item
+
+    def release(self, item):
+        """把不再使用的对象放回池中"""
+        self.free.append(item)
+
+    def get_stats(self):
+        """获取计数器"""
+        return {
+            'created': self.created,
+            'misses': self.misses,
+            'reused': self.reused,
+            'free': len(self.free)
+        }
@@ -0,0 +1,122 @@
+"""
+分阶段耗时统计
+
+在 step / reset 中按顺序调用 mark(阶段名)，记录与上一次标记之间的耗时。
+每个阶段只保留最近 window 次的耗时（环形缓冲），汇总时计算均值、分位数和对数分桶直方图，
+用来判断一步的时间花在了观察值计算、物理、计分、碰撞、统计写入还是绘制上。
+记录一次只需要读一次计时器和几次列表、字典操作，关闭时（profiler 为 None）没有额外开销。
+"""
+import json
+import time
+
+import numpy as np
+
+# 直方图分桶上界（微秒），最后一个桶收集更慢的样本
+HISTOGRAM_BOUNDS_US = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 65536)
+
+
+class PhaseProfiler:
+    """
+    分阶段耗时统计器
+
+    用法:
+        profiler.begin()            # 一步开始
+        ...
+        profiler.mark('observe')    # 记录从上一次标记到现在的耗时
+        ...
+        profiler.skip()             # 丢弃从上一次标记到现在的耗时（不属于任何阶段）
+        profiler.last_step          # 本步各阶段耗时（纳秒）
+        profiler.summary()          # 各阶段的滚动统计
+        profiler.dump()             # 打印汇总表
+    """
+    def __init__(self, window=1000, summary_every=1000):
+        self.window = window  # 每个阶段保留的样本数
+        self.summary_every = summary_every  # 每隔多少步在 info 中附带一次汇总
+        self.steps = 0  # 调用 begin 的次数
+        self.samples = {}  # 阶段 -> 最近 window 次耗时（纳秒）
+        self.counts = {}  # 阶段 -> 累计记录次数
+        self.last_step = {}  # 本步各阶段耗时（纳秒）
+        self.last = time.perf_counter_ns()
+
+    def begin(self):
+        """开始新的一步"""
+        self.steps += 1
+        self.last_step = {}
+        self.last = time.perf_counter_ns()
+
+    def skip(self):
+        """重新开始计时，不记录之前的耗时"""
+        self.last = time.perf_counter_ns()
+
+    def mark(self, phase):
+        """记录阶段 phase 的耗时（从上一次标记到现在）"""
+        now = time.perf_counter_ns()
+        elapsed = now - self.last
+        self.last = now
+
+        samples = self.samples.get(phase)
+        if samples is None:
+            samples = self.samples[phase] = []
+            self.counts[phase] = 0
+        count = self.counts[phase]
+        if count < self.window:
+            samples.append(elapsed)
+        else:
+            samples[count % self.window] = elapsed
+        self.counts[phase] = count + 1
+        # 同一步中重复出现的阶段（如多次绘制）累加
+        self.last_step[phase] = self.last_step.get(phase, 0) + elapsed
+
+    def summary_due(self):
+        """本步是否需要附带汇总（汇总需要排序，不能每步都做）"""
+        return self.steps % self.summary_every == 0
+
+    def reset(self):
+        """清空所有统计"""
+        self.samples.clear()
+        self.counts.clear()
+        self.last_step = {}
+        self.steps = 0
+
+    def summary(self):
+        """
+        汇总最近 window 次样本
+
+        返回:
+            dict: 阶段 -> {'count', 'mean_us', 'p50_us', 'p90_us', 'p99_us', 'max_us', 'share', 'histogram'}
+            share 为该阶段在所有阶段总耗时中的占比，
+            histogram 为 [(上界微秒, 样本数), ...]，最后一项上界为 None
+        """
+        totals = {phase: sum(samples) for phase, samples in self.samples.items()}
+        grand_total = sum(totals.values()) or 1
+        bins = np.array((0,) + HISTOGRAM_BOUNDS_US + (np.inf,), dtype=np.float64)
+        bounds = list(HISTOGRAM_BOUNDS_US) + [None]
+
+        result = {}
+        for phase, samples in self.samples.items():
+            values = np.array(samples, dtype=np.float64) / 1000.0
+            p50, p90, p99 = np.percentile(values, [50, 90, 99])
+            histogram, _ = np.histogram(values, bins=bins)
+            result[phase] = {
+                'count': self.counts[phase],
+                'mean_us': float(values.mean()),
+                'p50_us': float(p50),
+                'p90_us': float(p90),
+                'p99_us': float(p99),
+                'max_us': float(values.max()),
+                'share': totals[phase] / grand_total,
+                'histogram': [(bound, int(n)) for bound, n in zip(bounds, histogram) if n]
+            }
+        return result
+
+    def dump(self, path=None):
+        """打印汇总表；指定 path 时同时把 summary() 写成 JSON 文件"""
+        summary = self.summary()
+        print(f"{'阶段':<16}{'次数':>10}{'均值us':>10}{'p50us':>10}{'p90us':>10}{'p99us':>10}{'最大us':>10}{'占比':>8}")
+        for phase, s in sorted(summary.items(), key=lambda item: -item[1]['share']):
+            print(f"{phase:<18}{s['count']:>10}{s['mean_us']:>10.1f}{s['p50_us']:>10.1f}"
+                  f"{s['p90_us']:>10.1f}{s['p99_us']:>10.1f}{s['max_us']:>10.1f}{s['share']:>8.1%}")
+        if path is not None:
+            with open(path, 'w') as f:
+                json.dump(summary, f, indent=2)
+        return summary
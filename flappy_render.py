@@ -0,0 +1,78 @@
+"""
+脏矩形渲染
+
+每一帧只把上一帧画过东西的区域恢复成背景，再按原来的顺序绘制精灵、文字和线条，
+最后只把 上一帧区域 + 本帧区域 刷新到窗口。没有变化的背景区域既不重画也不刷新，
+看模型玩游戏时渲染开销取决于画面中运动的部分（小鸟、管道、地面、HUD），而不是窗口大小。
+结果与整屏重画完全一致：不在这两类区域里的像素上一帧就是背景。
+"""
+import pygame
+
+# 恢复背景时把区域左右边界扩展到 16 像素（32 位像素为 64 字节）对齐，
+# SDL 对齐的行拷贝比不对齐的快一个数量级；多恢复的像素本来就是背景，不影响画面
+ALIGN = 16
+
+
+class DirtyRenderer:
+    """
+    脏矩形渲染器
+
+    用法:
+        renderer.begin()                    # 恢复上一帧画过的区域
+        renderer.draw(group)                # 按组内顺序绘制精灵
+        renderer.blit(surface, position)    # 绘制文字、图片
+        renderer.add(pygame.draw.line(...)) # 记录其他绘制操作返回的区域
+        renderer.present()                  # 只刷新变化的区域（或 end() 只结束一帧不刷新）
+    """
+    def __init__(self, screen, background):
+        self.screen = screen
+        self.background = background  # 与屏幕同样大小的不透明背景
+        self.previous = None  # 上一帧绘制过的区域，None 表示下一帧整屏重画
+        self.current = []  # 本帧绘制过的区域
+
+    def invalidate(self):
+        """下一帧整屏重画（在没有记录的绘制之后调用，如回合开始、游戏结束画面之后）"""
+        self.previous = None
+
+    def begin(self):
+        """开始新的一帧"""
+        if self.previous is None:
+            self.screen.blit(self.background, (0, 0))
+        else:
+            width = self.screen.get_width()
+            for rect in self.previous:
+                left = rect.left - rect.left % ALIGN
+                right = min(width, rect.right + (-rect.right) % ALIGN)
+                area = pygame.Rect(left, rect.top, right - left, rect.height)
+                self.screen.blit(self.background, area, area)
+        self.current = []
+
+    def add(self, rect):
+        """记录本帧绘制过的区域"""
+        self.current.append(rect)
+
+    def blit(self, surface, position):
+        """绘制图片并记录区域"""
+        self.current.append(self.screen.blit(surface, position))
+
+    def draw(self, group):
+        """按顺序绘制精灵组中的所有精灵并记录区域"""
+        self.current.extend(self.screen.blits([(sprite.image, sprite.rect) for sprite in group]))
+
+    def end(self):
+        """
+        结束一帧
+
+        返回:
+            list: 需要刷新到窗口的区域
+        """
+        if self.previous is None:
+            dirty = [self.screen.get_rect()]
+        else:
+            dirty = self.previous + self.current
+        self.previous = self.current
+        return dirty
+
+    def present(self):
+        """结束一帧并只刷新变化的区域"""
+        pygame.display.update(self.end())
@@ -0,0 +1,380 @@
+"""
+回合录像与回放
+
+录像只保存重建一个回合所需的最少信息，不保存画面：
+    - 随机种子（reset 时给出的种子，没有时为 -1，只用于查找）
+    - 管道高度序列（每对管道一个字节）
+    - 每一步的动作（每步一位）
+    - 最终得分、帧数、是否死亡
+一个 1000 帧的回合只有一百多字节，几千个回合的录像也只有几百 KB。
+游戏逻辑是确定的，按录像中的管道高度和动作重新推进 FlappyEnv 就能得到完全相同的回合。
+
+录像文件由一个文件头和依次追加的回合记录组成，每个回合结束时一次写入，
+进程被强制结束时最多丢失正在进行的回合。
+
+录制：FlappyEnv(record='recordings/episodes.rec')、FlappyVecEnv(num_envs, record=...)，
+或者训练、评估时加 --record。
+回放（先无画面快进到第 --frame 帧再显示，负数表示从结尾倒数）：
+    python flappy_replay.py recordings/ --list
+    python flappy_replay.py recordings/ --episode 12 --frame -45
+    python flappy_replay.py evaluation_results/evaluation_20240520_120000/ --seed 17
+    python flappy_replay.py recordings/ --verify
+"""
+import argparse
+import glob
+import os
+import struct
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+FILE_MAGIC = b'FLRC'
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct('<4sI')  # 魔数、版本
+# 回合记录头：种子、得分、帧数、管道对数量、是否死亡，之后是管道高度（每对一个字节）和动作（每步一位）
+EPISODE = struct.Struct('<qIIIB')
+HEIGHT_OFFSET = 100  # 管道高度范围为 100~300，减去它后用一个字节保存
+NO_SEED = -1
+
+# 录像中的一个回合：source 为录像文件，index 为在所有录像中的序号，actions 为每步动作（0/1 的 uint8 数组）
+Episode = namedtuple('Episode', ['source', 'index', 'seed', 'score', 'frames', 'done', 'heights', 'actions'])
+
+
+class EpisodeWriter:
+    """
+    把回合追加到录像文件
+
+    参数:
+        path: 录像文件路径（已经存在时在末尾追加）
+    """
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.file = open(path, 'ab', buffering=0)
+        if self.file.tell() == 0:
+            self.file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+        self.episodes = 0  # 本次写入的回合数
+
+    def write(self, seed, score, done, heights, actions):
+        """
+        写入一个回合
+
+        参数:
+            heights: 管道高度减去 HEIGHT_OFFSET 的字节序列
+            actions: 每步动作（0/1）的 uint8 数组
+        """
+        record = (EPISODE.pack(NO_SEED if seed is None else seed, score, len(actions), len(heights), done)
+                  + heights + np.packbits(actions).tobytes())
+        self.file.write(record)  # 整条记录一次写入，文件中不会出现交错的记录
+        self.episodes += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class EpisodeRecorder:
+    """
+    录制 FlappyEnv 的回合
+
+    reset 之后调用 begin，每一步调用 step，回合结束或者下一次 reset 之前调用 end。
+    每一步只追加一个动作字节，生成新管道时再追加一个高度字节。
+
+    参数:
+        path: 录像文件路径
+        core: 环境的 FlappyCore
+    """
+    def __init__(self, path, core):
+        self.writer = EpisodeWriter(path)
+        self.core = core
+        self.seed = NO_SEED
+        self.heights = bytearray()
+        self.actions = bytearray()
+        self.active = False
+
+    def begin(self, seed=None):
+        """新回合开始（core 已经重置）"""
+        self.end()
+        self.seed = NO_SEED if seed is None else seed
+        self.heights = bytearray(size - HEIGHT_OFFSET for _, size, _ in self.core.pipes)
+        self.actions = bytearray()
+        self.active = True
+
+    def step(self, action):
+        """记录刚推进的一步"""
+        if self.active:
+            self.actions.append(1 if action == 1 else 0)
+            core = self.core
+            if core.spawned > len(self.heights):
+                self.heights.append(core.pipes[-1][1] - HEIGHT_OFFSET)
+
+    def end(self):
+        """写入当前回合（死亡或者没有结束就被重置），没有进行中的回合时什么也不做"""
+        if self.active:
+            actions = np.frombuffer(self.actions, dtype=np.uint8)
+            self.writer.write(self.seed, self.core.score, self.core.done, self.heights, actions)
+            self.active = False
+
+    def close(self):
+        self.end()
+        self.writer.close()
+
+
+class VecEpisodeRecorder:
+    """
+    录制 FlappyVecEnv 中每个世界的回合
+
+    所有世界的动作按步写入一个 (步数, 世界数) 的数组，每个世界记住自己的回合从哪一行开始，
+    回合结束时取出这个世界的那一列写入录像；数组写满时丢掉所有世界都不再需要的行，仍然不够时扩容。
+
+    参数:
+        path: 录像文件路径
+        num_envs: 世界数量
+        capacity: 动作数组的初始行数
+    """
+    def __init__(self, path, num_envs, capacity=4096):
+        self.writer = EpisodeWriter(path)
+        self.log = np.zeros((capacity, num_envs), dtype=np.uint8)
+        self.length = 0  # 已经使用的行数
+        self.start = np.zeros(num_envs, dtype=np.int64)  # 每个世界当前回合的第一行
+        self.heights = [bytearray() for _ in range(num_envs)]
+
+    def begin(self, mask, pipe_size):
+        """mask 选中的世界开始新回合（pipe_size 为重置后的管道高度）"""
+        self.start[mask] = self.length
+        for i, sizes in zip(np.flatnonzero(mask).tolist(), (pipe_size[mask] - HEIGHT_OFFSET).tolist()):
+            self.heights[i] = bytearray(sizes)
+
+    def respawn(self, mask, sizes):
+        """mask 选中的世界生成了新管道，sizes 为每个世界新管道的高度"""
+        for i, size in zip(np.flatnonzero(mask).tolist(), sizes[mask].tolist()):
+            self.heights[i].append(size - HEIGHT_OFFSET)
+
+    def step(self, actions, dones, score):
+        """记录所有世界刚推进的一步，写入结束的回合"""
+        if self.length == len(self.log):
+            self.compact()
+        self.log[self.length] = actions == 1
+        self.length += 1
+        if dones.any():
+            for i, final_score in zip(np.flatnonzero(dones).tolist(), score[dones].tolist()):
+                self.write(i, final_score, True)
+
+    def compact(self):
+        """丢掉所有世界的当前回合都不再需要的行，剩余的行仍然超过一半时扩容"""
+        keep = int(self.start.min())
+        used = self.length - keep
+        log = self.log if used < len(self.log) // 2 else np.zeros((len(self.log) * 2, self.log.shape[1]), np.uint8)
+        log[:used] = self.log[keep:self.length]
+        self.log = log
+        self.length = used
+        self.start -= keep
+
+    def write(self, i, score, done):
+        start = int(self.start[i])
+        self.writer.write(NO_SEED, score, done, self.heights[i], self.log[start:self.length, i])
+
+    def close(self, score):
+        """写入所有世界没有结束的回合（score 为每个世界当前的得分）"""
+        if self.writer.file is None:
+            return
+        for i in range(len(self.heights)):
+            if self.length > self.start[i]:
+                self.write(i, int(score[i]), False)
+        self.writer.close()
+
+
+def recording_files(path):
+    """录像文件列表：path 是目录时为其中所有的 .rec 文件（按文件名排列）"""
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, '*.rec')))
+    return [path]
+
+
+def read_episodes(path):
+    """
+    依次读取录像中的所有回合
+
+    参数:
+        path: 录像文件，或者包含录像文件的目录
+    返回:
+        Episode 的生成器（最后一条记录不完整时忽略它）
+    """
+    index = 0
+    for file_path in recording_files(path):
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        if len(data) < FILE_HEADER.size:
+            continue
+        magic, version = FILE_HEADER.unpack_from(data, 0)
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            raise ValueError(f"{file_path} 不是录像文件或版本不一致")
+        offset = FILE_HEADER.size
+        while offset + EPISODE.size <= len(data):
+            seed, score, frames, pipes, done = EPISODE.unpack_from(data, offset)
+            offset += EPISODE.size
+            end = offset + pipes + (frames + 7) // 8
+            if end > len(data):
+                break  # 写到一半时进程被强制结束
+            heights = data[offset:offset + pipes]
+            bits = np.frombuffer(data, dtype=np.uint8, count=end - offset - pipes, offset=offset + pipes)
+            actions = np.unpackbits(bits, count=frames)
+            offset = end
+            yield Episode(file_path, index, seed, score, frames, bool(done), heights, actions)
+            index += 1
+
+
+class RecordedPipes:
+    """按录像中的顺序给出管道高度，替换 FlappyCore 的随机数生成器（只需要 randint）"""
+    def __init__(self, heights):
+        self.heights = iter(heights)
+
+    def randint(self, a, b):
+        try:
+            size = next(self.heights) + HEIGHT_OFFSET
+        except StopIteration:
+            raise ValueError("录像中的管道高度已经用完，录像与当前游戏逻辑不一致") from None
+        assert a <= size <= b
+        return size
+
+
+def replay(env, episode, frame=0):
+    """
+    在 FlappyEnv 中重建录像的回合
+
+    前 frame 帧无画面快进（不绘制、不限帧率），之后按 env 的渲染模式和时钟逐帧推进并绘制。
+    env 应该用 save_stats=False 创建，回放不会改变游戏统计数据。
+
+    参数:
+        env: FlappyEnv
+        episode: Episode
+        frame: 开始绘制的帧，负数表示从结尾倒数
+    返回:
+        生成器，从第 frame 帧开始每推进一帧产出 (帧数, 观察值, 奖励, 是否结束, info)
+    """
+    if frame < 0:
+        frame += episode.frames
+    frame = min(max(frame, 0), episode.frames)
+    render_mode = env.render_mode
+    rng = env.core.rng
+    env.core.rng = RecordedPipes(episode.heights)
+    env.render_mode = None  # 快进期间不绘制
+    try:
+        env.reset()
+        actions = episode.actions.tolist()
+        for action in actions[:frame]:
+            if env.done:
+                raise ValueError(f"回放在第 {env.frame} 帧提前结束，录像与当前游戏逻辑不一致")
+            env.step(action)
+
+        # 快进结束，从当前状态重新创建精灵并显示
+        env.render_mode = render_mode
+        if render_mode is not None:
+            env.init_view()
+        if render_mode == 'human':
+            env.render()
+            env.tick()
+
+        for action in actions[frame:]:
+            if env.done:
+                raise ValueError(f"回放在第 {env.frame} 帧提前结束，录像与当前游戏逻辑不一致")
+            obs, reward, done, _, info = env.step(action)
+            yield env.frame, obs, reward, done, info
+    finally:
+        env.render_mode = render_mode
+        env.core.rng = rng
+
+
+def verify(path):
+    """
+    无画面回放所有回合，检查结束的帧、得分和是否死亡与录像一致
+
+    返回:
+        tuple: (回合数, 不一致的回合列表, 总帧数, 耗时秒数)
+    """
+    from flappy_env import FlappyEnv, CLOCK_UNTHROTTLED
+
+    env = FlappyEnv(clock_mode=CLOCK_UNTHROTTLED, save_stats=False)
+    count = 0
+    frames = 0
+    mismatches = []
+    start = time.perf_counter()
+    for episode in read_episodes(path):
+        count += 1
+        frames += episode.frames
+        try:
+            for _ in replay(env, episode, frame=episode.frames):
+                pass
+            ok = (env.frame, env.core.score, env.done) == (episode.frames, episode.score, episode.done)
+        except ValueError:
+            ok = False
+        if not ok:
+            mismatches.append(episode)
+    elapsed = time.perf_counter() - start
+    env.close()
+    return count, mismatches, frames, elapsed
+
+
+def describe(episode):
+    seed = '-' if episode.seed == NO_SEED else episode.seed
+    end = '死亡' if episode.done else '未结束'
+    return (f"#{episode.index:<6}得分 {episode.score:<5}帧数 {episode.frames:<7}种子 {seed!s:<8}{end}  "
+            f"{os.path.basename(episode.source)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='回放录像中的回合（先无画面快进到指定帧再显示）')
+    parser.add_argument('path', help='录像文件，或者包含录像文件的目录')
+    parser.add_argument('--list', action='store_true', help='列出所有回合')
+    parser.add_argument('--verify', action='store_true', help='无画面回放所有回合，检查结果与录像一致')
+    parser.add_argument('--episode', type=int, default=-1, help='回合序号（见 --list），默认最后一个回合')
+    parser.add_argument('--seed', type=int, default=None, help='回放使用该种子的回合（例如评估时的种子）')
+    parser.add_argument('--frame', type=int, default=0, help='从第几帧开始显示，负数表示从结尾倒数')
+    parser.add_argument('--fps', type=int, default=15, help='显示的帧率')
+    args = parser.parse_args()
+
+    if args.list:
+        for episode in read_episodes(args.path):
+            print(describe(episode))
+        return
+    if args.verify:
+        count, mismatches, frames, elapsed = verify(args.path)
+        for episode in mismatches:
+            print(f"不一致: {describe(episode)}")
+        print(f"回放 {count} 个回合、{frames} 帧，用时 {elapsed:.2f} 秒，{len(mismatches)} 个不一致")
+        sys.exit(1 if mismatches else 0)
+
+    episodes = list(read_episodes(args.path))
+    if args.seed is not None:
+        episodes = [episode for episode in episodes if episode.seed == args.seed]
+        if not episodes:
+            print(f"错误：没有种子为 {args.seed} 的回合")
+            return
+        episode = episodes[-1]
+    else:
+        if not -len(episodes) <= args.episode < len(episodes):
+            print(f"错误：只有 {len(episodes)} 个回合")
+            return
+        episode = episodes[args.episode]
+    print(describe(episode))
+
+    from flappy_env import FlappyEnv
+
+    env = FlappyEnv(render_mode='human', fps=args.fps, save_stats=False)
+    try:
+        for frame, _, _, _, info in replay(env, episode, frame=args.frame):
+            print(f"\r帧: {frame}/{episode.frames} | 得分: {info['score']}", end="")
+        print("\n回放结束")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        env.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+本地策略推理服务
+
+一个进程加载一次 PPO 模型，通过 Unix socket 接收很多游戏客户端的观察值，
+把同一时间到达的请求拼成一个批次做一次前向计算，再把动作分别发回去。
+很多客户端同时运行时，每帧只做一次批量推理，而不是每个客户端各做一次很小的 torch 前向。
+
+批次在以下任一条件满足时立即计算：
+    - 攒够 max_batch 个观察值
+    - 最早的请求已经等待了 max_delay 秒（延迟上限）
+    - 所有已连接的客户端都在等待回复（不会再有新请求到达）
+
+启动服务：
+    python flappy_serve.py models/model_100000.zip --socket /tmp/flappy_policy.sock
+
+客户端用 PolicyClient 代替 PPO 模型，predict 的用法与 model.predict 相同：
+    model = load_policy(model_path, server='/tmp/flappy_policy.sock')
+    action, _ = model.predict(obs, deterministic=True)
+
+协议（小端）：
+    连接后服务端先发送 4 字节长度 + JSON 描述（观察值、动作的形状和类型）
+    请求：uint32 观察值个数 + uint8 是否确定性 + 观察值数据
+    回复：每个观察值对应的动作数据
+"""
+import argparse
+import json
+import os
+import selectors
+import socket
+import struct
+import time
+
+import numpy as np
+
+SOCKET_PATH = '/tmp/flappy_policy.sock'  # 默认 socket 路径
+MAX_BATCH = 64  # 每批最多的观察值个数
+MAX_DELAY = 0.002  # 最早的请求最多等待的秒数
+
+REQUEST_HEADER = struct.Struct('<IB')  # (观察值个数, 是否确定性)
+HELLO_HEADER = struct.Struct('<I')  # JSON 描述的长度
+
+
+def recv_exact(sock, size):
+    """从阻塞 socket 读取正好 size 个字节"""
+    data = bytearray(size)
+    view = memoryview(data)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            raise ConnectionError("推理服务已断开连接")
+        received += n
+    return data
+
+
+class PolicyServer:
+    """
+    批量推理服务
+
+    参数:
+        model: 提供 predict(obs, deterministic=...) 的模型（通常是 PPO）
+        socket_path: Unix socket 路径
+        max_batch: 每批最多的观察值个数
+        max_delay: 最早的请求最多等待的秒数
+    """
+    def __init__(self, model, socket_path=SOCKET_PATH, max_batch=MAX_BATCH, max_delay=MAX_DELAY):
+        self.model = model
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+
+        self.obs_shape = tuple(model.observation_space.shape)
+        self.obs_dtype = np.dtype(model.observation_space.dtype)
+        self.obs_nbytes = int(np.prod(self.obs_shape)) * self.obs_dtype.itemsize
+        action_space = model.action_space
+        self.action_shape = tuple(action_space.shape)
+        self.action_dtype = np.dtype(action_space.dtype)
+
+        self.selector = None
+        self.listener = None
+        self.clients = {}  # 连接 -> 未解析完的数据
+        self.pending = []  # 等待计算的请求 (连接, 观察值个数, 是否确定性, 观察值)
+        self.first_arrival = None  # 当前批次最早的请求到达时间
+        self.running = False
+
+        self.batches = 0
+        self.requests = 0
+        self.observations = 0
+
+    def hello(self):
+        """连接后发送给客户端的描述"""
+        info = json.dumps({
+            'obs_shape': self.obs_shape,
+            'obs_dtype': self.obs_dtype.str,
+            'action_shape': self.action_shape,
+            'action_dtype': self.action_dtype.str
+        }).encode('utf-8')
+        return HELLO_HEADER.pack(len(info)) + info
+
+    def start(self):
+        """开始监听"""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # 上次没有正常退出留下的文件
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.socket_path)
+        self.listener.listen()
+        self.listener.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.running = True
+
+    def serve_forever(self):
+        """处理请求，直到调用 shutdown"""
+        if self.listener is None:
+            self.start()
+        try:
+            while self.running:
+                self.poll()
+        finally:
+            self.close()
+
+    def shutdown(self):
+        """让 serve_forever 在下一次轮询后退出（可以从其他线程调用）"""
+        self.running = False
+
+    def poll(self):
+        """等待新的请求，批次满足条件时计算并回复"""
+        if self.pending:
+            timeout = max(0.0, self.first_arrival + self.max_delay - time.perf_counter())
+        else:
+            timeout = 0.1  # 空闲时定期醒来检查 running
+        for key, _ in self.selector.select(timeout):
+            if key.fileobj is self.listener:
+                self.accept()
+            else:
+                self.receive(key.fileobj)
+
+        # 所有客户端都在等待：按连接计数（同一个客户端可能有多个请求）
+        if self.pending and (
+                sum(request[1] for request in self.pending) >= self.max_batch or
+                time.perf_counter() - self.first_arrival >= self.max_delay or
+                len({request[0] for request in self.pending}) >= len(self.clients)):
+            self.flush()
+
+    def accept(self):
+        """接受新的客户端连接"""
+        conn, _ = self.listener.accept()
+        conn.setblocking(True)  # 只在可读时接收，回复用阻塞发送
+        conn.sendall(self.hello())
+        self.clients[conn] = bytearray()
+        self.selector.register(conn, selectors.EVENT_READ)
+
+    def drop(self, conn):
+        """关闭客户端连接并丢弃它未完成的请求"""
+        if conn not in self.clients:
+            return
+        self.selector.unregister(conn)
+        del self.clients[conn]
+        conn.close()
+        self.pending = [request for request in self.pending if request[0] is not conn]
+        if not self.pending:
+            self.first_arrival = None
+
+    def receive(self, conn):
+        """读取客户端数据，解析出完整的请求"""
+        try:
+            data = conn.recv(65536)
+        except OSError:
+            data = b''
+        if not data:
+            self.drop(conn)
+            return
+
+        buffer = self.clients[conn]
+        buffer += data
+        while len(buffer) >= REQUEST_HEADER.size:
+            count, deterministic = REQUEST_HEADER.unpack_from(buffer)
+            end = REQUEST_HEADER.size + count * self.obs_nbytes
+            if len(buffer) < end:
+                break
+            obs = np.frombuffer(bytes(buffer[REQUEST_HEADER.size:end]), dtype=self.obs_dtype)
+            del buffer[:end]
+            if not self.pending:
+                self.first_arrival = time.perf_counter()
+            self.pending.append((conn, count, bool(deterministic), obs.reshape((count,) + self.obs_shape)))
+
+    def flush(self):
+        """对等待中的请求做批量推理并回复（确定性和随机策略分开计算，每次前向最多 max_batch 个观察值）"""
+        pending = self.pending
+        self.pending = []
+        self.first_arrival = None
+
+        for deterministic in (True, False):
+            group = [request for request in pending if request[2] == deterministic]
+            if not group:
+                continue
+            obs = np.concatenate([request[3] for request in group])
+            batches = []
+            for start in range(0, len(obs), self.max_batch):
+                actions, _ = self.model.predict(obs[start:start + self.max_batch], deterministic=deterministic)
+                batches.append(np.asarray(actions, dtype=self.action_dtype))
+            actions = np.ascontiguousarray(np.concatenate(batches))
+            self.batches += len(batches)
+            self.observations += len(obs)
+
+            start = 0
+            for conn, count, _, _ in group:
+                self.requests += 1
+                try:
+                    conn.sendall(actions[start:start + count].tobytes())
+                except OSError:
+                    self.drop(conn)
+                start += count
+
+    def close(self):
+        """关闭所有连接并删除 socket 文件"""
+        for conn in list(self.clients):
+            self.drop(conn)
+        if self.listener is not None:
+            self.selector.unregister(self.listener)
+            self.listener.close()
+            self.listener = None
+            self.selector.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def stats(self):
+        """推理统计"""
+        return {
+            'batches': self.batches,
+            'requests': self.requests,
+            'observations': self.observations,
+            'mean_batch': self.observations / self.batches if self.batches else 0.0
+        }
+
+
+class PolicyClient:
+    """
+    推理服务的客户端，可以代替 PPO 模型放进现有的 predict 循环
+
+    参数:
+        socket_path: 推理服务的 Unix socket 路径
+    """
+    def __init__(self, socket_path=SOCKET_PATH):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        size, = HELLO_HEADER.unpack(recv_exact(self.sock, HELLO_HEADER.size))
+        info = json.loads(recv_exact(self.sock, size).decode('utf-8'))
+        self.obs_shape = tuple(info['obs_shape'])
+        self.obs_dtype = np.dtype(info['obs_dtype'])
+        self.action_shape = tuple(info['action_shape'])
+        self.action_dtype = np.dtype(info['action_dtype'])
+        self.action_nbytes = int(np.prod(self.action_shape)) * self.action_dtype.itemsize
+
+    def predict(self, observation, state=None, episode_start=None, deterministic=False):
+        """
+        获取动作，参数和返回值与 PPO.predict 相同
+
+        参数:
+            observation: 单个观察值，或 (n, *观察值形状) 的一批观察值
+        返回:
+            tuple: (动作, None)
+        """
+        obs = np.ascontiguousarray(observation, dtype=self.obs_dtype)
+        single = obs.shape == self.obs_shape
+        if single:
+            obs = obs.reshape((1,) + self.obs_shape)
+        count = len(obs)
+
+        self.sock.sendall(REQUEST_HEADER.pack(count, deterministic) + obs.tobytes())
+        data = recv_exact(self.sock, count * self.action_nbytes)
+        actions = np.frombuffer(data, dtype=self.action_dtype).reshape((count,) + self.action_shape)
+        if single:
+            actions = actions.squeeze(axis=0)
+        return actions, None
+
+    def close(self):
+        """断开与推理服务的连接"""
+        self.sock.close()
+
+
+def load_policy(model_path, env=None, server=None):
+    """
+    获取用于 predict 的策略
+
+    参数:
+        model_path: 模型文件路径（server 为 None 时在本进程加载），.npz 为导出的 NumPy 策略
+        env: 传给 PPO.load 的环境
+        server: 推理服务的 socket 路径，给出时连接服务而不加载模型
+    """
+    if server is not None:
+        return PolicyClient(server)
+    if model_path.endswith('.npz'):
+        from flappy_policy import NumpyPolicy  # 不需要导入 torch
+        return NumpyPolicy(model_path)
+    from stable_baselines3 import PPO
+    return PPO.load(model_path, env=env)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地 PPO 批量推理服务')
+    parser.add_argument('model_path', help='模型文件路径')
+    parser.add_argument('--socket', default=SOCKET_PATH, help='Unix socket 路径')
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH, help='每批最多的观察值个数')
+    parser.add_argument('--max-delay-ms', type=float, default=MAX_DELAY * 1000, help='最早的请求最多等待的毫秒数')
+    parser.add_argument('--device', default='cpu', help='推理设备')
+    args = parser.parse_args()
+
+    from stable_baselines3 import PPO
+    model = PPO.load(args.model_path, device=args.device)
+    server = PolicyServer(model, args.socket, args.max_batch, args.max_delay_ms / 1000)
+    print(f"已加载模型: {args.model_path}")
+    print(f"推理服务监听: {args.socket}，按 Ctrl+C 退出")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    stats = server.stats()
+    print(f"\n共 {stats['requests']} 个请求，{stats['batches']} 个批次，平均每批 {stats['mean_batch']:.1f} 个观察值")
+
+
+if __name__ == "__main__":
+    main()
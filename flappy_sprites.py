@@ -0,0 +1,122 @@
+"""
+显示用的精灵
+
+小鸟、管道和地面精灵只用于绘制画面（游戏逻辑由 FlappyCore 推进）。
+单独放在这个模块中，flappy_env 只在需要画面时才导入它和 pygame。
+"""
+import pygame, random
+from flappy_assets import load_image, load_mask  # 共享的精灵资源图集
+from flappy_core import (SCREEN_WIDHT, SCREEN_HEIGHT, SPEED, GRAVITY, GAME_SPEED,
+                         GROUND_WIDHT, GROUND_HEIGHT, PIPE_WIDHT, PIPE_HEIGHT, PIPE_GAP)  # 游戏参数
+
+class Bird(pygame.sprite.Sprite):
+    """小鸟类，继承自pygame的Sprite类"""
+    def __init__(self):
+        pygame.sprite.Sprite.__init__(self)
+
+        # 获取小鸟的三个动画帧
+        self.images = [load_image('bluebird-upflap'),
+                       load_image('bluebird-midflap'),
+                       load_image('bluebird-downflap')]
+
+        self.speed = SPEED  # 初始速度
+        self.current_image = 0  # 当前动画帧
+        self.image = self.images[0]
+        self.mask = load_mask('bluebird-upflap')  # 碰撞遮罩
+
+        # 设置小鸟初始位置
+        self.rect = self.image.get_rect()
+        self.rect[0] = SCREEN_WIDHT / 6
+        self.rect[1] = SCREEN_HEIGHT / 2
+
+    def get_center(self, axis):
+        """获取小鸟中心点坐标"""
+        center_x = self.rect[0] + (self.rect[2] / 2)
+        center_y = self.rect[1] + (self.rect[3] / 2)
+        if axis == 'x':
+            return center_x
+        if axis == 'y':
+            return center_y
+
+    def update(self):
+        """更新小鸟状态"""
+        self.current_image = (self.current_image + 1) % 3  # 更新动画帧
+        self.image = self.images[self.current_image]
+        self.speed += GRAVITY  # 应用重力
+        self.rect[1] += self.speed  # 更新位置
+
+    def bump(self):
+        """小鸟跳跃"""
+        self.speed = -SPEED
+
+    def begin(self):
+        """开始动画"""
+        self.current_image = (self.current_image + 1) % 3
+        self.image = self.images[self.current_image]
+
+class Pipe(pygame.sprite.Sprite):
+    """管道类，继承自pygame的Sprite类"""
+    def __init__(self, inverted, xpos, ysize):
+        pygame.sprite.Sprite.__init__(self)
+
+        # 获取缩放（倒置时翻转）后的管道图片和碰撞遮罩
+        self.image = load_image('pipe-green', (PIPE_WIDHT, PIPE_HEIGHT), inverted)
+        self.mask = load_mask('pipe-green', (PIPE_WIDHT, PIPE_HEIGHT), inverted)
+        self.inverted = inverted  # 是否倒置
+        self.rect = self.image.get_rect()
+        self.place(xpos, ysize)
+
+    def place(self, xpos, ysize):
+        """移动到新位置并重置计分状态（对象池复用时调用）"""
+        self.scored = False  # 是否已计分
+        self.rect[0] = xpos
+
+        # 根据是否倒置设置管道位置
+        if self.inverted:
+            self.rect[1] = - (self.rect[3] - ysize)
+        else:
+            self.rect[1] = SCREEN_HEIGHT - ysize
+
+    def update(self):
+        """更新管道位置"""
+        self.rect[0] -= GAME_SPEED
+
+class Ground(pygame.sprite.Sprite):
+    """地面类，继承自pygame的Sprite类"""
+    def __init__(self, xpos):
+        pygame.sprite.Sprite.__init__(self)
+        # 获取缩放后的地面图片和碰撞遮罩
+        self.image = load_image('base', (GROUND_WIDHT, GROUND_HEIGHT))
+        self.mask = load_mask('base', (GROUND_WIDHT, GROUND_HEIGHT))
+
+        self.rect = self.image.get_rect()
+        self.place(xpos)
+
+    def place(self, xpos):
+        """移动到新位置（对象池复用时调用）"""
+        self.rect[0] = xpos
+        self.rect[1] = SCREEN_HEIGHT - GROUND_HEIGHT
+
+    def update(self):
+        """更新地面位置"""
+        self.rect[0] -= GAME_SPEED
+
+def is_off_screen(sprite):
+    """检查精灵是否离开屏幕"""
+    return sprite.rect[0] < -(sprite.rect[2])
+
+def make_pipes(xpos, size):
+    """按下管道高度生成管道对"""
+    pipe = Pipe(False, xpos, size)
+    pipe_inverted = Pipe(True, xpos, SCREEN_HEIGHT - size - PIPE_GAP)
+    return pipe, pipe_inverted
+
+def place_pipes(pipes, xpos, size):
+    """把复用的管道对移动到 xpos，并按下管道高度重新设置上下位置"""
+    pipes[0].place(xpos, size)
+    pipes[1].place(xpos, SCREEN_HEIGHT - size - PIPE_GAP)
+
+def get_random_pipes(xpos):
+    """生成随机高度的管道对"""
+    size = random.randint(100, 300)
+    return make_pipes(xpos, size)
@@ -0,0 +1,139 @@
+"""
+启动速度
+
+入口脚本只在真正用到时才导入重量级依赖：
+    - lazy_import 返回延迟加载的模块，第一次访问它的属性时才执行导入
+      （无画面的环境不会导入 pygame）
+    - stable_baselines3 / torch 只在加载 PPO 模型或训练时在函数内导入
+    - init_pygame 只初始化用到的 pygame 子系统，已经初始化过的不再重复
+
+导入耗时报告：在新的解释器中导入各入口模块，测量冷启动时间，
+并按顶层包汇总导入耗时（python -X importtime），超过预算时退出码为 1：
+    python flappy_startup.py --budget-ms 500
+"""
+import argparse
+import importlib.util
+import os
+import subprocess
+import sys
+import time
+
+# 需要控制启动时间的入口模块
+ENTRY_POINTS = ('use_model', 'evaluate_model', 'flappy_agent', 'flappy_serve', 'flappy_policy',
+                'flappy_train', 'check_all')
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def lazy_import(name):
+    """
+    延迟导入模块
+
+    返回的模块对象先放进 sys.modules，第一次访问属性时才真正执行模块代码，
+    之后与普通模块完全相同。模块已经导入过时直接返回它。
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def init_pygame(audio=False):
+    """
+    初始化 pygame 的显示和字体子系统（audio=True 时还有音频），已经初始化过的子系统不再重复
+
+    pygame.init() 会初始化所有子系统（包括音频设备），无画面或不需要声音时没有必要。
+    """
+    import pygame
+    if not pygame.display.get_init():
+        pygame.display.init()
+    if not pygame.font.get_init():
+        pygame.font.init()
+    if audio and not pygame.mixer.get_init():
+        pygame.mixer.init()
+
+
+def subprocess_env():
+    """子进程的环境变量：无显示设备也能导入，不打印 pygame 的欢迎信息"""
+    env = dict(os.environ)
+    env.setdefault('SDL_VIDEODRIVER', 'dummy')
+    env.setdefault('SDL_AUDIODRIVER', 'dummy')
+    env.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    return env
+
+
+def cold_start(module, repeat=3):
+    """
+    在新的解释器中导入模块的耗时（包括解释器启动），取 repeat 次中最快的一次
+
+    返回:
+        float: 毫秒
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', f'import {module}'], cwd=REPO_DIR, env=subprocess_env(),
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def import_breakdown(module):
+    """
+    在新的解释器中导入模块，按顶层包汇总每个模块自身的导入耗时
+
+    返回:
+        list: [(顶层包名, 毫秒), ...]，按耗时从大到小排列，各项之和为总导入耗时
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=REPO_DIR,
+                            env=subprocess_env(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr.strip().splitlines()[-1]}")
+    packages = {}
+    for line in result.stderr.splitlines():
+        # 格式: "import time: 自身耗时(微秒) | 累计耗时(微秒) | 缩进的模块名"
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # 表头
+        package = fields[2].strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(fields[0])
+    return sorted(((package, us / 1000) for package, us in packages.items()), key=lambda item: item[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='入口模块的冷启动时间和导入耗时报告')
+    parser.add_argument('modules', nargs='*', default=list(ENTRY_POINTS), help='要测量的模块，默认所有入口模块')
+    parser.add_argument('--top', type=int, default=6, help='每个模块显示耗时最多的几个包')
+    parser.add_argument('--repeat', type=int, default=3, help='冷启动测量次数（取最快的一次）')
+    parser.add_argument('--budget-ms', type=float, default=None, help='冷启动时间预算（毫秒），超过时退出码为 1')
+    args = parser.parse_args()
+
+    over_budget = []
+    for module in args.modules:
+        elapsed = cold_start(module, args.repeat)
+        breakdown = import_breakdown(module)
+        marker = ''
+        if args.budget_ms is not None and elapsed > args.budget_ms:
+            over_budget.append(module)
+            marker = '  <-- 超出预算'
+        print(f"\n{module}: 冷启动 {elapsed:.0f} ms，导入 {sum(ms for _, ms in breakdown):.0f} ms{marker}")
+        for package, ms in breakdown[:args.top]:
+            print(f"  {package:<28}{ms:>8.1f} ms")
+
+    if over_budget:
+        print(f"\n超出 {args.budget_ms:.0f} ms 预算: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
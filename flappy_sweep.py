@@ -0,0 +1,380 @@
+"""
+并行超参数搜索
+
+从搜索空间中随机抽取 PPO 超参数（覆盖 flappy_train.PPO_KWARGS），在进程池中同时训练多个试验（无画面的 FlappyVecEnv）。
+每个试验分档训练：第 k 档训练到 min_steps * eta^k 步，然后用固定的种子评估（导出为纯 NumPy 策略，不限帧率），
+按评估结果提前剪掉表现差的试验，把算力留给有希望的试验：
+    median   每个试验依次训练所有档，某一档的结果低于已完成该档的其他试验的中位数时剪枝
+    halving  异步逐次减半：某一档的结果排在已完成该档的试验的前 1/eta 时晋级下一档，否则暂停（最后视为剪枝）
+试验按 (平均得分, 平均存活帧数) 比较，训练初期得分都为 0 时也能区分。
+
+每档训练结束后模型保存为 trial_<编号>.zip，下一档从它继续训练，所以任务可以分到任何空闲的工作进程。
+结果写入 sweeps/<时间>/：
+    results.jsonl     每档的评估结果（每完成一档追加一行）
+    leaderboard.json  排行榜（完成的档数、得分、存活帧数从高到低，每完成一档原子替换）
+    best.json         当前第一名的超参数，可以直接用于训练：python flappy_train.py --hyperparams sweeps/<时间>/best.json
+
+使用：
+    python flappy_sweep.py --trials 32 --workers 4 --pruner halving
+    python flappy_sweep.py --space space.json --max-hours 3
+搜索空间是 JSON 对象，每个参数为候选值列表、{"log": [下限, 上限]}（对数均匀）或 {"uniform": [下限, 上限]}。
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import queue
+import random
+import time
+from datetime import datetime
+
+from flappy_env import FlappyEnv, CLOCK_UNTHROTTLED
+from flappy_vec_env import FlappyVecEnv
+from flappy_train import PPO_KWARGS
+from flappy_checkpoints import write_json_atomic  # 原子写入 JSON
+from flappy_policy import NumpyPolicy, export_policy  # 评估时使用纯 NumPy 策略
+
+# 默认搜索空间
+SEARCH_SPACE = {
+    'learning_rate': {'log': [1e-4, 1e-3]},
+    'n_steps': [256, 512, 1024, 2048],
+    'batch_size': [64, 128, 256],
+    'n_epochs': [4, 10],
+    'gamma': [0.98, 0.99, 0.995],
+    'gae_lambda': [0.9, 0.95, 0.98],
+    'clip_range': [0.1, 0.2, 0.3],
+    'ent_coef': {'log': [1e-4, 0.05]},
+    'target_kl': [0.01, 0.02, None]
+}
+PRUNERS = ('median', 'halving')
+EVAL_SEED = 1_000_000  # 评估回合 i 使用种子 EVAL_SEED + i（与训练的种子错开）
+
+
+def sample_params(space, rng):
+    """从搜索空间中抽取一组超参数"""
+    params = {}
+    for name, spec in space.items():
+        if name not in PPO_KWARGS:
+            raise ValueError(f"未知的超参数: {name}")
+        if isinstance(spec, list):
+            params[name] = rng.choice(spec)
+        elif 'log' in spec:
+            low, high = spec['log']
+            params[name] = float(f"{math.exp(rng.uniform(math.log(low), math.log(high))):.3g}")
+        elif 'uniform' in spec:
+            low, high = spec['uniform']
+            params[name] = float(f"{rng.uniform(low, high):.3g}")
+        else:
+            raise ValueError(f"无法识别的搜索范围: {name}={spec}")
+    return params
+
+
+def rung_steps(min_steps, eta, rungs):
+    """每一档结束时累计训练的步数"""
+    return [min_steps * eta ** k for k in range(rungs)]
+
+
+class MedianScheduler:
+    """
+    中位数剪枝：每个试验依次训练所有档，第 k 档的结果低于已完成第 k 档的其他试验的中位数时剪枝
+
+    参数:
+        num_trials: 试验总数
+        rungs: 档数
+        min_trials: 某一档至少有这么多其他试验的结果后才开始剪枝
+    """
+    def __init__(self, num_trials, rungs, min_trials=3):
+        self.num_trials = num_trials
+        self.rungs = rungs
+        self.min_trials = min_trials
+        self.results = [[] for _ in range(rungs)]  # 每一档已有的结果
+        self.ready = []  # 等待训练下一档的 (试验, 档)
+        self.started = 0
+
+    def report(self, trial, rung, key):
+        """记录试验在某一档的结果，返回试验的新状态"""
+        others = sorted(self.results[rung])
+        self.results[rung].append(key)
+        if rung == self.rungs - 1:
+            return 'completed'
+        if len(others) >= self.min_trials and key < others[(len(others) - 1) // 2]:
+            return 'pruned'
+        self.ready.append((trial, rung + 1))
+        return 'running'
+
+    def next_job(self):
+        """下一个要训练的 (试验, 档)，已经开始的试验优先；没有时返回 None"""
+        if self.ready:
+            return self.ready.pop(0)
+        if self.started < self.num_trials:
+            self.started += 1
+            return self.started - 1, 0
+        return None
+
+
+class HalvingScheduler:
+    """
+    异步逐次减半（ASHA）：第 k 档的结果排在已完成第 k 档的试验的前 1/eta 时晋级下一档，否则暂停
+
+    空闲的工作进程先检查有没有可以晋级的试验（从高档开始），没有时才开始新的试验，不需要等一批试验全部完成。
+
+    参数:
+        num_trials: 试验总数
+        rungs: 档数
+        eta: 每一档只保留 1/eta 的试验
+    """
+    def __init__(self, num_trials, rungs, eta=3):
+        self.num_trials = num_trials
+        self.rungs = rungs
+        self.eta = eta
+        self.results = [{} for _ in range(rungs)]  # 每一档 {试验: 结果}
+        self.promoted = [set() for _ in range(rungs)]
+        self.started = 0
+
+    def report(self, trial, rung, key):
+        self.results[rung][trial] = key
+        return 'completed' if rung == self.rungs - 1 else 'paused'
+
+    def next_job(self):
+        for rung in reversed(range(self.rungs - 1)):
+            results = self.results[rung]
+            top = sorted(results, key=results.get, reverse=True)[:len(results) // self.eta]
+            for trial in top:
+                if trial not in self.promoted[rung]:
+                    self.promoted[rung].add(trial)
+                    return trial, rung + 1
+        if self.started < self.num_trials:
+            self.started += 1
+            return self.started - 1, 0
+        return None
+
+
+def init_worker():
+    """工作进程初始化：多个试验同时训练，每个进程只用一个线程，避免互相抢占 CPU"""
+    import torch
+    torch.set_num_threads(1)
+
+
+def evaluate_policy(model_path, episodes, max_frames):
+    """
+    用固定的种子评估模型（导出为 NumPy 策略，确定性动作）
+
+    返回:
+        tuple: (平均得分, 平均存活帧数)，每个回合最多 max_frames 帧
+    """
+    policy = NumpyPolicy(export_policy(model_path))
+    env = FlappyEnv(clock_mode=CLOCK_UNTHROTTLED, save_stats=False)
+    scores = []
+    times = []
+    for i in range(episodes):
+        obs, _ = env.reset(seed=EVAL_SEED + i)
+        done = False
+        info = {'score': 0, 'time': 0}
+        while not done and info['time'] < max_frames:
+            action, _ = policy.predict(obs, deterministic=True)
+            obs, _, done, _, info = env.step(int(action))
+        scores.append(info['score'])
+        times.append(info['time'])
+    env.close()
+    return sum(scores) / episodes, sum(times) / episodes
+
+
+def run_rung(directory, trial, params, rung, steps, seed, num_envs, eval_episodes, max_frames):
+    """
+    在工作进程中把试验训练到 steps 步（第 0 档新建模型，之后从上一档保存的模型继续）并评估
+
+    返回:
+        dict: 本档的结果
+    """
+    from stable_baselines3 import PPO
+
+    start = time.perf_counter()
+    model_path = os.path.join(directory, f"trial_{trial:03d}.zip")
+    # 无画面，不写入实时画面，试验的死亡次数和帧数也不计入 game_stats.json
+    env = FlappyVecEnv(num_envs, seed=seed + rung, save_stats=False)
+    if rung == 0:
+        model = PPO('MlpPolicy', env, seed=seed, device='cpu', verbose=0, **dict(PPO_KWARGS, **params))
+    else:
+        model = PPO.load(model_path, env=env, device='cpu')
+    model.learn(total_timesteps=max(steps - model.num_timesteps, 1), reset_num_timesteps=False)
+    model.save(model_path)
+    env.close()
+    train_seconds = time.perf_counter() - start
+
+    score, frames = evaluate_policy(model_path, eval_episodes, max_frames)
+    return {
+        'trial': trial,
+        'rung': rung,
+        'steps': int(model.num_timesteps),
+        'score': score,
+        'time': frames,
+        'train_seconds': train_seconds,
+        'eval_seconds': time.perf_counter() - start - train_seconds
+    }
+
+
+def leaderboard(trials):
+    """按完成的档数、平均得分、平均存活帧数从高到低排列"""
+    return sorted(trials.values(), key=lambda t: (len(t['history']), t['score'], t['time']), reverse=True)
+
+
+def run_sweep(space=None, num_trials=16, workers=None, pruner='halving', min_steps=50_000, rungs=4, eta=3,
+              num_envs=8, eval_episodes=10, max_frames=5000, seed=0, max_hours=None, output_dir="sweeps"):
+    """
+    运行超参数搜索
+
+    参数:
+        space (dict): 搜索空间，默认为 SEARCH_SPACE
+        num_trials (int): 最多开始的试验数
+        workers (int): 并行训练的进程数，默认为 CPU 数
+        pruner (str): 'median' 或 'halving'
+        min_steps (int): 第 0 档的训练步数，第 k 档累计训练 min_steps * eta^k 步（按整次采集向上取整）
+        rungs (int): 档数
+        eta (int): 档之间的步数倍数（halving 时每一档只保留 1/eta 的试验）
+        num_envs (int): 每个试验的并行世界数量
+        eval_episodes (int): 每档评估的回合数
+        max_frames (int): 评估时每个回合最多的帧数
+        seed (int): 抽取超参数的随机种子，试验 i 训练时使用种子 seed + i
+        max_hours (float): 超过这么多小时后不再开始新的任务（正在训练的任务会完成）
+        output_dir (str): 结果目录
+    返回:
+        list: 排行榜
+    """
+    if pruner not in PRUNERS:
+        raise ValueError(f"未知的剪枝方法: {pruner}")
+    space = space or SEARCH_SPACE
+    workers = max(1, min(workers or os.cpu_count() or 1, num_trials))
+    budgets = rung_steps(min_steps, eta, rungs)
+    if pruner == 'median':
+        scheduler = MedianScheduler(num_trials, rungs)
+    else:
+        scheduler = HalvingScheduler(num_trials, rungs, eta)
+    rng = random.Random(seed)
+    deadline = time.time() + max_hours * 3600 if max_hours else None
+
+    directory = os.path.join(output_dir, datetime.now().strftime("%Y%m%d_%H%M%S"))
+    os.makedirs(directory, exist_ok=True)
+    write_json_atomic(os.path.join(directory, 'sweep.json'), {
+        'space': space, 'num_trials': num_trials, 'pruner': pruner, 'budgets': budgets, 'eta': eta,
+        'num_envs': num_envs, 'eval_episodes': eval_episodes, 'max_frames': max_frames, 'seed': seed
+    })
+    print(f"超参数搜索: {num_trials} 个试验，{workers} 个进程，剪枝方法 {pruner}，各档步数 {budgets}")
+    print(f"结果保存在: {directory}")
+
+    trials = {}  # 试验编号 -> 试验记录
+    results = queue.Queue()  # 完成的任务：(试验, 档, 结果, 异常)
+    pool = multiprocessing.Pool(workers, initializer=init_worker) if workers > 1 else None
+    if pool is None:
+        init_worker()
+
+    def submit(trial, rung):
+        """把 (试验, 档) 交给工作进程（单进程时直接在本进程运行）"""
+        if trial not in trials:
+            trials[trial] = {'trial': trial, 'params': sample_params(space, rng), 'status': 'running',
+                             'rung': -1, 'steps': 0, 'score': 0.0, 'time': 0.0, 'history': []}
+        trials[trial]['status'] = 'running'
+        args = (directory, trial, trials[trial]['params'], rung, budgets[rung], seed + trial,
+                num_envs, eval_episodes, max_frames)
+        if pool is None:
+            try:
+                results.put((trial, rung, run_rung(*args), None))
+            except Exception as error:
+                results.put((trial, rung, None, error))
+        else:
+            pool.apply_async(run_rung, args,
+                             callback=lambda result: results.put((trial, rung, result, None)),
+                             error_callback=lambda error: results.put((trial, rung, None, error)))
+
+    def save():
+        board = leaderboard(trials)
+        write_json_atomic(os.path.join(directory, 'leaderboard.json'), board)
+        if board and board[0]['history']:
+            write_json_atomic(os.path.join(directory, 'best.json'), board[0]['params'])
+        return board
+
+    running = 0
+    try:
+        with open(os.path.join(directory, 'results.jsonl'), 'w') as stream:
+            while True:
+                # 空闲的工作进程领取新任务（超过时间预算后只等待正在训练的任务）
+                while running < workers and (deadline is None or time.time() < deadline):
+                    job = scheduler.next_job()
+                    if job is None:
+                        break
+                    submit(*job)
+                    running += 1
+                if running == 0:
+                    break
+
+                trial, rung, result, error = results.get()
+                running -= 1
+                record = trials[trial]
+                if error is not None:
+                    # 超参数组合无效（例如 batch_size 大于一次采集的步数）等，只影响这个试验
+                    record['status'] = 'failed'
+                    record['error'] = repr(error)
+                    print(f"试验 {trial} 第 {rung} 档失败: {error!r}")
+                else:
+                    record.update(rung=rung, steps=result['steps'], score=result['score'], time=result['time'])
+                    record['history'].append(result)
+                    record['status'] = scheduler.report(trial, rung, (result['score'], result['time']))
+                    stream.write(json.dumps(dict(result, params=record['params'], status=record['status'])) + '\n')
+                    stream.flush()
+                    print(f"试验 {trial} 第 {rung} 档: {result['steps']} 步，平均得分 {result['score']:.2f}，"
+                          f"平均存活 {result['time']:.0f} 帧，{record['status']}")
+                save()
+    finally:
+        if pool is not None:
+            pool.terminate()  # 中断时不再等待正在训练的试验
+            pool.join()
+
+    for record in trials.values():
+        if record['status'] in ('paused', 'running'):
+            record['status'] = 'pruned'  # 没有晋级或因时间预算没有继续的试验
+    board = save()
+    print_leaderboard(board)
+    return board
+
+
+def print_leaderboard(board, top=10):
+    print(f"\n排行榜（前 {min(top, len(board))} 名）:")
+    # 每个汉字占两列，表头的宽度相应减少
+    print(f"{'名次':<4}{'试验':>4}{'状态':>9}{'档':>4}{'步数':>9}{'得分':>7}{'存活帧数':>7}  超参数")
+    for rank, record in enumerate(board[:top], 1):
+        params = ', '.join(f"{name}={value}" for name, value in record['params'].items())
+        print(f"{rank:<6}{record['trial']:>6}{record['status']:>11}{record['rung']:>5}{record['steps']:>11}"
+              f"{record['score']:>9.2f}{record['time']:>11.0f}  {params}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='并行超参数搜索（按中间评估结果提前剪枝）')
+    parser.add_argument('--space', default=None, help='搜索空间 JSON 文件，默认为 SEARCH_SPACE')
+    parser.add_argument('--trials', type=int, default=16, help='最多开始的试验数')
+    parser.add_argument('--workers', type=int, default=None, help='并行训练的进程数，默认为 CPU 数')
+    parser.add_argument('--pruner', choices=PRUNERS, default='halving', help='剪枝方法')
+    parser.add_argument('--min-steps', type=int, default=50_000, help='第 0 档的训练步数（一次采集 n_steps * num_envs 步，实际步数会向上取整）')
+    parser.add_argument('--rungs', type=int, default=4, help='档数')
+    parser.add_argument('--eta', type=int, default=3, help='档之间的步数倍数（halving 时每档保留 1/eta 的试验）')
+    parser.add_argument('--num-envs', type=int, default=8, help='每个试验的并行世界数量')
+    parser.add_argument('--eval-episodes', type=int, default=10, help='每档评估的回合数')
+    parser.add_argument('--max-frames', type=int, default=5000, help='评估时每个回合最多的帧数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--max-hours', type=float, default=None, help='时间预算（小时），超过后不再开始新的任务')
+    args = parser.parse_args()
+
+    space = None
+    if args.space:
+        with open(args.space, 'r') as f:
+            space = json.load(f)
+    try:
+        run_sweep(space, num_trials=args.trials, workers=args.workers, pruner=args.pruner,
+                  min_steps=args.min_steps, rungs=args.rungs, eta=args.eta, num_envs=args.num_envs,
+                  eval_episodes=args.eval_episodes, max_frames=args.max_frames, seed=args.seed,
+                  max_hours=args.max_hours)
+    except KeyboardInterrupt:
+        print("\n搜索已中断，已完成的结果保存在排行榜中")
+
+
+if __name__ == "__main__":
+    main()
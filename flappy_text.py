@@ -0,0 +1,72 @@
+"""
+文字渲染缓存
+
+字体按 (字体名, 字号) 只创建一次（SysFont 需要枚举系统字体，非常慢）；
+渲染出的文字 Surface 按 (文字, 字号, 颜色, 字体名) 放进有上限的 LRU 缓存，
+分数、帧数等数值不变时直接复用上一帧的 Surface，只有内容变化时才重新渲染。
+"""
+from collections import OrderedDict
+
+import pygame
+
+FONT_NAME = 'Arial'  # 默认字体，None 表示 pygame 自带字体
+MAX_SURFACES = 256  # 最多缓存的文字 Surface 数量
+
+_fonts = {}  # (字体名, 字号) -> Font
+_surfaces = OrderedDict()  # (文字, 字号, 颜色, 字体名) -> Surface，按最近使用排序
+_hits = 0
+_misses = 0
+
+
+def get_font(size, name=FONT_NAME):
+    """获取指定字号的字体"""
+    key = (name, size)
+    font = _fonts.get(key)
+    if font is None:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        font = pygame.font.Font(None, size) if name is None else pygame.font.SysFont(name, size)
+        _fonts[key] = font
+    return font
+
+
+def render_text(text, size, color=(0, 0, 0), name=FONT_NAME):
+    """
+    获取渲染好的文字
+
+    返回:
+        共享的 Surface，调用方不要修改它
+    """
+    global _hits, _misses
+    key = (text, size, color, name)
+    surface = _surfaces.get(key)
+    if surface is not None:
+        _surfaces.move_to_end(key)
+        _hits += 1
+        return surface
+
+    _misses += 1
+    surface = get_font(size, name).render(text, True, color)
+    _surfaces[key] = surface
+    if len(_surfaces) > MAX_SURFACES:
+        _surfaces.popitem(last=False)  # 丢弃最久没有使用的
+    return surface
+
+
+def get_stats():
+    """获取缓存命中计数"""
+    return {
+        'hits': _hits,
+        'misses': _misses,
+        'surfaces': len(_surfaces),
+        'fonts': len(_fonts)
+    }
+
+
+def clear():
+    """清空缓存（调用 pygame.font.quit 之后必须调用）"""
+    global _hits, _misses
+    _fonts.clear()
+    _surfaces.clear()
+    _hits = 0
+    _misses = 0
@@ -1,91 +1,186 @@
 from stable_baselines3 import PPO
 from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.vec_env import SubprocVecEnv
 import os
-from flappy_env import FlappyEnv
+import sys
+import argparse
+import subprocess
+from flappy_env import FlappyEnv, CLOCK_UNTHROTTLED, OBS_VECTOR, OBS_PIXELS
+from flappy_vec_env import FlappyVecEnv
+from flappy_checkpoints import CheckpointCatalog, CheckpointWriter  # 模型存档目录、后台保存
+from flappy_live import LIVE_NAME  # 共享内存实时画面
+from flappy_dataset import TrajectoryWriter  # 轨迹数据集
 import time
 import json
 import numpy as np
 
-class RenderCallback(BaseCallback):
-    """自定义回调类，用于在训练过程中渲染游戏画面"""
-    def __init__(self, env, verbose=0):
-        super(RenderCallback, self).__init__(verbose)
-        self.env = env
-
-    def _on_step(self) -> bool:
-        """在每个训练步骤后渲染环境"""
-        self.env.render()
-        return True
+# PPO 超参数（新建模型时使用，可以用 --hyperparams 覆盖，超参数搜索见 flappy_sweep.py）
+PPO_KWARGS = {
+    'learning_rate': 3e-4,
+    'n_steps': 2048,
+    'batch_size': 64,
+    'n_epochs': 10,
+    'gamma': 0.99,
+    'gae_lambda': 0.95,
+    'clip_range': 0.2,
+    'clip_range_vf': None,
+    'normalize_advantage': True,
+    'ent_coef': 0.01,
+    'vf_coef': 0.5,
+    'max_grad_norm': 0.5,
+    'target_kl': 0.01,
+    'policy_kwargs': None
+}
 
 class SaveCallback(BaseCallback):
-    """自定义回调类，用于保存训练状态"""
-    def __init__(self, save_path, verbose=0):
+    """
+    自定义回调类，用于保存训练状态
+
+    按模型累计的时间步数（所有子环境之和）计算保存间隔，
+    并行训练时每次回调对应 num_envs 步，不能再用调用次数计数。
+    模型和训练状态由 CheckpointWriter 在后台线程写入，训练只需等待内存快照；
+    给出 catalog 时，每个保存的模型都记录到模型存档目录中（训练编号为 run，观察值类型为 obs_type）
+    """
+    def __init__(self, save_path, save_freq=10000, verbose=0, catalog=None, run=None, writer=None,
+                 obs_type=OBS_VECTOR):
         super(SaveCallback, self).__init__(verbose)
         self.save_path = save_path
+        self.save_freq = save_freq
+        self.writer = writer if writer is not None else CheckpointWriter(catalog)
+        self.run = run
+        self.obs_type = obs_type
+        self.last_save_steps = None
         self.best_mean_reward = -np.inf
 
+    def _on_training_start(self) -> None:
+        """从当前步数开始计算保存间隔（继续训练时不会立即保存）"""
+        if self.last_save_steps is None:
+            self.last_save_steps = self.num_timesteps
+
     def _on_step(self) -> bool:
         """在每个训练步骤后保存模型"""
-        if self.n_calls % 10000 == 0:  # 每10000步保存一次
-            self.model.save(f"{self.save_path}/model_{self.n_calls}")
-            # 保存训练状态
-            training_state = {
-                'n_calls': self.n_calls,
-                'best_mean_reward': self.best_mean_reward,
-                'last_save': time.time()
-            }
-            with open(f"{self.save_path}/training_state.json", 'w') as f:
-                json.dump(training_state, f)
+        if self.num_timesteps - self.last_save_steps >= self.save_freq:  # 每10000步保存一次
+            self.last_save_steps = self.num_timesteps
+            self.save(f"{self.save_path}/model_{self.num_timesteps}.zip")
+        return True
+
+    def training_state(self):
+        """当前的训练状态"""
+        return {
+            'n_calls': self.n_calls,
+            'num_timesteps': self.model.num_timesteps,
+            'best_mean_reward': self.best_mean_reward,
+            'last_save': time.time()
+        }
+
+    def save(self, model_path):
+        """保存模型，训练状态与模型一起写入 training_state.json"""
+        self.writer.save(self.model, model_path, run=self.run, state=self.training_state(),
+                         state_path=f"{self.save_path}/training_state.json", obs_type=self.obs_type)
+
+class TrajectoryCallback(BaseCallback):
+    """
+    把训练中采集的每一步写入轨迹数据集（见 flappy_dataset.py）
+
+    观察值是动作所依据的观察值（推进前的 model._last_obs），得分和帧数取自 info；
+    FlappyVecEnv 只在回合结束时给出 info，其余世界直接读取环境的数组。
+    每次采集结束时提交一次，训练中断时调用 close 写入没有结束的回合。
+    """
+    def __init__(self, directory, verbose=0):
+        super(TrajectoryCallback, self).__init__(verbose)
+        self.directory = directory
+        self.writer = None
+
+    def _on_training_start(self) -> None:
+        """每次 learn 都会调用，只在第一次创建数据集"""
+        if self.writer is None:
+            env = self.training_env
+            self.writer = TrajectoryWriter(self.directory, env.observation_space.shape, env.observation_space.dtype,
+                                           num_envs=env.num_envs)
+
+    def _on_step(self) -> bool:
+        dones = self.locals['dones']
+        infos = self.locals['infos']
+        env = self.training_env
+        if isinstance(env, FlappyVecEnv):
+            # 结束的世界已经重置，得分和帧数从 info 中取
+            scores = env.score.copy()
+            frames = env.frame.copy()
+            for i in np.flatnonzero(dones):
+                scores[i] = infos[i]['score']
+                frames[i] = infos[i]['time']
+        else:
+            scores = [info['score'] for info in infos]
+            frames = [info['time'] for info in infos]
+        self.writer.add(self.model._last_obs, self.locals['actions'], self.locals['rewards'], dones, scores, frames)
         return True
 
-def load_latest_model(models_dir):
-    """加载最新的模型"""
+    def _on_rollout_end(self) -> None:
+        self.writer.flush()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+def load_latest_model(models_dir, obs_type=OBS_VECTOR):
+    """从模型存档目录中查找观察值类型为 obs_type 的最新模型"""
     print(f"\n开始检查模型目录: {models_dir}")
-    
+
     if not os.path.exists(models_dir):
         print(f"错误: 目录 {models_dir} 不存在")
         return None, 0
-    
-    # 获取所有模型目录并按时间戳排序（从大到小）
-    model_dirs = sorted([d for d in os.listdir(models_dir) if os.path.isdir(os.path.join(models_dir, d))], 
-                       key=lambda x: int(x), 
-                       reverse=True)
-    print(f"找到的模型目录（按时间戳从大到小）: {model_dirs}")
-    
-    if not model_dirs:
-        print("错误: 没有找到任何模型目录")
+
+    catalog = CheckpointCatalog(models_dir)
+    entry = catalog.latest(obs_type=obs_type)
+    if entry is None:
+        print(f"\n错误: 存档目录中没有找到观察值类型为 {obs_type} 的模型文件")
         return None, 0
-    
-    # 按时间戳顺序检查每个目录
-    for dir_name in model_dirs:
-        dir_path = os.path.join(models_dir, dir_name)
-        print(f"\n检查目录: {dir_name}")
-        
-        # 获取该目录中的所有模型文件
-        model_files = [f for f in os.listdir(dir_path) if f.startswith('model_') and f.endswith('.zip')]
-        if not model_files:
-            print(f"目录 {dir_name} 中没有找到模型文件，继续检查下一个目录")
-            continue
-            
-        print(f"在目录 {dir_name} 中找到的模型文件: {model_files}")
-        
-        # 选择步数最大的模型文件
-        latest_model = max(model_files, key=lambda x: int(x.split('_')[1].split('.')[0]))
-        latest_model_path = os.path.join(dir_path, latest_model)
-        steps = int(latest_model.split('_')[1].split('.')[0])
-        
-        print(f"\n选择的最新模型文件:")
-        print(f"目录: {dir_name}")
-        print(f"文件名: {latest_model}")
-        print(f"步数: {steps}")
-        print(f"完整路径: {latest_model_path}")
-        
-        return latest_model_path, steps
-    
-    print("\n错误: 在所有目录中都没有找到模型文件")
-    return None, 0
-
-def main():
+
+    latest_model_path = catalog.file_path(entry)
+    print(f"\n选择的最新模型文件:")
+    print(f"训练编号: {entry['run']}")
+    print(f"步数: {entry['steps']}")
+    print(f"完整路径: {latest_model_path}")
+    return latest_model_path, entry['steps']
+
+def make_env(rank, render_mode=None, obs_type=OBS_VECTOR, live=None, record=None, save_stats=True):
+    """
+    返回创建第 rank 个子进程环境的函数
+
+    子进程中创建环境，训练时不限帧率，死亡也不暂停；随机种子由 VecEnv.seed 统一设置
+    """
+    def _init():
+        return FlappyEnv(render_mode=render_mode, clock_mode=CLOCK_UNTHROTTLED, obs_type=obs_type, live=live,
+                         record=record, save_stats=save_stats)
+    return _init
+
+def make_subproc_env(workers, seed=None, headless=False, obs_type=OBS_VECTOR, live=LIVE_NAME, record_dir=None,
+                     save_stats=True):
+    """
+    创建多进程向量化环境
+
+    每个子进程运行一个 FlappyEnv，第 i 个子进程的随机种子为 seed + i。
+    所有子进程都不渲染（不创建窗口），第 0 个子进程把状态写入名为 live 的实时画面缓冲区，
+    headless 时不写入。给出 record_dir 时第 i 个子进程把回合录像写入其中的 episodes_i.rec。
+    save_stats=False 时子进程不写入 game_stats.json（性能测试等）。
+    """
+    env_fns = [
+        make_env(rank, obs_type=obs_type, live=live if rank == 0 and not headless else None,
+                 record=os.path.join(record_dir, f"episodes_{rank}.rec") if record_dir else None,
+                 save_stats=save_stats)
+        for rank in range(workers)
+    ]
+    env = SubprocVecEnv(env_fns)
+    env.seed(seed if seed is not None else int(time.time()))
+    return env
+
+def start_viewer(name=LIVE_NAME):
+    """在单独的进程中打开实时画面查看器，关闭查看器不影响训练"""
+    viewer_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flappy_live.py')
+    return subprocess.Popen([sys.executable, viewer_path, '--name', name])
+
+def main(num_envs=1, headless=False, workers=1, seed=None, pixels=False, viewer=True, record=False, dataset=False,
+         hyperparams=None):
     # 创建模型和日志目录
     model_code = int(time.time())
     models_dir = f"models/{model_code}/"
@@ -100,69 +195,120 @@ def main():
     if not os.path.exists(logdir):
         os.makedirs(logdir)
 
-    # 创建和初始化环境
-    env = FlappyEnv()
-    env.reset()
+    # 创建和初始化环境（多个世界时使用批量向量化环境）
+    # 训练进程不绘制画面，只把第 0 个世界的状态写入共享内存，由查看器进程绘制；
+    # 训练时不限帧率，死亡也不暂停
+    if num_envs > 1 and workers > 1:
+        raise ValueError("num_envs 和 workers 不能同时大于1")
+    if num_envs > 1 and pixels:
+        raise ValueError("FlappyVecEnv 不支持画面观察值，请使用 workers")
+    obs_type = OBS_PIXELS if pixels else OBS_VECTOR
+    live = None if headless else LIVE_NAME
+    # 回合录像（见 flappy_replay.py）
+    record_dir = f"recordings/{model_code}/" if record else None
+    record_file = os.path.join(record_dir, "episodes.rec") if record else None
+    if record:
+        print(f"回合录像保存到: {record_dir}")
+    if workers > 1:
+        # 多进程并行，第 0 个子进程写入实时画面
+        env = make_subproc_env(workers, seed=seed, headless=headless, obs_type=obs_type, record_dir=record_dir)
+    elif num_envs > 1:
+        env = FlappyVecEnv(num_envs, seed=seed, live=live, record=record_file)
+    else:
+        env = FlappyEnv(clock_mode=CLOCK_UNTHROTTLED, obs_type=obs_type, live=live, record=record_file)
+        env.reset(seed=seed)
+    viewer_process = start_viewer(live) if live is not None and viewer else None
 
     # 尝试加载最新的模型
     print("\n尝试加载最新的模型...")
-    latest_model, start_steps = load_latest_model("models")
+    # 只继续训练观察值类型相同的模型（向量模型不能用于画面观察值，反之亦然）
+    latest_model, start_steps = load_latest_model("models", obs_type)
+    model = None
     if latest_model:
         print(f"\n成功找到模型: {latest_model}")
         print(f"正在加载模型...")
-        model = PPO.load(latest_model, env=env, tensorboard_log=logdir)
-        print(f"模型加载成功！已加载 {start_steps} 步的训练结果")
-    else:
-        print("\n没有找到现有模型，创建新模型...")
+        try:
+            model = PPO.load(latest_model, env=env, tensorboard_log=logdir)
+            print(f"模型加载成功！已加载 {start_steps} 步的训练结果")
+        except ValueError as error:
+            # 没有记录观察值类型的旧记录可能与当前环境不一致
+            print(f"模型与当前环境不兼容（{error}），创建新模型...")
+    if model is None:
+        print("\n没有找到可以继续训练的模型，创建新模型...")
         model = PPO(
-            'MlpPolicy',
+            'CnnPolicy' if pixels else 'MlpPolicy',  # 画面观察值使用卷积网络
             env,
             tensorboard_log=logdir,
-            learning_rate=3e-4,
-            n_steps=2048,
-            batch_size=64,
-            n_epochs=10,
-            gamma=0.99,
-            gae_lambda=0.95,
-            clip_range=0.2,
-            clip_range_vf=None,
-            normalize_advantage=True,
-            ent_coef=0.01,
-            vf_coef=0.5,
-            max_grad_norm=0.5,
-            target_kl=0.01,
-            policy_kwargs=None,
-            verbose=2
+            verbose=2,
+            **dict(PPO_KWARGS, **(hyperparams or {}))
         )
         start_steps = 0
         print("新模型创建成功！")
 
     # 创建回调
-    render_callback = RenderCallback(env)
-    save_callback = SaveCallback(models_dir)
+    catalog = CheckpointCatalog("models")
+    writer = CheckpointWriter(catalog)  # 后台线程保存模型，训练只等待内存快照
+    save_callback = SaveCallback(models_dir, run=model_code, writer=writer, obs_type=obs_type)
+    callbacks = [save_callback]
+    trajectory_callback = None
+    if dataset:
+        dataset_dir = f"datasets/{model_code}/"
+        print(f"轨迹数据集保存到: {dataset_dir}")
+        trajectory_callback = TrajectoryCallback(dataset_dir)
+        callbacks.append(trajectory_callback)
 
     # 训练参数
     TIMESTEPS = 10000  # 每次训练的时间步数
-    iters = start_steps // TIMESTEPS
 
     print(f"开始训练，从 {start_steps} 步继续")
     print(f"模型保存在: {models_dir}")
     print(f"日志保存在: {logdir}")
 
     # 开始训练循环
-    while True:
-        iters += 1
-        # 训练模型
-        model.learn(
-            total_timesteps=TIMESTEPS,
-            reset_num_timesteps=False,
-            tb_log_name=f"PPO",
-            callback=[render_callback, save_callback]
-        )
+    try:
+        while True:
+            # 训练模型
+            model.learn(
+                total_timesteps=TIMESTEPS,
+                reset_num_timesteps=False,
+                tb_log_name=f"PPO",
+                callback=callbacks
+            )
 
-        # 保存模型
-        model.save(f"{models_dir}/model_{TIMESTEPS * iters}")
-        print(f"保存模型到: {models_dir}/model_{TIMESTEPS * iters}")
+            # 保存模型（并行训练时一次 learn 可能超过 TIMESTEPS 步，按实际步数命名）
+            model_path = f"{models_dir}/model_{model.num_timesteps}.zip"
+            save_callback.save(model_path)
+            print(f"保存模型到: {model_path}")
+    finally:
+        # 中断训练时等待后台线程写完最后的模型
+        writer.close()
+        print(f"后台保存了 {writer.saved} 个模型（合并 {writer.coalesced} 次），"
+              f"训练线程快照耗时 {writer.snapshot_seconds:.2f} 秒，写入耗时 {writer.write_seconds:.2f} 秒")
+        if trajectory_callback is not None:
+            trajectory_callback.close()
+        # 关闭环境（删除实时画面的共享内存）；子进程收到 Ctrl+C 时已经自己退出，不能再关闭
+        if not isinstance(env, SubprocVecEnv):
+            env.close()
+        if viewer_process is not None:
+            viewer_process.terminate()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='训练 Flappy Bird PPO 模型')
+    parser.add_argument('--num-envs', type=int, default=1, help='并行世界数量，大于1时使用 FlappyVecEnv')
+    parser.add_argument('--workers', type=int, default=1, help='并行子进程数量，大于1时使用 SubprocVecEnv，只有第0个写入实时画面')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子，子进程 i 使用 seed + i')
+    parser.add_argument('--headless', action='store_true', help='不显示游戏画面（也不写入实时画面）')
+    parser.add_argument('--no-viewer', action='store_true', help='只写入实时画面，不自动打开查看器（可以随时运行 flappy_live.py 查看）')
+    parser.add_argument('--record', action='store_true', help='把每个回合的录像保存到 recordings/{model_code}/（见 flappy_replay.py）')
+    parser.add_argument('--dataset', action='store_true', help='把每一步写入轨迹数据集 datasets/{model_code}/（见 flappy_dataset.py）')
+    parser.add_argument('--hyperparams', default=None,
+                        help='新建模型时使用的超参数 JSON 文件（覆盖 PPO_KWARGS，例如 flappy_sweep.py 写出的 best.json）')
+    parser.add_argument('--pixels', action='store_true', help='使用叠加的灰度画面作为观察值（CnnPolicy），无显示设备时需设置 SDL_VIDEODRIVER=dummy')
+    args = parser.parse_args()
+    hyperparams = None
+    if args.hyperparams:
+        with open(args.hyperparams, 'r') as f:
+            hyperparams = json.load(f)
+    main(num_envs=args.num_envs, headless=args.headless, workers=args.workers, seed=args.seed, pixels=args.pixels,
+         viewer=not args.no_viewer, record=args.record, dataset=args.dataset,
+         hyperparams=hyperparams)
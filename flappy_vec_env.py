@@ -0,0 +1,263 @@
+"""
+批量 Flappy Bird 向量化环境
+
+把 N 个独立世界的小鸟、管道和分数保存在 NumPy 数组中，
+每一步用一次数组运算同时推进所有世界，直接实现 SB3 的 VecEnv 接口。
+"""
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+from flappy_core import (SCREEN_WIDHT, SCREEN_HEIGHT, SPEED, GRAVITY, GAME_SPEED, GROUND_WIDHT, GROUND_HEIGHT,
+                         PIPE_WIDHT, PIPE_HEIGHT, PIPE_GAP, BIRD_WIDTH, BIRD_HEIGHT, BIRD_X,
+                         PIPE_LIP_HEIGHT, PIPE_BODY_LEFT, PIPE_BODY_RIGHT, BIRD_MASK_SPANS)
+from game_stats import GameStats
+from flappy_live import LivePublisher  # 共享内存实时画面
+from flappy_replay import VecEpisodeRecorder  # 回合录像
+
+# 碰撞剖面查找表：SPAN_LEFT[r0, r1] / SPAN_RIGHT[r0, r1] 为小鸟第 r0~r1-1 行不透明像素相对屏幕的最左、最右列，
+# 没有行（r0 >= r1）时为不可能相交的哨兵值
+SPAN_LEFT = np.full((BIRD_HEIGHT + 1, BIRD_HEIGHT + 1), 1 << 20, dtype=np.int64)
+SPAN_RIGHT = np.full((BIRD_HEIGHT + 1, BIRD_HEIGHT + 1), -(1 << 20), dtype=np.int64)
+for r0 in range(BIRD_HEIGHT + 1):
+    for r1 in range(r0 + 1, BIRD_HEIGHT + 1):
+        SPAN_LEFT[r0, r1] = BIRD_X + BIRD_MASK_SPANS[r0][r1][0]
+        SPAN_RIGHT[r0, r1] = BIRD_X + BIRD_MASK_SPANS[r0][r1][1]
+
+
+class FlappyVecEnv(VecEnv):
+    """
+    N 个 Flappy Bird 世界组成的向量化环境
+
+    每个世界始终有两对管道（与 FlappyCore 一致），第 0 对是观察值使用的最近管道。
+    地面总是覆盖小鸟所在的列，所以落地判定只需比较高度。
+    回合结束的世界会自动重置，结束时的观察值放在 info['terminal_observation'] 中，
+    结束时的得分和帧数放在 info['score'] 和 info['time'] 中（其他世界的 info 为空）。
+    live 为共享内存名称时，把第 0 个世界的状态写入实时画面缓冲区（见 flappy_live.py）。
+    record 为文件路径时，把每个世界的每个回合追加到录像文件，可以在 FlappyEnv 中回放（见 flappy_replay.py）。
+    save_stats=False 时统计数据只在内存中更新，不写入 game_stats.json（与 FlappyEnv 一致）。
+    """
+    def __init__(self, num_envs, seed=None, live=None, record=None, save_stats=True):
+        self.render_mode = None
+        action_space = spaces.Discrete(2)
+        observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(3,), dtype=np.float32)
+        super(FlappyVecEnv, self).__init__(num_envs, observation_space, action_space)
+
+        self.rng = np.random.default_rng(seed)
+        self.actions = np.zeros(num_envs, dtype=np.int64)
+
+        # 小鸟状态
+        self.bird_y = np.zeros(num_envs, dtype=np.int64)
+        self.bird_speed = np.zeros(num_envs, dtype=np.float64)
+
+        # 管道状态：[世界, 管道对]
+        self.pipe_x = np.zeros((num_envs, 2), dtype=np.int64)
+        self.pipe_size = np.zeros((num_envs, 2), dtype=np.int64)
+        self.pipe_scored = np.zeros((num_envs, 2), dtype=bool)
+
+        # 回合计数
+        self.frame = np.zeros(num_envs, dtype=np.int64)
+        self.moves = np.zeros(num_envs, dtype=np.int64)
+        self.score = np.zeros(num_envs, dtype=np.int64)
+
+        # 初始化游戏统计系统
+        self.stats = GameStats(read_only=not save_stats)
+        self.death_count = self.stats.get_death_count()
+        self.high_score = self.stats.get_high_score()
+        self.max_frame = self.stats.get_max_frame()
+
+        # 实时画面：第 0 个世界的回合数、地面位置和累计生成的管道对数量（数组状态中没有这些显示用的信息）
+        self.live = LivePublisher(live) if live is not None else None
+        self.live_episode = 0
+        self.live_ground = []
+        self.live_spawned = 0
+
+        self.recorder = VecEpisodeRecorder(record, num_envs) if record is not None else None  # 回合录像
+
+    def reset_worlds(self, mask):
+        """重置 mask 选中的世界"""
+        count = int(mask.sum())
+        if count == 0:
+            return
+        self.bird_y[mask] = int(SCREEN_HEIGHT / 2)
+        self.bird_speed[mask] = SPEED
+        self.pipe_x[mask] = [800, SCREEN_WIDHT + 800]
+        self.pipe_size[mask] = self.rng.integers(100, 301, size=(count, 2))
+        self.pipe_scored[mask] = False
+        self.frame[mask] = 0
+        self.moves[mask] = 0
+        self.score[mask] = 0
+        if self.recorder is not None:
+            self.recorder.begin(mask, self.pipe_size)
+
+    def observe(self):
+        """计算所有世界的观察值（使用第 0 对管道）"""
+        center_x = BIRD_X + BIRD_WIDTH / 2
+        center_y = self.bird_y + BIRD_HEIGHT / 2
+        size = self.pipe_size[:, 0]
+        obs = np.empty((self.num_envs, 3), dtype=np.float32)
+        obs[:, 0] = np.clip((center_y - (SCREEN_HEIGHT - size - PIPE_GAP)) / SCREEN_HEIGHT, -1.0, 1.0)
+        obs[:, 1] = np.clip((center_y - (SCREEN_HEIGHT - size)) / SCREEN_HEIGHT, -1.0, 1.0)
+        obs[:, 2] = np.clip((self.pipe_x[:, 0] - center_x) / SCREEN_WIDHT, -1.0, 1.0)
+        return obs
+
+    def hits_pipe(self):
+        """
+        所有世界中小鸟是否碰到两对管道
+
+        每对管道由 4 个不透明矩形组成（下管道管口、管身，上管道管口、管身），
+        查表得到小鸟与每个矩形重叠的行中不透明像素的左右边界，再与矩形的列比较，形状 (N, 2, 4)
+        """
+        bottom_top = SCREEN_HEIGHT - self.pipe_size  # 下管道上沿 (N, 2)
+        top_bottom = bottom_top - PIPE_GAP  # 上管道下沿
+        x = self.pipe_x
+        tops = np.stack([bottom_top, bottom_top + PIPE_LIP_HEIGHT,
+                         top_bottom - PIPE_LIP_HEIGHT, top_bottom - PIPE_HEIGHT], axis=-1)
+        bottoms = np.stack([bottom_top + PIPE_LIP_HEIGHT, bottom_top + PIPE_HEIGHT,
+                            top_bottom, top_bottom - PIPE_LIP_HEIGHT], axis=-1)
+        lefts = np.stack([x, x + PIPE_BODY_LEFT, x, x + PIPE_BODY_LEFT], axis=-1)
+        rights = np.stack([x + PIPE_WIDHT - 1, x + PIPE_BODY_RIGHT,
+                           x + PIPE_WIDHT - 1, x + PIPE_BODY_RIGHT], axis=-1)
+
+        bird_y = self.bird_y[:, None, None]
+        r0 = np.clip(tops - bird_y, 0, BIRD_HEIGHT)
+        r1 = np.clip(bottoms - bird_y, 0, BIRD_HEIGHT)
+        hit = (SPAN_LEFT[r0, r1] <= rights) & (SPAN_RIGHT[r0, r1] >= lefts)
+        return hit.any(axis=(1, 2))
+
+    def reset(self):
+        """重置所有世界"""
+        if self._seeds[0] is not None:
+            self.rng = np.random.default_rng(self._seeds[0])
+        self._reset_seeds()
+        self._reset_options()
+        self.reset_worlds(np.ones(self.num_envs, dtype=bool))
+        if self.live is not None:
+            self.reset_live()
+        # 与 FlappyEnv.reset 一致，初始观察值为0
+        return np.zeros((self.num_envs, 3), dtype=np.float32)
+
+    def step_async(self, actions):
+        self.actions = np.asarray(actions).reshape(self.num_envs)
+
+    def step_wait(self):
+        """同时推进所有世界一帧"""
+        obs = self.observe()
+        if self.live is not None:
+            guide = (int(self.bird_y[0]) + BIRD_HEIGHT / 2, int(self.pipe_x[0, 0]),
+                     SCREEN_HEIGHT - int(self.pipe_size[0, 0]))  # 实时画面的辅助线（推进前的位置）
+        self.frame += 1
+
+        # 执行动作
+        bump = self.actions == 1
+        self.bird_speed[bump] = -SPEED
+        self.moves += bump
+
+        # 管道循环：最旧的一对离开屏幕后，后一对前移，并在右侧生成新管道
+        off = self.pipe_x[:, 0] < -PIPE_WIDHT
+        count = int(off.sum())
+        if count:
+            self.pipe_x[off, 0] = self.pipe_x[off, 1]
+            self.pipe_size[off, 0] = self.pipe_size[off, 1]
+            self.pipe_scored[off, 0] = self.pipe_scored[off, 1]
+            self.pipe_x[off, 1] = SCREEN_WIDHT * 2
+            self.pipe_size[off, 1] = self.rng.integers(100, 301, size=count)
+            self.pipe_scored[off, 1] = False
+            if self.recorder is not None:
+                self.recorder.respawn(off, self.pipe_size[:, 1])
+
+        # 计分系统
+        passed = (BIRD_X > self.pipe_x + PIPE_WIDHT) & ~self.pipe_scored
+        self.score += passed.sum(axis=1)
+        self.pipe_scored |= passed
+
+        # 更新小鸟和管道
+        self.bird_speed += GRAVITY
+        self.bird_y = np.trunc(self.bird_y + self.bird_speed).astype(np.int64)
+        self.pipe_x -= GAME_SPEED
+
+        # 检查是否死亡
+        out_of_top = self.bird_y + BIRD_HEIGHT / 2 < 0
+        hits_ground = (self.bird_y + BIRD_HEIGHT > SCREEN_HEIGHT - GROUND_HEIGHT) & (self.bird_y < SCREEN_HEIGHT)
+        dones = out_of_top | hits_ground | self.hits_pipe()
+        death_penalty = np.where(out_of_top, -2, np.where(dones, -1, 0))
+
+        # 更新统计
+        self.high_score = max(self.high_score, int(self.score.max()))
+        frame_max = int(self.frame.max())
+        if frame_max > self.max_frame:
+            self.max_frame = frame_max
+            self.stats.update_max_frame(self.max_frame)
+        deaths = int(dones.sum())
+        if deaths:
+            self.death_count += deaths
+            self.stats.update_death_count(self.death_count)
+
+        # 计算奖励（死亡时当前分数清零，与 FlappyEnv 一致）
+        score = np.where(dones, 0, self.score)
+        rewards = (score - self.moves * 0.001 + death_penalty + self.frame * 0.001).astype(np.float32)
+
+        if self.live is not None:
+            self.publish(obs[0], rewards[0], dones[0], off[0], guide)  # 地面和管道计数每步都要更新，写入由 publish 限速
+
+        if self.recorder is not None:
+            self.recorder.step(self.actions, dones, self.score)
+
+        infos = [{} for _ in range(self.num_envs)]
+        for i in np.flatnonzero(dones):
+            infos[i]["terminal_observation"] = obs[i].copy()
+            infos[i]["TimeLimit.truncated"] = False
+            infos[i]["score"] = int(self.score[i])  # 与 FlappyEnv 的 info 一致，只在回合结束时给出
+            infos[i]["time"] = int(self.frame[i])
+            obs[i] = 0.0
+        self.reset_worlds(dones)
+        if self.live is not None and dones[0]:
+            self.reset_live()
+
+        return obs, rewards, dones, infos
+
+    def reset_live(self):
+        """第 0 个世界开始新回合：地面和管道计数与 FlappyCore.reset 一致"""
+        self.live_episode += 1
+        self.live_ground = [GROUND_WIDHT * i - GAME_SPEED for i in range(2)]
+        self.live_spawned = 2
+
+    def publish(self, obs, reward, done, respawned, guide):
+        """推进第 0 个世界的地面（按 FlappyCore 的规则滚动）和管道计数，到时间时写入实时画面缓冲区"""
+        ground = self.live_ground
+        if ground[0] < -GROUND_WIDHT:
+            ground.pop(0)
+            ground.append(GROUND_WIDHT - 20)
+        for i in range(len(ground)):
+            ground[i] -= GAME_SPEED
+        self.live_spawned += int(respawned)
+        if not self.live.due():
+            return
+        frame = int(self.frame[0])
+        pipes = zip(self.pipe_x[0].tolist(), self.pipe_size[0].tolist(), self.pipe_scored[0].tolist())
+        self.live.publish(self.live_episode, frame, int(self.score[0]), self.high_score, self.death_count,
+                          self.max_frame, self.live_spawned, int(self.bird_y[0]), float(self.bird_speed[0]),
+                          (frame + 1) % 3, int(self.actions[0]), bool(done), ground, pipes, obs.tolist(),
+                          float(reward), guide)
+
+    def close(self):
+        self.stats.close()  # 写入尚未保存的统计数据
+        if self.live is not None:
+            self.live.close()
+            self.live = None
+        if self.recorder is not None:
+            self.recorder.close(self.score)
+            self.recorder = None
+
+    def get_attr(self, attr_name, indices=None):
+        """所有世界共享同一个对象，直接返回本环境的属性"""
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        method = getattr(self, method_name)
+        return [method(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
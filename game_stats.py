@@ -1,25 +1,78 @@
+import atexit
 import json
 import os
+import threading
+import time
+import weakref
+
+# 还没有关闭的统计对象，进程退出时统一写入剩余数据
+# （关闭或被回收后自动移除；后台线程只持有弱引用，不会让没有关闭的统计对象一直存活）
+_instances = weakref.WeakSet()
+
+
+@atexit.register
+def _close_all():
+    for stats in list(_instances):
+        stats.close()
+
+
+def _run_flusher(ref, stopped, interval):
+    """后台线程：定期写入，统计对象关闭或被回收后退出"""
+    while not stopped.wait(interval):
+        stats = ref()
+        if stats is None:
+            return
+        try:
+            stats.flush()
+        except OSError:
+            pass  # 数据已经放回内存，下次再写
+        del stats  # 不在等待期间持有引用
+
 
 class GameStats:
-    def __init__(self):
-        self.stats_file = 'game_stats.json'
+    """
+    游戏统计数据
+
+    更新只修改内存，由后台线程每隔 flush_interval 秒批量写入磁盘，step 循环不会访问文件系统。
+    写入时先获取锁文件，再把本进程新增的数据合并进磁盘上的最新数据
+    （死亡次数累加，最高分和最大帧数取最大值），最后写临时文件并原子重命名，
+    所以多个进程同时训练时计数不会互相覆盖。flush_interval <= 0 时每次更新都立即写入。
+    read_only=True 时只读取磁盘上的数据，更新只修改内存，从不写入（回放录像时使用）。
+    """
+    def __init__(self, stats_file='game_stats.json', flush_interval=5.0, read_only=False):
+        self.stats_file = stats_file
+        self.lock_file = f'{stats_file}.lock'
+        self.flush_interval = flush_interval
+        self.read_only = read_only
         self.stats = self.load_stats()
 
+        self.lock = threading.Lock()  # 保护内存中的数据
+        self.reported_deaths = self.stats['death_count']  # 调用方上次报告的死亡次数
+        self.pending_deaths = 0  # 尚未写入磁盘的死亡次数
+        self.dirty = False
+        self.flusher = None  # 后台写入线程，第一次更新时启动
+        self.stopped = threading.Event()
+        self.closed = False
+        _instances.add(self)
+
+    def __del__(self):
+        # 没有关闭就被回收时写入剩余数据
+        if not getattr(self, 'closed', True):
+            self.close()
+
     def load_stats(self):
         """加载游戏统计数据"""
         if os.path.exists(self.stats_file):
             try:
                 with open(self.stats_file, 'r') as f:
-                    return json.load(f)
+                    return {**self.get_default_stats(), **json.load(f)}
             except:
                 return self.get_default_stats()
         return self.get_default_stats()
 
     def save_stats(self):
-        """保存游戏统计数据"""
-        with open(self.stats_file, 'w') as f:
-            json.dump(self.stats, f)
+        """保存游戏统计数据（立即写入）"""
+        self.flush()
 
     def get_default_stats(self):
         """获取默认统计数据"""
@@ -29,22 +82,124 @@ class GameStats:
             'max_frame': 0
         }
 
+    def schedule_flush(self):
+        """按配置立即写入，或者交给后台线程定期写入"""
+        if self.read_only:
+            return
+        if self.flush_interval <= 0:
+            self.flush()
+        elif self.flusher is None:
+            self.flusher = threading.Thread(target=_run_flusher, args=(weakref.ref(self), self.stopped, self.flush_interval),
+                                            daemon=True)
+            self.flusher.start()
+
+    def acquire_file_lock(self, timeout=5.0, stale=30.0):
+        """获取锁文件，超时返回 False；超过 stale 秒的锁视为残留并删除"""
+        deadline = time.time() + timeout
+        while True:
+            try:
+                fd = os.open(self.lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.close(fd)
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock_file) > stale:
+                        os.remove(self.lock_file)
+                        continue
+                except OSError:
+                    pass
+                if time.time() > deadline:
+                    return False
+                time.sleep(0.01)
+
+    def flush(self, timeout=5.0):
+        """把本进程新增的数据合并写入磁盘，timeout 秒内拿不到锁文件时保留数据下次再写"""
+        with self.lock:
+            if not self.dirty or self.read_only:
+                return
+            pending_deaths = self.pending_deaths
+            high_score = self.stats['high_score']
+            max_frame = self.stats['max_frame']
+            self.pending_deaths = 0
+            self.dirty = False
+
+        if not self.acquire_file_lock(timeout):
+            # 拿不到锁时保留数据，下次再写
+            with self.lock:
+                self.pending_deaths += pending_deaths
+                self.dirty = True
+            return
+        tmp_file = f'{self.stats_file}.{os.getpid()}.tmp'
+        try:
+            merged = self.load_stats()
+            merged['death_count'] += pending_deaths
+            merged['high_score'] = max(merged['high_score'], high_score)
+            merged['max_frame'] = max(merged['max_frame'], max_frame)
+
+            with open(tmp_file, 'w') as f:
+                json.dump(merged, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.stats_file)
+        except BaseException:
+            # 写入失败时同样保留数据，下次再写
+            with self.lock:
+                self.pending_deaths += pending_deaths
+                self.dirty = True
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+        finally:
+            os.remove(self.lock_file)
+
+        with self.lock:
+            # 同步其他进程的数据，死亡次数加上尚未写入的部分
+            self.stats['death_count'] = merged['death_count'] + self.pending_deaths
+            self.stats['high_score'] = max(self.stats['high_score'], merged['high_score'])
+            self.stats['max_frame'] = max(self.stats['max_frame'], merged['max_frame'])
+
+    def close(self, timeout=30.0):
+        """停止后台线程并写入剩余数据（这是最后一次写入，等待锁文件的时间更长，仍然失败时提示丢失的数据）"""
+        if self.closed:
+            return
+        self.closed = True
+        _instances.discard(self)
+        self.stopped.set()
+        if self.flusher is not None and self.flusher is not threading.current_thread():
+            self.flusher.join()  # 等待后台线程完成正在进行的写入
+        try:
+            self.flush(timeout)
+        except OSError as e:
+            print(f"写入统计数据失败: {e}")
+        if self.dirty:
+            print(f"无法写入统计数据 {self.stats_file}，丢失 {self.pending_deaths} 次死亡记录")
+
     def update_death_count(self, count):
-        """更新死亡次数"""
-        self.stats['death_count'] = count
-        self.save_stats()
+        """更新死亡次数（count 为调用方累计的死亡次数，只记录新增部分）"""
+        with self.lock:
+            self.pending_deaths += count - self.reported_deaths
+            self.stats['death_count'] += count - self.reported_deaths
+            self.reported_deaths = count
+            self.dirty = True
+        self.schedule_flush()
 
     def update_high_score(self, score):
         """更新最高分"""
-        if score > self.stats['high_score']:
+        with self.lock:
+            if score <= self.stats['high_score']:
+                return
             self.stats['high_score'] = score
-            self.save_stats()
+            self.dirty = True
+        self.schedule_flush()
 
     def update_max_frame(self, frame):
         """更新最大帧数"""
-        if frame > self.stats['max_frame']:
+        with self.lock:
+            if frame <= self.stats['max_frame']:
+                return
             self.stats['max_frame'] = frame
-            self.save_stats()
+            self.dirty = True
+        self.schedule_flush()
 
     def get_death_count(self):
         """获取死亡次数"""
@@ -56,4 +211,4 @@ class GameStats:
 
     def get_max_frame(self):
         """获取最大帧数"""
-        return self.stats['max_frame'] 
\ No newline at end of file
+        return self.stats['max_frame']
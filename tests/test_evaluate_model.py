@@ -0,0 +1,27 @@
+import math
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from evaluate_model import RunningStats
+
+
+def test_percentile_empty_is_nan():
+    stats = RunningStats()
+    assert math.isnan(stats.percentile(50))
+    assert stats.std() == 0.0
+    assert stats.half_width(0.95) == math.inf
+
+
+def test_percentile_matches_numpy():
+    values = [3, 1, 4, 1, 5, 9, 2, 6]
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+    for q in (0, 10, 50, 90, 100):
+        assert math.isclose(stats.percentile(q), np.percentile(values, q))
+    assert math.isclose(stats.mean, np.mean(values))
+    assert math.isclose(stats.std(), np.std(values))
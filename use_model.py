@@ -1,14 +1,23 @@
-from stable_baselines3 import PPO
-from flappy_env import FlappyEnv
+from flappy_env import FlappyEnv, OBS_VECTOR
+from flappy_serve import load_policy  # 本地加载模型或连接推理服务
+from flappy_checkpoints import CheckpointCatalog  # 模型存档目录
+from flappy_policy import exported_policy  # 导出纯 NumPy 策略
+import argparse
 import os
 
-def load_and_play(model_path):
-    """加载模型并开始游戏"""
-    # 创建环境
-    env = FlappyEnv()
+def load_and_play(model_path, server=None):
+    """
+    加载模型并开始游戏
+
+    参数:
+        model_path: 模型文件路径
+        server: 推理服务的 socket 路径，给出时由服务做推理，不在本进程加载模型
+    """
+    # 创建环境（实时显示画面）
+    env = FlappyEnv(render_mode='human')
     
-    # 加载模型
-    model = PPO.load(model_path, env=env)
+    # 加载模型（或连接推理服务）
+    model = load_policy(model_path, env=env, server=server)
     
     print(f"已加载模型: {model_path}")
     print("开始游戏，按 Ctrl+C 退出")
@@ -19,9 +28,6 @@ def load_and_play(model_path):
     total_reward = 0
     
     while not done:
-        # 渲染游戏画面
-        env.render()
-        
         # 使用模型预测动作
         action, _ = model.predict(obs, deterministic=True)
         
@@ -37,27 +43,34 @@ def load_and_play(model_path):
     print(f"总奖励: {total_reward:.2f}")
 
 def main():
-    # 获取最新的模型文件
+    parser = argparse.ArgumentParser(description='用训练好的模型玩 Flappy Bird')
+    parser.add_argument('--server', default=None, help='推理服务的 socket 路径（见 flappy_serve.py）')
+    parser.add_argument('--run', default=None, help='只在指定的训练编号中查找模型')
+    parser.add_argument('--steps', type=int, default=None, help='使用指定步数的模型')
+    parser.add_argument('--best', action='store_true', help='使用评估得分最高的模型')
+    parser.add_argument('--numpy', action='store_true', help='导出并使用纯 NumPy 策略（不加载 torch）')
+    args = parser.parse_args()
+
+    # 从模型存档目录中查找模型
     models_dir = "models"
     if not os.path.exists(models_dir):
         print("错误：未找到模型目录")
         return
-    
-    # 获取所有模型文件
-    model_files = [f for f in os.listdir(models_dir) if f.startswith('model_') and f.endswith('.zip')]
-    if not model_files:
+
+    catalog = CheckpointCatalog(models_dir)
+    entry = catalog.find(run=args.run, steps=args.steps, best=args.best, obs_type=OBS_VECTOR)  # 只能运行向量观察值的模型
+    if entry is None:
         print("错误：未找到模型文件")
         return
-    
-    # 获取最新的模型文件
-    latest_model = max(model_files, key=lambda x: int(x.split('_')[1].split('.')[0]))
-    model_path = os.path.join(models_dir, latest_model)
-    
-    print(f"找到最新模型: {latest_model}")
+    model_path = catalog.file_path(entry)
+
+    print(f"找到模型: 训练 {entry['run']}，{entry['steps']} 步")
     print(f"模型路径: {model_path}")
+    if args.numpy:
+        model_path = exported_policy(model_path)
     
     # 加载并运行模型
-    load_and_play(model_path)
+    load_and_play(model_path, args.server)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file